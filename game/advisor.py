@@ -0,0 +1,191 @@
+"""
+💡 СОВЕТНИК В БОЮ
+
+Оценивает четыре действия боевого меню (атака, защита, зелье, побег)
+поиском expectimax: ходы игрока - узлы максимума, броски урона и шанс
+побега - узлы ожидания. Правила повторяют Game.handle_room_event:
+
+    атака   - урон randint(10, 20) + оружие, затем ответ монстра;
+    защита  - монстр бьет вполсилы (max(1, урон // 2));
+    зелье   - первое зелье в инвентаре, затем ответ монстра;
+    побег   - 60% успех, при неудаче монстр в этот ход не бьет.
+
+Поиск идет с итеративным углублением в пределах бюджета времени, оценки
+состояний хранятся в таблице транспозиций, а листья оцениваются точным
+калькулятором combat_calc (одна таблица состояний на бой).
+"""
+
+import time
+from typing import Dict, Tuple, Optional, NamedTuple
+
+from combat_calc import BASE_DAMAGE_RANGE, hit_after_armor, solver_for
+
+
+ATTACK, DEFEND, POTION, FLEE = "1", "2", "3", "4"
+ACTION_NAMES = {
+    ATTACK: "⚔️  Атаковать",
+    DEFEND: "🛡️  Защититься",
+    POTION: "🧪 Использовать зелье",
+    FLEE: "🏃 Попытаться убежать"
+}
+FLEE_CHANCE = 0.6
+
+
+class SearchTimeout(Exception):
+    """Бюджет времени исчерпан"""
+
+
+class Advice(NamedTuple):
+    """Рекомендация советника"""
+    action: str
+    values: Dict[str, float]
+    depth: int
+
+
+class CombatAdvisor:
+    """Expectimax по боевым действиям с таблицей транспозиций.
+
+    Полезность исхода: победа - 1, успешный побег - flee_value, гибель - 0,
+    плюс hp_weight * доля оставшегося здоровья для победы и побега."""
+
+    def __init__(self, time_budget: float = 0.05, max_depth: int = 12,
+                 flee_value: float = 0.3, hp_weight: float = 0.25,
+                 table_limit: int = 200000):
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.flee_value = flee_value
+        self.hp_weight = hp_weight
+        self.table_limit = table_limit
+        self.table: Dict[tuple, float] = {}
+        self.deadline = 0.0
+        self.nodes = 0
+
+    def advise(self, player, monster) -> Advice:
+        """Совет для текущего игрока и монстра"""
+        potions = tuple(item.value for item in player.inventory if item.type == "potion")
+        return self.advise_state(
+            player.health,
+            player.max_health,
+            player.weapon.value if player.weapon else 0,
+            player.armor.value if player.armor else None,
+            monster.health,
+            monster.damage,
+            potions
+        )
+
+    def advise_state(self, health: int, max_health: int, weapon: int, armor: Optional[int],
+                     monster_health: int, monster_damage: int,
+                     potions: Tuple[int, ...] = ()) -> Advice:
+        """Совет для состояния боя, заданного характеристиками"""
+        stats = (max_health, weapon, armor, monster_damage, potions)
+        if len(self.table) > self.table_limit:
+            self.table.clear()
+
+        self.deadline = time.perf_counter() + self.time_budget
+        best: Optional[Advice] = None
+        for depth in range(1, self.max_depth + 1):
+            try:
+                values = self.root_values(stats, health, monster_health, depth)
+            except SearchTimeout:
+                break
+            action = max(values, key=lambda a: (values[a], a == ATTACK))
+            best = Advice(action, values, depth)
+
+        if best is None:
+            # Не успели даже первый уровень - оцениваем листьями
+            values = {ATTACK: self.leaf(stats, health, monster_health, 0)}
+            best = Advice(ATTACK, values, 0)
+        return best
+
+    def root_values(self, stats: tuple, health: int, monster_health: int,
+                    depth: int) -> Dict[str, float]:
+        """Ценность каждого допустимого действия в корне"""
+        values = {}
+        for action in (ATTACK, DEFEND, POTION, FLEE):
+            value = self.action_value(stats, health, monster_health, 0, action, depth)
+            if value is not None:
+                values[action] = value
+        return values
+
+    def utility(self, stats: tuple, health: int, base: float) -> float:
+        return base + self.hp_weight * health / stats[0]
+
+    def leaf(self, stats: tuple, health: int, monster_health: int, used: int) -> float:
+        """Оценка на границе поиска: точный исход боя без побега"""
+        max_health, weapon, armor, monster_damage, potions = stats
+        # Одна таблица боя на все листья поиска и на следующие раунды
+        outcome = solver_for(max_health, weapon, armor, monster_damage,
+                             potions).outcome(health, monster_health, used)
+        remaining = max(0.0, health - outcome.expected_hp_loss)
+        return outcome.win_probability + self.hp_weight * remaining / max_health
+
+    def monster_turn(self, stats: tuple, health: int, monster_health: int, used: int,
+                     damage: int, depth: int) -> float:
+        """Ответный удар монстра и продолжение боя"""
+        health -= hit_after_armor(damage, stats[2])
+        if health <= 0:
+            return 0.0
+        return self.value(stats, health, monster_health, used, depth - 1)
+
+    def action_value(self, stats: tuple, health: int, monster_health: int, used: int,
+                     action: str, depth: int) -> Optional[float]:
+        """Ожидаемая полезность действия (None - действие недоступно)"""
+        max_health, weapon, armor, monster_damage, potions = stats
+
+        if action == ATTACK:
+            low, high = BASE_DAMAGE_RANGE
+            damages = range(low + weapon, high + weapon + 1)
+            total = 0.0
+            for damage in damages:
+                left = monster_health - damage
+                if left <= 0:
+                    total += self.utility(stats, health, 1.0)
+                else:
+                    total += self.monster_turn(stats, health, left, used, monster_damage, depth)
+            return total / len(damages)
+
+        if action == DEFEND:
+            return self.monster_turn(stats, health, monster_health, used,
+                                     max(1, monster_damage // 2), depth)
+
+        if action == POTION:
+            if used >= len(potions):
+                return None
+            healed = min(max_health, health + potions[used])
+            return self.monster_turn(stats, healed, monster_health, used + 1, monster_damage, depth)
+
+        # Побег: при неудаче бой продолжается без удара монстра
+        escaped = self.utility(stats, health, self.flee_value)
+        stay = self.value(stats, health, monster_health, used, depth - 1)
+        return FLEE_CHANCE * escaped + (1 - FLEE_CHANCE) * stay
+
+    def value(self, stats: tuple, health: int, monster_health: int, used: int, depth: int) -> float:
+        """Ценность состояния при лучшей игре (узел максимума)"""
+        if depth <= 0:
+            return self.leaf(stats, health, monster_health, used)
+
+        key = (stats, health, monster_health, used, depth)
+        cached = self.table.get(key)
+        if cached is not None:
+            return cached
+
+        self.nodes += 1
+        if not self.nodes & 255 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        best = 0.0
+        for action in (ATTACK, POTION, FLEE, DEFEND):
+            value = self.action_value(stats, health, monster_health, used, action, depth)
+            if value is not None and value > best:
+                best = value
+
+        self.table[key] = best
+        return best
+
+
+def format_advice(advice: Advice) -> str:
+    """Текст подсказки для боевого меню"""
+    lines = [f"💡 Совет: {ACTION_NAMES[advice.action]} (глубина поиска {advice.depth})"]
+    for action, value in sorted(advice.values.items(), key=lambda item: -item[1]):
+        lines.append(f"   {ACTION_NAMES[action]}: {value:.3f}")
+    return "\n".join(lines)
@@ -0,0 +1,224 @@
+"""
+📈 АНАЛИТИКА КАРТЫ: ГИСТОГРАММЫ И СЧЕТ КОМНАТ В ПРЯМОУГОЛЬНИКАХ
+
+Для каждого типа комнат строится двумерная таблица префиксных сумм
+(array 'I', (size + 1)^2 чисел), и число комнат типа в любом
+прямоугольнике - четыре обращения к таблице. Таблица строится при первом
+запросе типа: ряд кодов переводится в нули и единицы одним translate и
+накапливается в C (itertools.accumulate).
+
+Обработанные комнаты (сокровище взято, монстр убит, ловушка разряжена)
+учитываются отдельно: разреженное двумерное дерево Фенвика по таким
+клеткам. Их мало, поэтому поправка стоит O(log^2 size) обращений к
+словарю, а для нетронутых областей дерево пустое и не обходится.
+
+Изменения приходят через record: это один append в очередь, без замков,
+поэтому игроки общего мира, меняющие комнаты под замками своих участков,
+не ждут друг друга. Запросы перед ответом переносят очередь в деревья
+под собственным замком аналитики.
+
+Пример:
+    analytics = MapAnalytics(size, codes, list(RoomType))
+    analytics.count(RoomType.MONSTER, 0, 0, 16, 16)      # по генерации
+    analytics.remaining(RoomType.MONSTER, 0, 0, 16, 16)  # еще живые
+    analytics.remaining_around([RoomType.MONSTER], (5, 5), 2)  # рядом с клеткой
+"""
+
+import threading
+from array import array
+from collections import deque
+from itertools import accumulate
+from operator import add
+from typing import Any, Deque, Dict, Sequence, Set, Tuple
+
+
+# Сколько изменений может ждать в очереди, прежде чем пишущий поток
+# попробует разобрать ее сам
+PENDING_LIMIT = 1024
+
+
+class PrefixCounts:
+    """Префиксные суммы одного кода по карте: счет в прямоугольнике за O(1)"""
+
+    __slots__ = ('size', 'table')
+
+    def __init__(self, size: int, data: bytes, code: int):
+        self.size = size
+        stride = size + 1
+        marks = bytearray(256)
+        marks[code] = 1
+        marks = bytes(marks)
+
+        # Ряд y + 1 таблицы = ряд y + накопленные суммы ряда y карты
+        previous = array('I', bytes(4 * stride))
+        table = array('I', previous)
+        for y in range(size):
+            row = data[y * size:(y + 1) * size].translate(marks)
+            previous = array('I', map(add, previous, accumulate(row, initial=0)))
+            table.extend(previous)
+        self.table = table
+
+    def count(self, x0: int, y0: int, x1: int, y1: int) -> int:
+        """Клеток с кодом в [x0, x1) x [y0, y1) (границы уже в пределах карты)"""
+        table = self.table
+        stride = self.size + 1
+        return table[y1 * stride + x1] - table[y0 * stride + x1] - table[y1 * stride + x0] + table[y0 * stride + x0]
+
+
+class SparseFenwick2D:
+    """Двумерное дерево Фенвика, в котором хранятся только тронутые узлы"""
+
+    __slots__ = ('size', 'tree')
+
+    def __init__(self, size: int):
+        self.size = size
+        self.tree: Dict[int, int] = {}
+
+    def add(self, x: int, y: int, delta: int):
+        """Прибавить delta в клетке (x, y)"""
+        size = self.size
+        stride = size + 1
+        tree = self.tree
+        i = x + 1
+        while i <= size:
+            j = y + 1
+            base = i * stride
+            while j <= size:
+                key = base + j
+                value = tree.get(key, 0) + delta
+                if value:
+                    tree[key] = value
+                else:
+                    del tree[key]
+                j += j & -j
+            i += i & -i
+
+    def prefix(self, x: int, y: int) -> int:
+        """Сумма по [0, x) x [0, y)"""
+        stride = self.size + 1
+        tree = self.tree
+        total = 0
+        i = x
+        while i > 0:
+            j = y
+            base = i * stride
+            while j > 0:
+                total += tree.get(base + j, 0)
+                j -= j & -j
+            i -= i & -i
+        return total
+
+    def count(self, x0: int, y0: int, x1: int, y1: int) -> int:
+        """Сумма по [x0, x1) x [y0, y1)"""
+        if not self.tree:
+            return 0
+        return self.prefix(x1, y1) - self.prefix(x0, y1) - self.prefix(x1, y0) + self.prefix(x0, y0)
+
+
+class MapAnalytics:
+    """Гистограммы типов комнат и счет по прямоугольникам карты.
+
+    codes - код типа (индекс в room_types) на клетку, ряд за рядом.
+    Прямоугольники полуоткрытые: [x0, x1) x [y0, y1), обрезаются по карте."""
+
+    def __init__(self, size: int, codes: Any, room_types: Sequence[Any]):
+        self.size = size
+        self.data = bytes(codes)
+        self.room_types = tuple(room_types)
+        self.codes = {room_type: code for code, room_type in enumerate(self.room_types)}
+        self.totals = {room_type: self.data.count(code) for room_type, code in self.codes.items()}
+        self.prefix: Dict[Any, PrefixCounts] = {}
+        self.cleared: Dict[Any, SparseFenwick2D] = {}
+        self.cleared_positions: Dict[Any, Set[Tuple[int, int]]] = {}
+        # Еще не учтенные изменения (position, room_type, cleared) и замок запросов
+        self.pending: Deque[Tuple[Tuple[int, int], Any, bool]] = deque()
+        self.lock = threading.Lock()
+
+    def clip(self, x0: int, y0: int, x1: int, y1: int) -> Tuple[int, int, int, int]:
+        size = self.size
+        x0, y0 = min(max(0, x0), size), min(max(0, y0), size)
+        return x0, y0, max(x0, min(size, x1)), max(y0, min(size, y1))
+
+    def table(self, room_type: Any) -> PrefixCounts:
+        """Префиксные суммы типа (строятся при первом запросе)"""
+        table = self.prefix.get(room_type)
+        if table is None:
+            table = PrefixCounts(self.size, self.data, self.codes[room_type])
+            self.prefix[room_type] = table
+        return table
+
+    def histogram(self) -> Dict[Any, int]:
+        """Комнат каждого типа на всей карте"""
+        return dict(self.totals)
+
+    def remaining_histogram(self) -> Dict[Any, int]:
+        """Комнат каждого типа, событие которых еще не обработано"""
+        self.sync()
+        return {room_type: total - len(self.cleared_positions.get(room_type, ()))
+                for room_type, total in self.totals.items()}
+
+    def count(self, room_type: Any, x0: int, y0: int, x1: int, y1: int) -> int:
+        """Комнат типа в прямоугольнике по генерации карты, O(1)"""
+        if not self.totals.get(room_type):
+            return 0
+        return self.table(room_type).count(*self.clip(x0, y0, x1, y1))
+
+    def remaining(self, room_type: Any, x0: int, y0: int, x1: int, y1: int) -> int:
+        """Комнат типа в прямоугольнике без обработанных"""
+        self.sync()
+        rect = self.clip(x0, y0, x1, y1)
+        if not self.totals.get(room_type):
+            return 0
+        found = self.table(room_type).count(*rect)
+        cleared = self.cleared.get(room_type)
+        return found - cleared.count(*rect) if cleared is not None else found
+
+    def remaining_around(self, room_types: Sequence[Any], position: Tuple[int, int],
+                         radius: int) -> int:
+        """Необработанных комнат этих типов в квадрате radius вокруг клетки"""
+        x, y = position
+        rect = (x - radius, y - radius, x + radius + 1, y + radius + 1)
+        return sum(self.remaining(room_type, *rect) for room_type in room_types)
+
+    def record(self, position: Tuple[int, int], room_type: Any, cleared: bool):
+        """Отметить изменение комнаты без ожидания замков (учтется при
+        следующем запросе или когда очередь вырастет)"""
+        pending = self.pending
+        pending.append((position, room_type, cleared))
+        # Без запросов очередь росла бы бесконечно: разбираем ее, только
+        # если замок свободен - пишущий поток никогда не ждет
+        if len(pending) >= PENDING_LIMIT and self.lock.acquire(blocking=False):
+            try:
+                self.apply_pending()
+            finally:
+                self.lock.release()
+
+    def sync(self):
+        """Перенести накопленные изменения в деревья"""
+        if not self.pending:
+            return
+        with self.lock:
+            self.apply_pending()
+
+    def apply_pending(self):
+        """Разобрать очередь (под lock)"""
+        pending = self.pending
+        while pending:
+            self.set_cleared(*pending.popleft())
+
+    def set_cleared(self, position: Tuple[int, int], room_type: Any, cleared: bool):
+        """Отметить, обработано ли событие комнаты (повторная отметка ничего не меняет).
+
+        Меняет деревья сразу: только для одного потока или под lock"""
+        positions = self.cleared_positions.setdefault(room_type, set())
+        if cleared == (position in positions):
+            return
+        tree = self.cleared.get(room_type)
+        if tree is None:
+            tree = self.cleared[room_type] = SparseFenwick2D(self.size)
+        if cleared:
+            positions.add(position)
+            tree.add(position[0], position[1], 1)
+        else:
+            positions.remove(position)
+            tree.add(position[0], position[1], -1)
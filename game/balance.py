@@ -0,0 +1,268 @@
+"""
+⚖️ ПОДБОР БАЛАНСА
+
+Перебирает параметры баланса (веса комнат, формулы монстров, урон
+ловушек, цены магазина) и оценивает каждую конфигурацию серией
+воспроизводимых безголовых прохождений на всех ядрах.
+
+Примеры:
+    python balance.py --grid monster_damage_per_level=1,2,3 \\
+                      --grid room_weights.MONSTER=10,15,20 --runs 2000
+    python balance.py --grid trap_damage_max=20,30,40 \\
+                      --grid monster_base_health=10,20,30 \\
+                      --search --target-win-rate 0.6
+
+Распределения очков, ходов и уровней собираются потоковыми агрегаторами
+(stats.RunStats) в рабочих процессах и сливаются, так что квантили по
+миллионам прохождений занимают килобайты.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+from multiprocessing import Pool
+from typing import Dict, List, Tuple, Any, Optional
+
+from game import MonsterPool
+from simulation import make_params, monster_templates, simulate_run
+from stats import RunStats, format_summary
+
+
+def parse_value(text: str) -> Any:
+    """Число или строка из командной строки"""
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return text
+
+
+def parse_grid(specs: List[str]) -> Dict[str, List[Any]]:
+    """Разбор аргументов вида 'путь=v1,v2,v3'"""
+    grid: Dict[str, List[Any]] = {}
+    for spec in specs:
+        if '=' not in spec:
+            raise ValueError(f"Ожидается 'параметр=значения': {spec}")
+        path, values = spec.split('=', 1)
+        grid[path.strip()] = [parse_value(v.strip()) for v in values.split(',') if v.strip()]
+    return grid
+
+
+def expand_grid(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Все сочетания значений сетки"""
+    paths = list(grid)
+    return [dict(zip(paths, combo)) for combo in itertools.product(*(grid[p] for p in paths))]
+
+
+def run_chunk(task: Tuple[int, Dict[str, Any], int, int]) -> Tuple[int, Dict[str, float], RunStats]:
+    """Прогнать прохождения с зернами [first_seed, first_seed + count)"""
+    index, overrides, first_seed, count = task
+    params = make_params(overrides)
+    pool = MonsterPool(monster_templates(params))
+    totals = {'runs': 0, 'wins': 0, 'deaths': 0, 'score': 0, 'turns': 0}
+    stats = RunStats()
+    for seed in range(first_seed, first_seed + count):
+        result = simulate_run(seed, params, pool)
+        stats.add(result)
+        totals['runs'] += 1
+        totals['wins'] += result['won']
+        totals['deaths'] += result['died']
+        totals['score'] += result['score']
+        totals['turns'] += result['turns']
+    return index, totals, stats
+
+
+class ConfigResult:
+    """Накопленные результаты одной конфигурации"""
+
+    def __init__(self, overrides: Dict[str, Any]):
+        self.overrides = overrides
+        self.runs = 0
+        self.wins = 0
+        self.deaths = 0
+        self.score = 0
+        self.turns = 0
+        self.stats = RunStats()
+
+    def add(self, totals: Dict[str, float], stats: Optional[RunStats] = None):
+        """Добавить результаты пакета прохождений"""
+        if stats is not None:
+            self.stats.merge(stats)
+        self.runs += totals['runs']
+        self.wins += totals['wins']
+        self.deaths += totals['deaths']
+        self.score += totals['score']
+        self.turns += totals['turns']
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.runs if self.runs else 0.0
+
+    @property
+    def avg_score(self) -> float:
+        return self.score / self.runs if self.runs else 0.0
+
+    @property
+    def avg_turns(self) -> float:
+        return self.turns / self.runs if self.runs else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'params': self.overrides,
+            'runs': self.runs,
+            'win_rate': self.win_rate,
+            'death_rate': self.deaths / self.runs if self.runs else 0.0,
+            'avg_score': self.avg_score,
+            'avg_turns': self.avg_turns,
+            'quantiles': {
+                field: {f"p{round(q * 100)}": value for q, value in zip(RunStats.QUANTILES, quantiles)}
+                for field, _, _, _, quantiles in self.stats.summary()
+            }
+        }
+
+
+class BalanceTuner:
+    """Параллельная оценка конфигураций баланса"""
+
+    def __init__(self, workers: Optional[int] = None, seed: int = 0, chunk: int = 100):
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed
+        self.chunk = chunk
+
+    def evaluate(self, pool, results: List[ConfigResult], indices: List[int], first_run: int, runs: int):
+        """Догнать выбранные конфигурации до first_run + runs прохождений.
+
+        Все конфигурации используют одни и те же зерна, поэтому
+        различия между ними не маскируются случайностью карт."""
+        tasks = []
+        for index in indices:
+            for start in range(first_run, first_run + runs, self.chunk):
+                count = min(self.chunk, first_run + runs - start)
+                tasks.append((index, results[index].overrides, self.seed + start, count))
+
+        for index, totals, stats in pool.imap_unordered(run_chunk, tasks):
+            results[index].add(totals, stats)
+
+    def sweep(self, configs: List[Dict[str, Any]], runs: int) -> List[ConfigResult]:
+        """Полный перебор: каждая конфигурация получает runs прохождений"""
+        results = [ConfigResult(overrides) for overrides in configs]
+        with Pool(self.workers) as pool:
+            self.evaluate(pool, results, list(range(len(results))), 0, runs)
+        return results
+
+    def search(self, configs: List[Dict[str, Any]], runs: int, target_win_rate: float,
+               start_runs: int = 100, keep: float = 0.5) -> List[ConfigResult]:
+        """Последовательное отсеивание: на каждом раунде число прохождений
+        удваивается, а худшая часть конфигураций (дальше всего от целевой
+        доли побед) отбрасывается, пока не останется одна или не будет
+        достигнут бюджет runs."""
+        results = [ConfigResult(overrides) for overrides in configs]
+        alive = list(range(len(results)))
+        done = 0
+        budget = min(start_runs, runs)
+
+        with Pool(self.workers) as pool:
+            while alive:
+                self.evaluate(pool, results, alive, done, budget - done)
+                done = budget
+                if len(alive) == 1 or done >= runs:
+                    break
+                alive.sort(key=lambda i: abs(results[i].win_rate - target_win_rate))
+                alive = alive[:max(1, int(len(alive) * keep))]
+                budget = min(runs, budget * 2)
+
+        return results
+
+
+def print_table(results: List[ConfigResult], target_win_rate: Optional[float] = None):
+    """Таблица результатов по конфигурациям"""
+    if target_win_rate is not None:
+        ordered = sorted(results, key=lambda r: (-r.runs, abs(r.win_rate - target_win_rate)))
+    else:
+        ordered = sorted(results, key=lambda r: -r.win_rate)
+
+    print("\n" + "=" * 90)
+    print("  Побед   Очки  Очки p10  Очки p90    Ходы  Прохождений  Параметры")
+    print("-" * 90)
+    for result in ordered:
+        params = ", ".join(f"{k}={v}" for k, v in result.overrides.items()) or "по умолчанию"
+        low = result.stats.quantile('score', 0.1)
+        high = result.stats.quantile('score', 0.9)
+        print(f"{result.win_rate:6.1%} {result.avg_score:7.1f} {low:9.1f} {high:9.1f} "
+              f"{result.avg_turns:7.1f} {result.runs:11}  {params}")
+    print("=" * 90)
+
+
+def print_surface(results: List[ConfigResult], grid: Dict[str, List[Any]], metric: str):
+    """Поверхность метрики по первым двум параметрам сетки"""
+    paths = list(grid)
+    if len(paths) < 2:
+        return
+    row_path, col_path = paths[0], paths[1]
+    cells: Dict[Tuple[Any, Any], List[ConfigResult]] = {}
+    for result in results:
+        if result.runs:
+            key = (result.overrides[row_path], result.overrides[col_path])
+            cells.setdefault(key, []).append(result)
+
+    print(f"\n📈 {metric}: строки - {row_path}, столбцы - {col_path}")
+    print(" " * 12 + "".join(f"{str(v):>10}" for v in grid[col_path]))
+    for row_value in grid[row_path]:
+        line = f"{str(row_value):>12}"
+        for col_value in grid[col_path]:
+            group = cells.get((row_value, col_value))
+            if not group:
+                line += f"{'-':>10}"
+                continue
+            values = [getattr(r, metric) for r in group]
+            value = sum(values) / len(values)
+            line += f"{value:>10.1%}" if metric == 'win_rate' else f"{value:>10.1f}"
+        print(line)
+
+
+def main():
+    """Точка входа инструмента подбора баланса"""
+    parser = argparse.ArgumentParser(description="Подбор баланса безголовыми прохождениями")
+    parser.add_argument('--grid', action='append', default=[],
+                        help="параметр=значение1,значение2,... (можно несколько раз)")
+    parser.add_argument('--runs', type=int, default=1000, help="прохождений на конфигурацию")
+    parser.add_argument('--seed', type=int, default=0, help="первое зерно")
+    parser.add_argument('--workers', type=int, default=None, help="число процессов")
+    parser.add_argument('--search', action='store_true',
+                        help="адаптивный поиск с отсевом плохих конфигураций")
+    parser.add_argument('--target-win-rate', type=float, default=0.7,
+                        help="целевая доля побед для поиска")
+    parser.add_argument('--json', help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    grid = parse_grid(args.grid)
+    configs = expand_grid(grid)
+    tuner = BalanceTuner(workers=args.workers, seed=args.seed)
+
+    started = time.time()
+    if args.search:
+        results = tuner.search(configs, args.runs, args.target_win_rate)
+    else:
+        results = tuner.sweep(configs, args.runs)
+    elapsed = time.time() - started
+
+    total_runs = sum(r.runs for r in results)
+    print(f"\n⏱️  {total_runs} прохождений за {elapsed:.1f} сек "
+          f"({tuner.workers} процессов, {len(configs)} конфигураций)")
+    print_table(results, args.target_win_rate if args.search else None)
+    if len(results) == 1:
+        print(format_summary(results[0].stats))
+    for metric in ('win_rate', 'avg_score', 'avg_turns'):
+        print_surface(results, grid, metric)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump([r.to_dict() for r in results], f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+⏱️ ЗАМЕРЫ ПРОИЗВОДИТЕЛЬНОСТИ
+
+Запуск:
+    python benchmarks.py startup
+    python benchmarks.py bots --runs 500
+    python benchmarks.py layout --sizes 256 2048
+    python benchmarks.py mapgen --size 2048 --workers 1 2 4 8
+    python benchmarks.py sessions --count 2000
+    python benchmarks.py world --players 1 2 4 8
+    python benchmarks.py sampling --count 1000000
+    python benchmarks.py analytics --size 4096 --queries 2000
+"""
+
+import argparse
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from itertools import islice
+from typing import Callable, List
+
+from advisor import CombatAdvisor
+from balance import parse_value
+from game import (EVENT_FLAGS, GENERATED_ROOM_TYPES, ROOM_TYPE_SAMPLER, STARTER_ITEMS, Game, GameMap,
+                  MapPool, Player, RoomType)
+from history import GameHistory
+from layout import explore, generate_layout, maze_layout
+from sessions import format_memory_report, memory_report
+from world import SharedWorld
+from simulation import make_params, simulate_run
+
+
+def best_of(func: Callable[[], object], repeat: int = 5) -> float:
+    """Лучшее время из нескольких запусков, в миллисекундах"""
+    timings: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def bench_startup(sizes: List[int]):
+    """Время до меню: холодный запуск процесса, Game() и перезапуск"""
+    command = [sys.executable, "-c", "import game; game.Game()"]
+    cold = best_of(lambda: subprocess.run(command, check=True), repeat=3)
+    print(f"Холодный запуск процесса до меню: {cold:.1f} мс")
+
+    print("\nРазмер   GameMap()   Game()   Перезапуск   Новая игра (из пула)")
+    for size in sizes:
+        eager = best_of(lambda: GameMap(size), repeat=3)
+        construct = best_of(lambda: Game(size))
+
+        game = Game(size)
+        restart = best_of(game.reset)
+
+        pool = MapPool.for_size(size)
+        if pool.capacity < 1:
+            # Слишком большая карта для пула: новая игра генерирует ее сама
+            print(f"{size:6}  {eager:8.2f} мс  {construct:5.3f} мс  {restart:7.3f} мс  "
+                  f"{'без пула':>10}")
+            continue
+        pool.prefetch()
+        while pool.maps.qsize() < 1:
+            time.sleep(0.01)
+        new_game = best_of(lambda: pool.take(), repeat=1)
+
+        print(f"{size:6}  {eager:8.2f} мс  {construct:5.3f} мс  {restart:7.3f} мс  "
+              f"{new_game:10.3f} мс")
+
+
+def bench_bots(runs: int, overrides: List[str]):
+    """Эвристический бот против бота с CombatAdvisor на одних и тех же зернах"""
+    params = make_params({path: parse_value(value)
+                          for path, value in (item.split('=', 1) for item in overrides)})
+    advisor = CombatAdvisor(time_budget=0.01)
+    print("Бот          Побед   Смертей   Очки    мс/прохождение")
+    for name, bot in (("эвристика", None), ("советник", advisor)):
+        started = time.perf_counter()
+        results = [simulate_run(seed, params, advisor=bot) for seed in range(runs)]
+        elapsed = (time.perf_counter() - started) * 1000 / runs
+        wins = sum(r['won'] for r in results) / runs
+        deaths = sum(r['died'] for r in results) / runs
+        score = sum(r['score'] for r in results) / runs
+        print(f"{name:10}  {wins:6.1%}   {deaths:6.1%}  {score:6.1f}   {elapsed:8.2f}")
+
+
+def bench_layout(sizes: List[int]):
+    """Генерация лабиринта и проверка достижимости выхода"""
+    print("Размер   Лабиринт    Обход (BFS)   Всего с проверкой")
+    for size in sizes:
+        rng = random.Random(size)
+        started = time.perf_counter()
+        layout = maze_layout(size, rng)
+        built = time.perf_counter()
+        explore(layout, (0, 0))
+        explored = time.perf_counter()
+        total = best_of(lambda: generate_layout('maze', size, rng), repeat=1)
+        print(f"{size:6}  {(built - started) * 1000:9.1f} мс  {(explored - built) * 1000:9.1f} мс  "
+              f"{total:12.1f} мс")
+
+
+def bench_mapgen(size: int, workers: List[int]):
+    """Генерация большой карты в общей памяти при разном числе процессов"""
+    print(f"Карта {size}x{size}")
+    print("Процессов   Время        Ускорение")
+    baseline = None
+    for count in workers:
+        elapsed = best_of(lambda: GameMap.generate_shared(size, seed=1, workers=count), repeat=1)
+        baseline = baseline or elapsed
+        print(f"{count:9}  {elapsed:9.1f} мс   x{baseline / elapsed:.2f}")
+
+
+def idle_session() -> Game:
+    """Сессия сразу после создания героя: карта, обзор, история"""
+    game = Game()
+    game.player = Player("Герой")
+    for item in STARTER_ITEMS:
+        game.player.add_item(item)
+    game.player.weapon = STARTER_ITEMS[0]
+    game.player.armor = STARTER_ITEMS[1]
+    game.update_visibility()
+    game.history = GameHistory(game)
+    return game
+
+
+def bench_sessions(count: int):
+    """Память простаивающих сессий 6x6 и прогноз на 100 тысяч"""
+    idle_session()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = [idle_session() for _ in range(count)]
+    per_session = (tracemalloc.get_traced_memory()[0] - before) / count
+    tracemalloc.stop()
+    print(format_memory_report(memory_report(sessions[0])))
+    print(f"\nПо tracemalloc: {per_session / 1024:.1f} КБ на сессию, "
+          f"100 000 сессий - {per_session * 100000 / 2 ** 30:.2f} ГБ")
+
+
+def bench_sampling(count: int):
+    """Выбор типов комнат: random.choices против таблицы псевдонимов"""
+    rng = random.Random(1)
+    weights = [rt.weight for rt in GENERATED_ROOM_TYPES]
+    single = 100000
+    rows = [
+        ("choices по одному", single,
+         lambda: [rng.choices(GENERATED_ROOM_TYPES, weights=weights)[0] for _ in range(single)]),
+        ("псевдонимы по одному", single,
+         lambda: [ROOM_TYPE_SAMPLER.sample(rng) for _ in range(single)]),
+        ("choices(k=N)", count,
+         lambda: rng.choices(GENERATED_ROOM_TYPES, weights=weights, k=count)),
+        ("псевдонимы sample_n", count, lambda: ROOM_TYPE_SAMPLER.sample_n(count, rng)),
+        ("псевдонимы sample_codes", count, lambda: ROOM_TYPE_SAMPLER.sample_codes(count, rng)),
+    ]
+    print("Способ                      нс на выбор")
+    for name, amount, func in rows:
+        print(f"{name:<26} {best_of(func, repeat=3) * 1e6 / amount:10.1f}")
+
+
+def bench_analytics(size: int, queries: int):
+    """Счет монстров в прямоугольниках: обход клеток против префиксных сумм"""
+    game_map = GameMap.generate_shared(size, seed=1, workers=1)
+    rng = random.Random(1)
+    rects = []
+    for _ in range(queries):
+        x0, x1 = sorted(rng.randrange(size + 1) for _ in range(2))
+        y0, y1 = sorted(rng.randrange(size + 1) for _ in range(2))
+        rects.append((x0, y0, x1, y1))
+    monster = RoomType.MONSTER
+
+    started = time.perf_counter()
+    analytics = game_map.analytics
+    analytics.table(monster)
+    build = (time.perf_counter() - started) * 1000
+    print(f"Карта {size}x{size}: сборка аналитики и таблицы монстров {build:.0f} мс")
+
+    # Обход - по срезам буфера кодов, без словарей комнат (нижняя граница)
+    types = game_map.rooms.types
+    code = analytics.codes[monster]
+    sample = rects[:max(1, queries // 100)]
+    walk = best_of(lambda: [sum(bytes(types[y * size + x0:y * size + x1]).count(code) for y in range(y0, y1))
+                            for x0, y0, x1, y1 in sample], repeat=1) / len(sample)
+    count = best_of(lambda: [game_map.count_rooms(monster, *rect) for rect in rects], repeat=3) / queries
+
+    # Часть монстров убита: поправка идет по разреженному дереву
+    for position in islice(game_map.rooms.positions_of(monster), size):
+        game_map.claim(position, 'has_monster')
+    remaining = best_of(lambda: [game_map.count_rooms(monster, *rect, remaining=True) for rect in rects],
+                        repeat=3) / queries
+    print("Запрос                        мкс")
+    print(f"{'обход по рядам':<26} {walk * 1000:8.1f}")
+    print(f"{'префиксные суммы':<26} {count * 1000:8.1f}")
+    print(f"{'без убитых ({} шт.)'.format(size):<26} {remaining * 1000:8.1f}")
+    print(f"Гистограмма: {{{', '.join(f'{rt.name}: {n}' for rt, n in analytics.histogram().items())}}}")
+
+
+def run_players(count: int, work: Callable[[int], None]) -> float:
+    """Запустить work(номер игрока) в count потоках, время в секундах"""
+    threads = [threading.Thread(target=work, args=(index,)) for index in range(count)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def bench_world(size: int, players: List[int], operations: int, hold: float):
+    """Пропускная способность общего мира на пути игры: claim и release.
+
+    Каждый игрок в своей полосе карты забирает события комнат (монстр,
+    ловушка, сокровище) через SharedWorld.claim, hold секунд "обрабатывает"
+    его вне замков, как обработчик комнаты, и возвращает через release.
+    Один замок на всю карту (участок = карта) сравнивается с участками 8x8.
+    Затем все игроки наперегонки забирают все сокровища - каждое должно
+    достаться ровно одному."""
+    print(f"Карта {size}x{size}, {operations} событий на игрока, обработка {hold * 1000:.1f} мс")
+    print("Игроков   Один замок      Участки 8x8")
+    for count in players:
+        rates = []
+        for chunk in (size, 8):
+            world = SharedWorld(GameMap(size), chunk=chunk)
+            events = [(pos, EVENT_FLAGS[world.map.rooms[pos]['type']]) for pos in world.map.rooms
+                      if world.map.rooms[pos]['type'] in EVENT_FLAGS]
+
+            def play_band(index: int):
+                rng = random.Random(index)
+                top = index * size // count
+                bottom = max(top + 1, (index + 1) * size // count)
+                band = [event for event in events if top <= event[0][1] < bottom] or events
+                for _ in range(operations):
+                    position, flag = rng.choice(band)
+                    if world.claim(position, flag):
+                        if hold:
+                            time.sleep(hold)
+                        world.release(position, flag)
+
+            elapsed = run_players(count, play_band)
+            rates.append(count * operations / elapsed)
+        print(f"{count:7}  {rates[0]:9.0f} соб/с  {rates[1]:9.0f} соб/с")
+
+    world = SharedWorld(GameMap(size))
+    treasures = [pos for pos in world.map.rooms if world.map.rooms[pos]['has_treasure']]
+    claimed = [0] * max(players)
+
+    def loot(index: int):
+        order = treasures[:]
+        random.Random(index).shuffle(order)
+        for position in order:
+            claimed[index] += world.claim(position, 'has_treasure')
+
+    run_players(max(players), loot)
+    print(f"\nСокровищ: {len(treasures)}, забрано: {sum(claimed)}, "
+          f"осталось в индексе: {len(world.map.treasures)}")
+
+
+def main():
+    """Точка входа замеров"""
+    parser = argparse.ArgumentParser(description="Замеры производительности игры")
+    subparsers = parser.add_subparsers(dest='bench', required=True)
+
+    startup = subparsers.add_parser('startup', help="время запуска и перезапуска")
+    startup.add_argument('--sizes', type=int, nargs='+', default=[6, 64, 256])
+
+    bots = subparsers.add_parser('bots', help="сравнение ботов в симуляции")
+    bots.add_argument('--runs', type=int, default=500)
+    bots.add_argument('--param', action='append', default=[],
+                      help="параметр баланса, например monster_damage_per_level=6")
+
+    layout = subparsers.add_parser('layout', help="генерация планировки со стенами")
+    layout.add_argument('--sizes', type=int, nargs='+', default=[64, 256, 2048])
+
+    mapgen = subparsers.add_parser('mapgen', help="параллельная генерация большой карты")
+    mapgen.add_argument('--size', type=int, default=2048)
+    mapgen.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+
+    sessions = subparsers.add_parser('sessions', help="память простаивающих сессий")
+    sessions.add_argument('--count', type=int, default=2000)
+
+    world = subparsers.add_parser('world', help="общий мир для нескольких игроков")
+    world.add_argument('--size', type=int, default=64)
+    world.add_argument('--players', type=int, nargs='+', default=[1, 2, 4, 8])
+    world.add_argument('--operations', type=int, default=200)
+    world.add_argument('--hold', type=float, default=0.0005)
+
+    sampling = subparsers.add_parser('sampling', help="выбор по весам")
+    sampling.add_argument('--count', type=int, default=1000000)
+
+    analytics = subparsers.add_parser('analytics', help="счет комнат в прямоугольниках карты")
+    analytics.add_argument('--size', type=int, default=4096)
+    analytics.add_argument('--queries', type=int, default=2000)
+
+    args = parser.parse_args()
+    if args.bench == 'startup':
+        bench_startup(args.sizes)
+    elif args.bench == 'bots':
+        bench_bots(args.runs, args.param)
+    elif args.bench == 'layout':
+        bench_layout(args.sizes)
+    elif args.bench == 'mapgen':
+        bench_mapgen(args.size, args.workers)
+    elif args.bench == 'sessions':
+        bench_sessions(args.count)
+    elif args.bench == 'sampling':
+        bench_sampling(args.count)
+    elif args.bench == 'analytics':
+        bench_analytics(args.size, args.queries)
+    elif args.bench == 'world':
+        bench_world(args.size, args.players, args.operations, args.hold)
+
+
+if __name__ == "__main__":
+    main()
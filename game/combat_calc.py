@@ -0,0 +1,182 @@
+"""
+🎲 ТОЧНЫЙ КАЛЬКУЛЯТОР ИСХОДА БОЯ
+
+Урон игрока равномерно распределен в randint(10, 20) + оружие, а урон
+монстра фиксирован и уменьшается броней, поэтому исход боя можно
+посчитать точно: динамическим программированием с мемоизацией по
+состояниям (здоровье игрока, здоровье монстра, выпито зелий).
+
+Считается оптимальная игра на победу: в каждом состоянии выбирается
+атака или зелье (первое в инвентаре, как в игре), дающие наибольшую
+вероятность победы. Защита и побег победу не приближают и не
+рассматриваются.
+
+Таблица состояний строится один раз на бой (CombatSolver): следующие
+раунды того же боя и ветви советника только находят в ней свое
+состояние. Зелье регенерации лечит сразу на свою ценность, а затем по
+heal за ход еще turns - 1 ходов; бой идет внутри одного хода, поэтому
+это лечение не спасает в бою, но входит в ожидаемое здоровье после него.
+"""
+
+from functools import lru_cache
+from typing import Dict, Tuple, Optional, NamedTuple, Sequence, Callable
+
+
+# Базовый урон атаки игрока (см. Player.get_attack_damage)
+BASE_DAMAGE_RANGE = (10, 20)
+
+
+class CombatOutcome(NamedTuple):
+    """Точный исход боя"""
+    win_probability: float
+    expected_hp_loss: float
+
+
+def hit_after_armor(damage: int, armor: Optional[int]) -> int:
+    """Урон по игроку с учетом брони (как Player.take_damage)"""
+    if armor is not None:
+        return max(1, damage - armor)
+    return damage
+
+
+class CombatSolver:
+    """Таблица подзадач одного боя: характеристики фиксированы, меняются
+    только здоровье сторон и число выпитых зелий.
+
+    potions - лечение зелий по порядку инвентаря, regen - сколько каждое
+    из них долечит после боя, base_regen - сколько долечат уже идущие
+    зелья регенерации."""
+
+    def __init__(self, max_health: int, weapon: int, armor: Optional[int], monster_damage: int,
+                 potions: Tuple[int, ...] = (), regen: Tuple[int, ...] = (),
+                 base_regen: int = 0, use_potions: bool = True):
+        self.max_health = max_health
+        low, high = BASE_DAMAGE_RANGE
+        self.damages = range(low + weapon, high + weapon + 1)
+        self.chance = 1 / len(self.damages)
+        self.hit = hit_after_armor(monster_damage, armor)
+        self.potions = potions if use_potions else ()
+        # Лечение после боя в зависимости от числа выпитых зелий
+        self.after_fight = [base_regen]
+        for used in range(len(self.potions)):
+            self.after_fight.append(self.after_fight[-1] + (regen[used] if used < len(regen) else 0))
+        self.memo: Dict[Tuple[int, int, int], Tuple[float, float]] = {}
+
+    def after_hit(self, health: int, monster: int, used: int) -> Tuple[float, float]:
+        """Монстр бьет в ответ; (вероятность победы, ожидаемое здоровье)"""
+        health -= self.hit
+        if health <= 0:
+            return 0.0, 0.0
+        return self.value(health, monster, used)
+
+    def value(self, health: int, monster: int, used: int) -> Tuple[float, float]:
+        state = (health, monster, used)
+        memo = self.memo
+        if state in memo:
+            return memo[state]
+
+        chance = self.chance
+        # Здоровье при победе: с учетом лечения, которое придет после боя
+        won = min(self.max_health, health + self.after_fight[used])
+        win = 0.0
+        remaining = 0.0
+        for damage in self.damages:
+            left = monster - damage
+            if left <= 0:
+                win += chance
+                remaining += chance * won
+            else:
+                p, h = self.after_hit(health, left, used)
+                win += chance * p
+                remaining += chance * h
+        best = (win, remaining)
+
+        if used < len(self.potions) and health < self.max_health:
+            healed = min(self.max_health, health + self.potions[used])
+            drink = self.after_hit(healed, monster, used + 1)
+            if drink[0] > best[0] + 1e-12 or (abs(drink[0] - best[0]) <= 1e-12 and drink[1] > best[1]):
+                best = drink
+
+        memo[state] = best
+        return best
+
+    def outcome(self, health: int, monster_health: int, used: int = 0) -> CombatOutcome:
+        """Исход из состояния боя; used - сколько зелий уже выпито"""
+        win, remaining = self.value(health, monster_health, used)
+        return CombatOutcome(win, health - remaining)
+
+
+@lru_cache(maxsize=256)
+def solver_for(max_health: int, weapon: int, armor: Optional[int], monster_damage: int,
+               potions: Tuple[int, ...] = (), regen: Tuple[int, ...] = (),
+               base_regen: int = 0, use_potions: bool = True) -> CombatSolver:
+    """Общая таблица боя для набора характеристик (без здоровья сторон)"""
+    return CombatSolver(max_health, weapon, armor, monster_damage, potions, regen,
+                        base_regen, use_potions)
+
+
+def solve(player_health: int, player_max_health: int, weapon: int, armor: Optional[int],
+          monster_health: int, monster_damage: int, potions: Tuple[int, ...] = (),
+          use_potions: bool = True) -> CombatOutcome:
+    """Исход боя для набора характеристик"""
+    solver = solver_for(player_max_health, weapon, armor, monster_damage, potions,
+                        use_potions=use_potions)
+    return solver.outcome(player_health, monster_health)
+
+
+def fight_solver(player, monster, potion_effects: Optional[Dict[str, Tuple[int, int]]] = None,
+                 base_regen: int = 0, use_potions: bool = True) -> CombatSolver:
+    """Таблица боя текущего игрока с монстром.
+
+    potion_effects - зелья длительного действия (POTION_EFFECTS игры):
+    такое зелье долечивает heal * (turns - 1) после боя."""
+    effects = potion_effects or {}
+    potions = [item for item in player.inventory if item.type == "potion"]
+    regen = []
+    for item in potions:
+        heal, turns = effects.get(item.name, (0, 1))
+        regen.append(heal * (turns - 1))
+    return CombatSolver(
+        player.max_health,
+        player.weapon.value if player.weapon else 0,
+        player.armor.value if player.armor else None,
+        monster.damage,
+        tuple(item.value for item in potions),
+        tuple(regen),
+        base_regen,
+        use_potions
+    )
+
+
+def threat_level(outcome: CombatOutcome) -> str:
+    """Словесная оценка опасности боя"""
+    if outcome.win_probability >= 0.95:
+        return "🟢 низкая"
+    if outcome.win_probability >= 0.7:
+        return "🟡 средняя"
+    if outcome.win_probability >= 0.4:
+        return "🟠 высокая"
+    return "🔴 смертельная"
+
+
+def level_table(levels: Sequence[int], monster_stats: Callable[[int], Tuple[int, int]],
+                weapon: int = 2, armor: Optional[int] = 1, potions: Tuple[int, ...] = (30,)):
+    """Таблица шансов игрока нужного уровня против монстра того же уровня"""
+    print("Уровень  Здоровье  Монстр HP/урон  Победа   Потеря HP")
+    for level in levels:
+        max_health = 100 + 20 * (level - 1)
+        monster_health, monster_damage = monster_stats(level)
+        outcome = solve(max_health, max_health, weapon, armor,
+                        monster_health, monster_damage, potions)
+        print(f"{level:7}  {max_health:8}  {monster_health:8}/{monster_damage:<5}"
+              f"{outcome.win_probability:7.1%}  {outcome.expected_hp_loss:9.1f}")
+
+
+if __name__ == "__main__":
+    from game import Monster
+
+    def monster_stats(level: int) -> Tuple[int, int]:
+        monster = Monster(level)
+        return monster.health, monster.damage
+
+    level_table(range(1, 11), monster_stats)
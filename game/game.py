@@ -11,15 +11,76 @@ Copyright (c) 2024 [Ваше Имя]
 Подробнее: https://opensource.org/licenses/MIT
 """
 
+import argparse
 import os
+import types
 import time
 import random
 import json
 import sys
+import queue
+import threading
 from enum import Enum
 from datetime import datetime
-from typing import Dict, List, Tuple, Optional, Any
-
+from functools import lru_cache
+from typing import Dict, List, Tuple, Optional, Any, Callable
+
+from advisor import CombatAdvisor, format_advice
+from analytics import MapAnalytics
+from combat_calc import fight_solver, threat_level
+from history import GameHistory, Snapshot
+from layout import EAST, LAYOUTS, NORTH, SOUTH, WEST, Layout, generate_layout, open_layout
+from mapgen import SharedRooms, generate_types
+from sampling import AliasSampler
+from stats import RunStats
+from telemetry import TelemetryLog
+from scheduler import TimerWheel
+
+
+# ⚖️ Параметры баланса
+MONSTER_BASE_HEALTH = 20
+MONSTER_HEALTH_PER_LEVEL = 10
+MONSTER_BASE_DAMAGE = 5
+MONSTER_DAMAGE_PER_LEVEL = 1
+MONSTER_EXPERIENCE_PER_LEVEL = 10
+MONSTER_GOLD_RANGE = (5, 20)
+TRAP_DAMAGE_RANGE = (10, 30)
+TREASURE_GOLD_RANGE = (20, 100)
+
+# Радиус обзора: без факела и с факелом
+VIEW_RADIUS = 1
+TORCH_VIEW_RADIUS = 2
+
+# Чутье опасности на карте и у ботов: живые монстры и взведенные ловушки
+# в квадрате DANGER_RADIUS вокруг клетки
+DANGER_RADIUS = 2
+
+# Версия формата сохранения: заголовок в первой строке, карта по рядам
+SAVE_FORMAT_VERSION = 2
+
+# Сводная статистика всех прохождений (фиксированного размера)
+STATS_FILE = "runstats.json"
+
+# События мира по ходам: через сколько ходов ловушка взводится снова,
+# монстр возвращается в логово и магазин пополняет запасы
+TRAP_REARM_TURNS = 40
+MONSTER_RESPAWN_TURNS = 60
+SHOP_RESTOCK_TURNS = 50
+SHOP_STOCK = 3
+
+# Зелья длительного действия: (лечение за ход, число ходов)
+POTION_EFFECTS = {
+    "Зелье регенерации": (10, 5)
+}
+
+# Возможная добыча в сокровищнице: (название, описание, тип, ценность)
+TREASURE_LOOT = [
+    ("Золотой слиток", "Ценный металл", "treasure", 50),
+    ("Волшебный амулет", "Таинственный артефакт", "treasure", 75),
+    ("Древний свиток", "Записи древних мудрецов", "treasure", 60),
+    ("Самоцвет", "Сверкающий драгоценный камень", "treasure", 40),
+    ("Королевская корона", "Дорогая регалия", "treasure", 100)
+]
 
 class GameState(Enum):
     """Состояния игры"""
@@ -45,6 +106,21 @@ class Direction(Enum):
         self.ru_direction = ru_direction
 
 
+# Бит прохода в маске клетки и смещение для каждого направления
+DIRECTION_BITS = {
+    Direction.NORTH: NORTH,
+    Direction.SOUTH: SOUTH,
+    Direction.EAST: EAST,
+    Direction.WEST: WEST
+}
+DIRECTION_OFFSETS = {
+    Direction.NORTH: (0, -1),
+    Direction.SOUTH: (0, 1),
+    Direction.EAST: (1, 0),
+    Direction.WEST: (-1, 0)
+}
+
+
 class RoomType(Enum):
     """Типы комнат"""
     EMPTY = ("Пустая комната", "⬜", 60)
@@ -60,15 +136,33 @@ class RoomType(Enum):
         self.weight = weight
 
 
+# Типы случайных комнат (выход ставится отдельно) и выбор среди них по весам
+GENERATED_ROOM_TYPES = tuple(rt for rt in RoomType if rt != RoomType.EXIT)
+ROOM_TYPE_SAMPLER = AliasSampler(GENERATED_ROOM_TYPES, [rt.weight for rt in GENERATED_ROOM_TYPES])
+
+# Флаг события комнаты: снят - событие обработано (для аналитики карты)
+EVENT_FLAGS = {
+    RoomType.TREASURE: 'has_treasure',
+    RoomType.MONSTER: 'has_monster',
+    RoomType.TRAP: 'is_trap_active',
+}
+
+
 class Item:
     """Класс предмета"""
 
+    __slots__ = ('name', 'description', 'type', 'value')
+
     def __init__(self, name: str, description: str, item_type: str, value: int = 0):
         self.name = name
         self.description = description
         self.type = item_type  # weapon, armor, potion, key, treasure
         self.value = value
 
+    def __reduce__(self):
+        # После pickle предмет снова указывает на общий экземпляр
+        return shared_item, (self.name, self.description, self.type, self.value)
+
     def __str__(self):
         return f"{self.name} - {self.description}"
 
@@ -76,6 +170,9 @@ class Item:
 class Player:
     """Класс игрока"""
 
+    __slots__ = ('name', 'health', 'max_health', 'inventory', 'position', 'gold', 'score',
+                 'level', 'experience', 'kills', 'weapon', 'armor')
+
     def __init__(self, name: str):
         self.name = name
         self.health = 100
@@ -195,31 +292,92 @@ class Player:
         return "\n".join(result)
 
 
+# Части имен монстров
+MONSTER_PREFIXES = ['Яростный', 'Древний', 'Могучий', 'Жуткий', 'Коварный']
+MONSTER_TYPES = ['Гоблин', 'Орк', 'Тролль', 'Скелет', 'Зомби', 'Паук', 'Волк']
+MONSTER_SUFFIXES = ['Разрушитель', 'Убийца', 'Пожиратель', 'Страж', 'Властитель']
+
+
+def build_monster_names() -> Tuple[str, ...]:
+    """Таблица имен, равномерный выбор из которой дает прежнее распределение:
+    30% 'Префикс Тип', 35% 'Тип Суффикс', 35% просто 'Тип'.
+    Каждое сочетание повторено пропорционально своей вероятности (из 700)."""
+    names = []
+    for monster_type in MONSTER_TYPES:
+        for prefix in MONSTER_PREFIXES:
+            names.extend([f"{prefix} {monster_type}"] * 6)
+        for suffix in MONSTER_SUFFIXES:
+            names.extend([f"{monster_type} {suffix}"] * 7)
+        names.extend([monster_type] * 35)
+    return tuple(names)
+
+
+MONSTER_NAMES = build_monster_names()
+
+
+class MonsterTemplates:
+    """Заранее посчитанные характеристики монстров по уровням"""
+
+    def __init__(self, base_health: int = MONSTER_BASE_HEALTH,
+                 health_per_level: int = MONSTER_HEALTH_PER_LEVEL,
+                 base_damage: int = MONSTER_BASE_DAMAGE,
+                 damage_per_level: int = MONSTER_DAMAGE_PER_LEVEL,
+                 experience_per_level: int = MONSTER_EXPERIENCE_PER_LEVEL,
+                 gold_range: Tuple[int, int] = MONSTER_GOLD_RANGE,
+                 max_level: int = 50):
+        self.base_health = base_health
+        self.health_per_level = health_per_level
+        self.base_damage = base_damage
+        self.damage_per_level = damage_per_level
+        self.experience_per_level = experience_per_level
+        self.gold_range = gold_range
+        self.table = [self.build(level) for level in range(max_level + 1)]
+
+    def build(self, level: int) -> Tuple[int, int, int, int, int]:
+        """(здоровье, урон, опыт, мин. золото, разброс золота) для уровня"""
+        return (
+            self.base_health + level * self.health_per_level,
+            self.base_damage + level * self.damage_per_level,
+            self.experience_per_level * level,
+            self.gold_range[0],
+            self.gold_range[1] - self.gold_range[0] + 1
+        )
+
+    def get(self, level: int) -> Tuple[int, int, int, int, int]:
+        """Характеристики уровня (за пределами таблицы считаются на лету)"""
+        if 0 <= level < len(self.table):
+            return self.table[level]
+        return self.build(level)
+
+
+DEFAULT_MONSTER_TEMPLATES = MonsterTemplates()
+
+
 class Monster:
     """Класс монстра"""
 
-    def __init__(self, level: int = 1):
+    __slots__ = ('level', 'name', 'health', 'max_health', 'damage', 'experience', 'gold')
+
+    def __init__(self, level: int = 1, templates: MonsterTemplates = DEFAULT_MONSTER_TEMPLATES,
+                 rng: Any = random):
+        self.reset(level, templates, rng)
+
+    def reset(self, level: int, templates: MonsterTemplates = DEFAULT_MONSTER_TEMPLATES,
+              rng: Any = random):
+        """Заполнить монстра характеристиками уровня из таблицы"""
+        health, damage, experience, gold_min, gold_span = templates.get(level)
         self.level = level
-        self.name = self.generate_name()
-        self.health = 20 + (level * 10)
-        self.max_health = self.health
-        self.damage = 5 + level
-        self.experience = 10 * level
-        self.gold = random.randint(5, 20) * level
+        self.name = self.generate_name(rng)
+        self.health = health
+        self.max_health = health
+        self.damage = damage
+        self.experience = experience
+        self.gold = (gold_min + rng.randrange(gold_span)) * level
 
     @staticmethod
-    def generate_name() -> str:
+    def generate_name(rng: Any = random) -> str:
         """Генерация имени монстра"""
-        prefixes = ['Яростный', 'Древний', 'Могучий', 'Жуткий', 'Коварный']
-        types = ['Гоблин', 'Орк', 'Тролль', 'Скелет', 'Зомби', 'Паук', 'Волк']
-        suffixes = ['Разрушитель', 'Убийца', 'Пожиратель', 'Страж', 'Властитель']
-
-        if random.random() < 0.3:
-            return f"{random.choice(prefixes)} {random.choice(types)}"
-        elif random.random() < 0.5:
-            return f"{random.choice(types)} {random.choice(suffixes)}"
-        else:
-            return random.choice(types)
+        return MONSTER_NAMES[rng.randrange(len(MONSTER_NAMES))]
 
     def take_damage(self, damage: int) -> bool:
         """Получение урона монстром"""
@@ -234,30 +392,103 @@ class Monster:
         return f"[{'█' * filled}{'░' * (health_bar_length - filled)}] {self.health}/{self.max_health}"
 
 
+class MonsterPool:
+    """Пул переиспользуемых монстров для массовой симуляции"""
+
+    def __init__(self, templates: MonsterTemplates = DEFAULT_MONSTER_TEMPLATES):
+        self.templates = templates
+        self.free: List[Monster] = []
+
+    def acquire(self, level: int, rng: Any = random) -> Monster:
+        """Взять монстра из пула (или создать, если пул пуст)"""
+        if self.free:
+            monster = self.free.pop()
+            monster.reset(level, self.templates, rng)
+            return monster
+        return Monster(level, self.templates, rng)
+
+    def release(self, monster: Monster):
+        """Вернуть монстра в пул"""
+        self.free.append(monster)
+
+
+# Общий каталог магазина: предметы неизменяемы, поэтому все сессии и
+# инвентари ссылаются на одни и те же объекты
+SHOP_CATALOG: Tuple[Item, ...] = (
+    Item("Малое зелье здоровья", "Восстанавливает 30 HP", "potion", 30),
+    Item("Большое зелье здоровья", "Восстанавливает 60 HP", "potion", 60),
+    Item("Стальной меч", "+5 к урону", "weapon", 5),
+    Item("Мифриловый меч", "+10 к урону", "weapon", 10),
+    Item("Кожаная броня", "+3 к защите", "armor", 3),
+    Item("Стальная броня", "+7 к защите", "armor", 7),
+    Item("Карта сокровищ", "Показывает ближайшее сокровище", "other", 0),
+    Item("Факел", "Помогает избегать ловушек", "other", 0),
+    Item("Зелье регенерации", "Восстанавливает 10 HP за ход в течение 5 ходов", "potion", 10)
+)
+SHOP_PRICES = types.MappingProxyType({
+    "Малое зелье здоровья": 20,
+    "Большое зелье здоровья": 40,
+    "Стальной меч": 50,
+    "Мифриловый меч": 100,
+    "Кожаная броня": 30,
+    "Стальная броня": 70,
+    "Карта сокровищ": 25,
+    "Факел": 15,
+    "Зелье регенерации": 35
+})
+
+STARTER_ITEMS: Tuple[Item, ...] = (
+    Item("Деревянный меч", "Простое оружие новичка", "weapon", 2),
+    Item("Кожаный доспех", "Легкая защита", "armor", 1),
+    Item("Малое зелье здоровья", "Восстанавливает 30 HP", "potion", 30),
+    Item("Карта подземелья", "Показывает ваше местоположение", "other", 0),
+    Item("Факел", "Освещает путь", "other", 0)
+)
+TREASURE_ITEMS: Tuple[Item, ...] = tuple(Item(*loot) for loot in TREASURE_LOOT)
+TREASURE_SAMPLER = AliasSampler(TREASURE_ITEMS)
+
+# Все общие предметы по полям - для повторного использования при загрузке
+SHARED_ITEMS = {
+    (item.name, item.description, item.type, item.value): item
+    for item in SHOP_CATALOG + STARTER_ITEMS + TREASURE_ITEMS
+}
+
+
+def shared_item(name: str, description: str, item_type: str, value: int = 0) -> Item:
+    """Общий предмет с такими полями или новый, если такого нет"""
+    item = SHARED_ITEMS.get((name, description, item_type, value))
+    if item is None:
+        item = Item(name, description, item_type, value)
+    return item
+
+
 class Shop:
-    """Класс магазина"""
+    """Класс магазина: товары и цены общие, у сессии только запасы"""
+
+    __slots__ = ('stock',)
+
+    items = SHOP_CATALOG
+    prices = SHOP_PRICES
 
     def __init__(self):
-        self.items = [
-            Item("Малое зелье здоровья", "Восстанавливает 30 HP", "potion", 30),
-            Item("Большое зелье здоровья", "Восстанавливает 60 HP", "potion", 60),
-            Item("Стальной меч", "+5 к урону", "weapon", 5),
-            Item("Мифриловый меч", "+10 к урону", "weapon", 10),
-            Item("Кожаная броня", "+3 к защите", "armor", 3),
-            Item("Стальная броня", "+7 к защите", "armor", 7),
-            Item("Карта сокровищ", "Показывает ближайшее сокровище", "other", 0),
-            Item("Факел", "Помогает избегать ловушек", "other", 0)
-        ]
-        self.prices = {
-            "Малое зелье здоровья": 20,
-            "Большое зелье здоровья": 40,
-            "Стальной меч": 50,
-            "Мифриловый меч": 100,
-            "Кожаная броня": 30,
-            "Стальная броня": 70,
-            "Карта сокровищ": 25,
-            "Факел": 15
-        }
+        # None - все товары в полном запасе (словарь заводится при первой покупке)
+        self.stock: Optional[Dict[str, int]] = None
+
+    def restock(self):
+        """Вернуть запасы всех товаров к полному"""
+        self.stock = None
+
+    def available(self, name: str) -> int:
+        """Сколько единиц товара осталось"""
+        if self.stock is None:
+            return SHOP_STOCK
+        return self.stock.get(name, SHOP_STOCK)
+
+    def sell(self, name: str):
+        """Списать одну единицу товара"""
+        if self.stock is None:
+            self.stock = {}
+        self.stock[name] = self.available(name) - 1
 
     def show_items(self, player: Player) -> str:
         """Показать товары в магазине"""
@@ -266,7 +497,9 @@ class Shop:
         for i, item in enumerate(self.items, 1):
             price = self.prices[item.name]
             affordable = "🟢" if player.gold >= price else "🔴"
-            result.append(f"{i}. {affordable} {item.name} - {price} золота")
+            left = self.available(item.name)
+            availability = f"осталось {left}" if left else "нет в наличии"
+            result.append(f"{i}. {affordable} {item.name} - {price} золота ({availability})")
             result.append(f"   📝 {item.description}")
 
         result.append("="*40)
@@ -275,80 +508,413 @@ class Shop:
         return "\n".join(result)
 
 
+class TreasureIndex:
+    """Пространственный индекс сокровищ: сетка корзин bucket x bucket.
+
+    Поиск ближайшего обходит корзины кольцами от позиции игрока и
+    останавливается, как только следующее кольцо заведомо дальше
+    найденного, поэтому не просматривает всю карту."""
+
+    def __init__(self, size: int, bucket: int = 8):
+        self.size = size
+        self.bucket = bucket
+        self.buckets_per_side = (size + bucket - 1) // bucket
+        # Без общего счетчика: корзина меняется только под замком своего
+        # участка общего мира, и другим участкам писать больше некуда
+        self.buckets: Dict[Tuple[int, int], set] = {}
+
+    def __len__(self) -> int:
+        return sum(map(len, tuple(self.buckets.values())))
+
+    def __contains__(self, position: Tuple[int, int]) -> bool:
+        key = (position[0] // self.bucket, position[1] // self.bucket)
+        return position in self.buckets.get(key, ())
+
+    def add(self, position: Tuple[int, int]):
+        """Добавить сокровище"""
+        key = (position[0] // self.bucket, position[1] // self.bucket)
+        self.buckets.setdefault(key, set()).add(position)
+
+    def remove(self, position: Tuple[int, int]):
+        """Убрать сокровище (если оно есть в индексе)"""
+        key = (position[0] // self.bucket, position[1] // self.bucket)
+        cell = self.buckets.get(key)
+        if cell and position in cell:
+            cell.remove(position)
+            if not cell:
+                del self.buckets[key]
+
+    def ring(self, center: Tuple[int, int], radius: int):
+        """Корзины на чебышевском расстоянии radius от центральной"""
+        cx, cy = center
+        if radius == 0:
+            yield center
+            return
+        for bx in range(cx - radius, cx + radius + 1):
+            yield bx, cy - radius
+            yield bx, cy + radius
+        for by in range(cy - radius + 1, cy + radius):
+            yield cx - radius, by
+            yield cx + radius, by
+
+    def k_nearest(self, position: Tuple[int, int], k: int) -> List[Tuple[int, Tuple[int, int]]]:
+        """k ближайших сокровищ: список (шагов, позиция) по возрастанию"""
+        if k <= 0 or not self.buckets:
+            return []
+        x, y = position
+        center = (x // self.bucket, y // self.bucket)
+        found: List[Tuple[int, Tuple[int, int]]] = []
+
+        for radius in range(self.buckets_per_side + 1):
+            # Любая клетка кольца radius не ближе (radius - 1) * bucket + 1 шагов
+            if len(found) >= k and (radius - 1) * self.bucket + 1 > found[k - 1][0]:
+                break
+            for key in self.ring(center, radius):
+                # Копия корзины: в общем мире ее могут менять другие потоки
+                for pos in tuple(self.buckets.get(key, ())):
+                    found.append((abs(pos[0] - x) + abs(pos[1] - y), pos))
+            found.sort()
+            del found[k:]
+
+        return found
+
+    def nearest(self, position: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """Ближайшее по числу шагов сокровище или None"""
+        result = self.k_nearest(position, 1)
+        return result[0][1] if result else None
+
+
+@lru_cache(maxsize=None)
+def view_offsets(radius: int) -> Tuple[Tuple[int, int], ...]:
+    """Смещения клеток, попадающих в круг обзора заданного радиуса"""
+    return tuple(
+        (dx, dy)
+        for dx in range(-radius, radius + 1)
+        for dy in range(-radius, radius + 1)
+        if dx * dx + dy * dy <= radius * radius + radius
+    )
+
+
+# Описания комнат по типу (общие строки для всех карт)
+ROOM_DESCRIPTIONS: Dict[RoomType, List[str]] = {
+    RoomType.EMPTY: [
+        "Пустая каменная комната. Слышно капание воды.",
+        "Заброшенное помещение. Пахнет плесенью.",
+        "Небольшая комнатка с разбитой посудой.",
+        "Зал с колоннами. Эхо разносит каждый звук."
+    ],
+    RoomType.TREASURE: [
+        "Комната сверкает золотом! Здесь явно есть сокровища!",
+        "Сундук стоит посреди комнаты. Он выглядит старым, но целым.",
+        "На столе разбросаны драгоценные камни и монеты."
+    ],
+    RoomType.MONSTER: [
+        "Из темноты слышно рычание... Здесь кто-то есть!",
+        "На стенах видны свежие царапины. Будьте осторожны!",
+        "Воздух наполнен зловонием. Что-то большое здесь обитает."
+    ],
+    RoomType.TRAP: [
+        "Пол выглядит подозрительно... Возможно, здесь ловушки.",
+        "На стенах видны отверстия для стрел. Опасно!",
+        "Деревянные доски на полу выглядят ненадежно."
+    ],
+    RoomType.SHOP: [
+        "Небольшая лавка со множеством товаров.",
+        "Старик за прилавком смотрит на вас с интересом.",
+        "Полки ломятся от различных предметов и зелий."
+    ],
+    RoomType.EXIT: [
+        "🚪 Выход из подземелья!",
+        "Свет проникает в комнату. Это выход!",
+        "Дверь с золотой ручкой ведет на свободу!"
+    ]
+}
+
+SHARED_DESCRIPTIONS = {text: text for texts in ROOM_DESCRIPTIONS.values() for text in texts}
+DESCRIPTION_SAMPLERS = {room_type: AliasSampler(texts) for room_type, texts in ROOM_DESCRIPTIONS.items()}
+
+
+class Room:
+    """Комната карты: слоты вместо словаря, но доступ как к словарю
+    (room['processed']), чтобы не менять код, работающий с комнатами"""
+
+    __slots__ = ('type', 'visited', 'description', 'processed',
+                 'has_treasure', 'has_monster', 'is_trap_active')
+
+    def __init__(self, room_type: RoomType, visited: bool, description: str, processed: bool):
+        self.type = room_type
+        self.visited = visited
+        self.description = description
+        self.processed = processed
+        self.has_treasure = room_type == RoomType.TREASURE and not processed
+        self.has_monster = room_type == RoomType.MONSTER and not processed
+        self.is_trap_active = room_type == RoomType.TRAP and not processed
+
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any):
+        setattr(self, key, value)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def __getstate__(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state: tuple):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+        # Описание - снова общая строка, а не копия из pickle
+        self.description = SHARED_DESCRIPTIONS.get(self.description, self.description)
+
+
 class GameMap:
     """Класс игровой карты"""
 
-    def __init__(self, size: int = 6):
+    # Однобуквенные коды типов комнат для компактного сохранения
+    ROOM_CODES = {room_type: str(i) for i, room_type in enumerate(RoomType)}
+    ROOM_TYPES_BY_CODE = {code: room_type for room_type, code in ROOM_CODES.items()}
+
+    # Аналитика строится лениво и в сохранение не попадает
+    _analytics: Optional[MapAnalytics] = None
+
+    def __init__(self, size: int = 6, generate: bool = True, layout: str = 'open'):
         self.size = size
-        self.rooms: Dict[Tuple[int, int], dict] = {}
-        self.generate_map()
+        self.rooms: Dict[Tuple[int, int], Room] = {}
+        # Стены и коридоры: маска открытых проходов на клетку
+        self.layout_kind = layout
+        self.layout: Layout = generate_layout(layout, size) if generate else open_layout(size)
+        # Туман войны: бит на клетку - видел ли игрок комнату
+        self.seen = bytearray((size * size + 7) // 8)
+        self.visible: set = set()
+        self.treasures = TreasureIndex(size)
+        if generate:
+            self.generate_map()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state.pop('_analytics', None)
+        return state
+
+    def make_room(self, room_type: RoomType, visited: bool = False, processed: bool = False) -> Room:
+        """Создать комнату с флагами, согласованными с обработкой"""
+        return Room(room_type, visited, self.get_room_description(room_type), processed)
+
+    @property
+    def exit(self) -> Tuple[int, int]:
+        """Позиция выхода"""
+        return self.layout.exit
+
+    def can_move(self, position: Tuple[int, int], direction: Direction) -> bool:
+        """Есть ли проход из клетки в заданном направлении"""
+        return self.layout.is_open(position, DIRECTION_BITS[direction])
+
+    def dump_rows(self, f):
+        """Записать комнаты в файл построчно: одна строка JSON на ряд карты.
+
+        В памяти одновременно находится только текущий ряд."""
+        codes = self.ROOM_CODES
+        passages = self.layout.passages
+        for y in range(self.size):
+            types = []
+            flags = []
+            for x in range(self.size):
+                room = self.peek_room((x, y))
+                types.append(codes[room['type']])
+                flags.append(str(int(room['visited'])
+                                 | int(room['processed']) << 1
+                                 | int(self.is_seen((x, y))) << 2))
+            walls = passages[y * self.size:(y + 1) * self.size].hex()
+            f.write(json.dumps({'row': y, 'types': "".join(types), 'flags': "".join(flags),
+                                'passages': walls}))
+            f.write("\n")
+
+    def load_row(self, record: dict):
+        """Восстановить один ряд карты из записи dump_rows"""
+        y = record['row']
+        types = record['types']
+        flags = record['flags']
+        if not 0 <= y < self.size or len(types) != self.size or len(flags) != self.size:
+            raise ValueError(f"Поврежденный ряд карты: {y}")
+
+        for x in range(self.size):
+            flag = int(flags[x])
+            self.rooms[(x, y)] = self.make_room(
+                self.ROOM_TYPES_BY_CODE[types[x]],
+                visited=bool(flag & 1),
+                processed=bool(flag & 2)
+            )
+            if flag & 4:
+                self.mark_seen((x, y))
+
+        # Сохранения без стен остаются открытым полем
+        if 'passages' in record:
+            walls = bytes.fromhex(record['passages'])
+            if len(walls) != self.size:
+                raise ValueError(f"Поврежденные стены ряда: {y}")
+            self.layout.passages[y * self.size:(y + 1) * self.size] = walls
+
+    @classmethod
+    def load_rows(cls, f, size: int, exit_pos: Optional[Tuple[int, int]] = None,
+                  layout: str = 'open') -> 'GameMap':
+        """Собрать карту, читая ряды из файла по одному"""
+        game_map = cls(size, generate=False, layout=layout)
+        if exit_pos is not None:
+            game_map.layout.exit = exit_pos
+        for line in f:
+            if line.strip():
+                game_map.load_row(json.loads(line))
+        if len(game_map.rooms) != size * size:
+            raise ValueError("В сохранении не хватает рядов карты")
+        game_map.build_treasure_index()
+        return game_map
 
     def generate_map(self):
         """Генерация случайной карты"""
-        # Создаем все комнаты
-        room_types = [rt for rt in RoomType if rt != RoomType.EXIT]
-        weights = [rt.weight for rt in room_types]
-
+        # Создаем все комнаты: типы целого столбца карты - одной выборкой
+        rooms = self.rooms
+        descriptions = DESCRIPTION_SAMPLERS
         for x in range(self.size):
-            for y in range(self.size):
-                room_type = random.choices(room_types, weights=weights)[0]
-                self.rooms[(x, y)] = {
-                    'type': room_type,
-                    'visited': False,
-                    'description': self.get_room_description(room_type),
-                    'processed': False,
-                    'has_treasure': room_type == RoomType.TREASURE,
-                    'has_monster': room_type == RoomType.MONSTER,
-                    'is_trap_active': room_type == RoomType.TRAP
-                }
-
+            column = ROOM_TYPE_SAMPLER.sample_n(self.size)
+            for y, room_type in enumerate(column):
+                rooms[(x, y)] = Room(room_type, False, descriptions[room_type].sample(), False)
+
+        self.place_landmarks()
+
+    @classmethod
+    def generate_shared(cls, size: int, seed: int, workers: Optional[int] = None,
+                        layout: str = 'open') -> 'GameMap':
+        """Генерация большой карты в нескольких процессах.
+
+        Типы комнат заполняются по плиткам в общей памяти и подключаются к
+        карте без копирования; при одном seed карта одна и та же при любом
+        числе процессов."""
+        game_map = cls(size, generate=False, layout=layout)
+        game_map.layout = generate_layout(layout, size, random.Random(seed))
+        room_types = list(RoomType)
+        shared = generate_types(size, [rt.weight for rt in room_types], seed, workers)
+        game_map.rooms = SharedRooms(size, shared.types, room_types, game_map.make_room, shared)
+        game_map.place_landmarks()
+        return game_map
+
+    def place_landmarks(self):
+        """Поставить вход и выход и проиндексировать сокровища"""
         # Устанавливаем стартовую позицию
-        self.rooms[(0, 0)]['type'] = RoomType.EMPTY
-        self.rooms[(0, 0)]['visited'] = True
-        self.rooms[(0, 0)]['processed'] = True
+        self.rooms[(0, 0)] = self.make_room(RoomType.EMPTY, visited=True, processed=True)
 
-        # Устанавливаем выход
-        exit_pos = (self.size-1, self.size-1)
-        self.rooms[exit_pos]['type'] = RoomType.EXIT
+        # Устанавливаем выход (планировка уже проверила, что он достижим)
+        exit_pos = self.exit
+        self.rooms[exit_pos] = self.make_room(RoomType.EXIT)
         self.rooms[exit_pos]['description'] = "🚪 Выход из подземелья!"
 
+        self.build_treasure_index()
+
+    def build_treasure_index(self):
+        """Проиндексировать комнаты с еще не взятыми сокровищами"""
+        self.treasures = TreasureIndex(self.size)
+        # Аналитика пересоберется по новым комнатам при следующем запросе
+        self._analytics = None
+        rooms = self.rooms
+        if isinstance(rooms, SharedRooms):
+            # Большая карта: ищем по буферу кодов, не создавая словари комнат
+            for pos in rooms.positions_of(RoomType.TREASURE):
+                room = rooms.cache.get(pos)
+                if room is None or room['has_treasure']:
+                    self.treasures.add(pos)
+            return
+        for pos, room in rooms.items():
+            if room['has_treasure']:
+                self.treasures.add(pos)
+
+    @property
+    def analytics(self) -> MapAnalytics:
+        """Гистограммы и счет комнат по прямоугольникам (строится при первом запросе)"""
+        if self._analytics is None:
+            self._analytics = self.build_analytics()
+        return self._analytics
+
+    def build_analytics(self) -> MapAnalytics:
+        """Собрать коды типов по карте и отметить уже обработанные события"""
+        rooms = self.rooms
+        if isinstance(rooms, SharedRooms):
+            # Большая карта: коды уже лежат в буфере, комнаты - только тронутые
+            analytics = MapAnalytics(self.size, rooms.types, rooms.room_types)
+            touched = rooms.cache.items()
+        else:
+            index = {room_type: i for i, room_type in enumerate(RoomType)}
+            codes = bytearray(self.size * self.size)
+            for (x, y), room in rooms.items():
+                codes[y * self.size + x] = index[room['type']]
+            analytics = MapAnalytics(self.size, codes, list(RoomType))
+            touched = rooms.items()
+        for position, room in touched:
+            flag = EVENT_FLAGS.get(room['type'])
+            if flag is not None and not room[flag]:
+                analytics.set_cleared(position, room['type'], True)
+        return analytics
+
+    def sync_room(self, position: Tuple[int, int]):
+        """Согласовать индексы карты с флагами комнаты (после отката хода)"""
+        room = self.rooms[position]
+        if room['has_treasure']:
+            self.treasures.add(position)
+        else:
+            self.treasures.remove(position)
+        flag = EVENT_FLAGS.get(room['type'])
+        if flag is not None and self._analytics is not None:
+            self._analytics.record(position, room['type'], not room[flag])
+
+    def count_rooms(self, room_type: RoomType, x0: int, y0: int, x1: int, y1: int,
+                    remaining: bool = False) -> int:
+        """Комнат типа в прямоугольнике [x0, x1) x [y0, y1); remaining - без обработанных"""
+        if remaining:
+            return self.analytics.remaining(room_type, x0, y0, x1, y1)
+        return self.analytics.count(room_type, x0, y0, x1, y1)
+
+    def danger(self, position: Tuple[int, int], radius: int = DANGER_RADIUS) -> Tuple[int, int]:
+        """Живых монстров и взведенных ловушек вокруг клетки"""
+        analytics = self.analytics
+        return (analytics.remaining_around((RoomType.MONSTER,), position, radius),
+                analytics.remaining_around((RoomType.TRAP,), position, radius))
+
+    def claim(self, position: Tuple[int, int], flag: str) -> bool:
+        """Забрать событие комнаты (has_treasure, has_monster, is_trap_active).
+
+        True - флаг снял именно этот вызов; в общем мире вызывается под
+        замком участка (world.SharedWorld)"""
+        room = self.rooms[position]
+        if not room[flag]:
+            return False
+        room[flag] = False
+        room['processed'] = True
+        if flag == 'has_treasure':
+            self.treasures.remove(position)
+        if self._analytics is not None and EVENT_FLAGS.get(room['type']) == flag:
+            self._analytics.record(position, room['type'], True)
+        return True
+
+    def release(self, position: Tuple[int, int], flag: str):
+        """Вернуть событие комнаты (монстр вернулся, ловушка взведена)"""
+        room = self.rooms[position]
+        room[flag] = True
+        room['processed'] = False
+        if flag == 'has_treasure':
+            self.treasures.add(position)
+        if self._analytics is not None and EVENT_FLAGS.get(room['type']) == flag:
+            self._analytics.record(position, room['type'], False)
+
     @staticmethod
     def get_room_description(room_type: RoomType) -> str:
         """Получить описание комнаты"""
-        descriptions = {
-            RoomType.EMPTY: [
-                "Пустая каменная комната. Слышно капание воды.",
-                "Заброшенное помещение. Пахнет плесенью.",
-                "Небольшая комнатка с разбитой посудой.",
-                "Зал с колоннами. Эхо разносит каждый звук."
-            ],
-            RoomType.TREASURE: [
-                "Комната сверкает золотом! Здесь явно есть сокровища!",
-                "Сундук стоит посреди комнаты. Он выглядит старым, но целым.",
-                "На столе разбросаны драгоценные камни и монеты."
-            ],
-            RoomType.MONSTER: [
-                "Из темноты слышно рычание... Здесь кто-то есть!",
-                "На стенах видны свежие царапины. Будьте осторожны!",
-                "Воздух наполнен зловонием. Что-то большое здесь обитает."
-            ],
-            RoomType.TRAP: [
-                "Пол выглядит подозрительно... Возможно, здесь ловушки.",
-                "На стенах видны отверстия для стрел. Опасно!",
-                "Деревянные доски на полу выглядят ненадежно."
-            ],
-            RoomType.SHOP: [
-                "Небольшая лавка со множеством товаров.",
-                "Старик за прилавком смотрит на вас с интересом.",
-                "Полки ломятся от различных предметов и зелий."
-            ],
-            RoomType.EXIT: [
-                "🚪 Выход из подземелья!",
-                "Свет проникает в комнату. Это выход!",
-                "Дверь с золотой ручкой ведет на свободу!"
-            ]
-        }
-        return random.choice(descriptions.get(room_type, ["Неизвестная комната."]))
+        sampler = DESCRIPTION_SAMPLERS.get(room_type)
+        return sampler.sample() if sampler is not None else "Неизвестная комната."
+
+    def peek_room(self, position: Tuple[int, int]) -> dict:
+        """Комната только для чтения: на общей карте словарь не кешируется"""
+        if isinstance(self.rooms, SharedRooms):
+            return self.rooms.peek(position)
+        return self.rooms[position]
 
     def get_current_room_info(self, position: Tuple[int, int]) -> Optional[dict]:
         """Получить информацию о текущей комнате"""
@@ -359,6 +925,34 @@ class GameMap:
         if position in self.rooms:
             self.rooms[position]['visited'] = True
 
+    def is_seen(self, position: Tuple[int, int]) -> bool:
+        """Видел ли игрок эту клетку"""
+        index = position[1] * self.size + position[0]
+        return bool(self.seen[index >> 3] & (1 << (index & 7)))
+
+    def mark_seen(self, position: Tuple[int, int]):
+        """Снять туман с клетки"""
+        index = position[1] * self.size + position[0]
+        self.seen[index >> 3] |= 1 << (index & 7)
+
+    def update_visibility(self, position: Tuple[int, int], radius: int):
+        """Пересчитать обзор вокруг игрока.
+
+        Обходит только круг радиуса radius и снимает туман лишь с клеток,
+        которые не были видны на прошлом ходу, так что стоимость хода
+        зависит от радиуса, а не от размера карты."""
+        x, y = position
+        size = self.size
+        visible = set()
+        for dx, dy in view_offsets(radius):
+            cx, cy = x + dx, y + dy
+            if 0 <= cx < size and 0 <= cy < size:
+                visible.add((cx, cy))
+
+        for cell in visible - self.visible:
+            self.mark_seen(cell)
+        self.visible = visible
+
     def draw_minimap(self, player_pos: Tuple[int, int]):
         """Нарисовать миникарту"""
         print("\n" + "="*50)
@@ -369,10 +963,12 @@ class GameMap:
             row = []
             for x in range(self.size):
                 pos = (x, y)
-                room = self.rooms[pos]
+                room = self.peek_room(pos)
 
                 if pos == player_pos:
                     row.append("👤")  # Игрок
+                elif not self.is_seen(pos):
+                    row.append("⬛")  # Скрыто туманом
                 elif room['type'] == RoomType.EXIT:
                     row.append("🚪")  # Выход
                 elif room['type'] == RoomType.TREASURE:
@@ -383,36 +979,607 @@ class GameMap:
                     row.append("⚠️ ")  # Ловушка
                 elif room['type'] == RoomType.SHOP:
                     row.append("🏪")  # Магазин
-                elif room['visited']:
-                    row.append("⬜")  # Посещенная
                 else:
-                    row.append("⬛")  # Неизвестная
+                    row.append("⬜")  # Пустая
             print("  ".join(row))
 
+        monsters, traps = self.danger(player_pos)
+        print(f"\n☠️  Чутье (на {DANGER_RADIUS} клетки вокруг): монстров {monsters}, ловушек {traps}")
+
         print("\n" + "="*50)
         print("ЛЕГЕНДА:")
-        print("👤 - Вы, ⬜ - посещено, ⬛ - неизвестно")
+        print("👤 - Вы, ⬜ - пустая комната, ⬛ - не разведано")
         print("💰 - сокровище, 🐉 - монстр, ⚠️  - ловушка")
         print("🏪 - магазин, 🚪 - выход")
         print("="*50)
 
 
+class MapPool:
+    """Пул заранее сгенерированных карт одного размера и планировки.
+
+    Карты генерируются в фоновом потоке, пока игрок смотрит меню, так что
+    новая игра забирает готовую карту вместо генерации на месте. Пул
+    ограничен числом клеток: большие карты не копятся в памяти, а
+    генерируются по запросу."""
+
+    # Сколько клеток могут лежать в пуле одного размера (две карты 256x256)
+    MAX_CELLS = 2 * 256 * 256
+
+    # Выключатель для сервера и тестов нагрузки: карты только по запросу
+    enabled = True
+
+    _pools: Dict[Tuple[int, str], 'MapPool'] = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, size: int, capacity: int = 2, layout: str = 'open'):
+        self.size = size
+        self.layout = layout
+        self.capacity = min(capacity, self.MAX_CELLS // (size * size))
+        self.maps: 'queue.Queue[GameMap]' = queue.Queue(maxsize=max(1, self.capacity))
+        self.filler: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_size(cls, size: int, layout: str = 'open') -> 'MapPool':
+        """Общий пул для карт заданного размера и планировки"""
+        with cls._pools_lock:
+            key = (size, layout)
+            if key not in cls._pools:
+                cls._pools[key] = cls(size, layout=layout)
+            return cls._pools[key]
+
+    @classmethod
+    def disable(cls):
+        """Выключить фоновую генерацию и освободить уже готовые карты"""
+        cls.enabled = False
+        with cls._pools_lock:
+            pools = list(cls._pools.values())
+        for pool in pools:
+            pool.drain()
+
+    def drain(self):
+        """Выбросить готовые карты из пула"""
+        while True:
+            try:
+                self.maps.get_nowait()
+            except queue.Empty:
+                return
+
+    def prefetch(self):
+        """Запустить фоновое заполнение пула (если еще не запущено)"""
+        if not self.enabled or self.capacity < 1:
+            return
+        with self.lock:
+            if self.filler is None:
+                self.filler = threading.Thread(target=self._fill, name=f"map-pool-{self.size}",
+                                               daemon=True)
+                self.filler.start()
+
+    def _fill(self):
+        """Фоновый поток: держит пул заполненным, пока пул включен"""
+        while MapPool.enabled:
+            game_map = GameMap(self.size, layout=self.layout)
+            while MapPool.enabled:
+                try:
+                    self.maps.put(game_map, timeout=1.0)
+                    break
+                except queue.Full:
+                    continue
+        with self.lock:
+            self.filler = None
+        self.drain()
+
+    def take(self) -> GameMap:
+        """Готовая карта из пула или новая, если пул пока пуст"""
+        try:
+            return self.maps.get_nowait()
+        except queue.Empty:
+            return GameMap(self.size, layout=self.layout)
+
+
+# Время, которое поток провел в ожидании ввода игрока (см. wait_input)
+_input_wait = threading.local()
+
+
+def wait_input(prompt: str = "") -> str:
+    """input() с учетом времени ожидания: обработчики комнат вычитают его
+    из своего времени, чтобы счетчики показывали логику, а не раздумья игрока"""
+    started = time.perf_counter()
+    try:
+        return input(prompt)
+    finally:
+        _input_wait.total = getattr(_input_wait, 'total', 0.0) + time.perf_counter() - started
+
+
+class HandlerStats:
+    """Счетчики обработчика: число вызовов и время без ожидания ввода"""
+
+    __slots__ = ('calls', 'total_time', 'max_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed: float):
+        self.calls += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+
+
+class RoomHandler:
+    """Обработчик события комнаты одного типа.
+
+    Подкласс задает room_type и handle(game, room), который возвращает
+    False, если игровой цикл нужно прервать. Обработчики с once=True
+    срабатывают только в еще не обработанной комнате."""
+
+    room_type: Any = None
+    once = True
+
+    def handle(self, game: 'Game', room: dict) -> bool:
+        raise NotImplementedError
+
+
+class TreasureHandler(RoomHandler):
+    """Сокровищница: добыча и золото"""
+
+    room_type = RoomType.TREASURE
+
+    def handle(self, game: 'Game', room: dict) -> bool:
+        if not game.claim_room(game.player.position, 'has_treasure'):
+            print("\n📭 Сундук пуст: сокровище уже забрал другой герой")
+            wait_input("\nНажмите Enter чтобы продолжить...")
+            return True
+        print("\n💰 ВЫ НАШЛИ СОКРОВИЩЕ!")
+
+        treasure = TREASURE_SAMPLER.sample()
+        gold_found = random.randint(*TREASURE_GOLD_RANGE)
+
+        game.player.add_item(treasure)
+        game.player.gold += gold_found
+        game.player.score += treasure.value
+
+        print(f"📦 Вы получили: {treasure.name} (+{treasure.value} очков)")
+        print(f"💰 Нашли {gold_found} золота")
+        print(f"💰 Теперь у вас: {game.player.gold} золота")
+
+        game.emit('treasure', position=game.player.position, item=treasure.name, gold=gold_found)
+        wait_input("\nНажмите Enter чтобы продолжить...")
+        return True
+
+
+class MonsterHandler(RoomHandler):
+    """Логово монстра: пошаговый бой"""
+
+    room_type = RoomType.MONSTER
+
+    def handle(self, game: 'Game', room: dict) -> bool:
+        # Точка возврата для режима тренировки
+        retry_point: Optional[Snapshot] = game.history.snapshot() if game.history else None
+        while True:
+            outcome = self.fight(game, game.practice and retry_point is not None)
+            if outcome is not None:
+                return outcome
+            # Повтор начинает тот же бой заново: уйти из логова, не победив
+            # и не сбежав по правилам, нельзя
+            game.history.restore(retry_point)
+
+    def fight(self, game: 'Game', can_retry: bool) -> Optional[bool]:
+        """Один бой; None - игрок погиб и выбрал повтор в режиме тренировки"""
+        position = game.player.position
+        if not game.claim_room(position, 'has_monster'):
+            print("\n🦴 Логово пусто: монстра уже одолел другой герой")
+            wait_input("\nНажмите Enter чтобы продолжить...")
+            return True
+        print("\n🐉 НА ВАС НАПАЛ МОНСТР!")
+
+        monster = Monster(game.player.level)
+        game.emit('combat_start', position=game.player.position,
+                  monster=monster.name, level=monster.level)
+        print(f"Перед вами {monster.name} (Уровень {monster.level})!")
+        print(f"❤️  Здоровье монстра: {monster.show_health()}")
+
+        # Исход считается один раз на бой: раунды находят свое состояние в таблице
+        odds_table = fight_solver(game.player, monster, POTION_EFFECTS, game.pending_regeneration())
+        drunk = 0
+
+        # Бой с монстром
+        while monster.health > 0 and game.player.health > 0:
+            print("\n" + "="*40)
+            print(f"Ваше здоровье: ❤️ {game.player.health}/{game.player.max_health}")
+            print(f"Здоровье {monster.name}: {monster.show_health()}")
+            odds = odds_table.outcome(game.player.health, monster.health, drunk)
+            print(f"📊 Угроза: {threat_level(odds)} "
+                  f"(шанс победы {odds.win_probability:.0%}, "
+                  f"ожидаемая потеря здоровья {max(0.0, odds.expected_hp_loss):.0f})")
+            print("="*40)
+
+            print("\nВыберите действие:")
+            print("1. ⚔️  Атаковать")
+            print("2. 🛡️  Защититься (уменьшает урон на 50%)")
+            print("3. 🧪 Использовать зелье")
+            print("4. 🏃 Попытаться убежать (60% шанс)")
+            print("5. 💡 Подсказка")
+
+            choice = wait_input("Ваш выбор (1-5): ").strip()
+            if choice == "5":
+                print("\n" + format_advice(game.advisor.advise(game.player, monster)))
+                wait_input("Нажмите Enter чтобы продолжить...")
+                continue
+            game.emit('combat_action', action=choice)
+
+            if choice == "1":
+                # Атака игрока
+                player_damage = game.player.get_attack_damage()
+                monster.take_damage(player_damage)
+                game.emit('combat_hit', attacker='player', damage=player_damage,
+                          monster_health=monster.health)
+                print(f"\n⚔️  Вы нанесли {player_damage} урона!")
+
+            elif choice == "2":
+                # Защита
+                print(f"\n🛡️  Вы подняли щит! Следующая атака будет слабее.")
+                # Флаг защиты будет учтен при получении урона
+
+            elif choice == "3":
+                # Использование зелья
+                potions = [item for item in game.player.inventory if item.type == "potion"]
+                if potions:
+                    potion = potions[0]
+                    game.player.heal(potion.value)
+                    game.player.remove_item(potion)
+                    drunk += 1
+                    print(f"\n🧪 Вы использовали {potion.name}!")
+                    print(f"❤️  Восстановлено {potion.value} здоровья")
+                    if potion.name in POTION_EFFECTS:
+                        heal, turns = POTION_EFFECTS[potion.name]
+                        game.timers.schedule(1, 'regeneration', [heal, turns - 1], interval=1)
+                        print(f"✨ Зелье будет лечить еще {turns - 1} ходов")
+                else:
+                    print("\n❌ У вас нет зелий!")
+                    continue
+
+            elif choice == "4":
+                # Попытка убежать
+                if random.random() < 0.6:
+                    # Монстр остается в логове
+                    game.release_room(position, 'has_monster')
+                    game.emit('combat_end', outcome='fled')
+                    print("\n🏃 Вам удалось сбежать!")
+                    wait_input("Нажмите Enter чтобы продолжить...")
+                    return False
+                else:
+                    print("\n❌ Не удалось сбежать! Монстр атакует!")
+            else:
+                print("\n❌ Неверный выбор! Монстр атакует!")
+
+            # Атака монстра (если не убежали)
+            if choice != "4" and monster.health > 0:
+                monster_damage = monster.damage
+
+                # Учет защиты
+                if choice == "2":
+                    monster_damage = max(1, monster_damage // 2)
+                    print(f"🛡️  Защита уменьшила урон до {monster_damage}")
+
+                is_alive = game.player.take_damage(monster_damage)
+                game.emit('combat_hit', attacker='monster', damage=monster_damage,
+                          player_health=game.player.health)
+                print(f"🐉 {monster.name} наносит вам {monster_damage} урона!")
+
+                if not is_alive:
+                    game.release_room(position, 'has_monster')
+                    game.emit('combat_end', outcome='died')
+                    print("\n💀 ВЫ ПОГИБЛИ В БОЮ!")
+                    if can_retry:
+                        print("🔁 Режим тренировки: повторить бой? (y/n)")
+                        if wait_input().lower() == 'y':
+                            return None
+                    game.state = GameState.LOSE
+                    wait_input("Нажмите Enter чтобы продолжить...")
+                    return False
+
+        if monster.health <= 0:
+            print(f"\n🎉 Вы победили {monster.name}!")
+            game.player.add_experience(monster.experience)
+            game.player.gold += monster.gold
+            game.player.score += monster.experience * 2
+            game.player.kills += 1
+
+            print(f"⭐ Получено {monster.experience} опыта")
+            print(f"💰 Получено {monster.gold} золота")
+            print(f"🏆 +{monster.experience * 2} очков")
+            print(f"⚔️  Всего убито: {game.player.kills} монстров")
+
+            game.schedule_room_event(MONSTER_RESPAWN_TURNS, 'monster_respawn', position)
+            game.emit('combat_end', outcome='won', experience=monster.experience, gold=monster.gold)
+            wait_input("\nНажмите Enter чтобы продолжить...")
+            return True
+
+        return True
+
+
+class TrapHandler(RoomHandler):
+    """Ловушка: урон, если не спас факел"""
+
+    room_type = RoomType.TRAP
+
+    def handle(self, game: 'Game', room: dict) -> bool:
+        if not game.claim_room(game.player.position, 'is_trap_active'):
+            # Ловушку уже разрядил другой игрок
+            return True
+        print("\n⚠️  ВЫ АКТИВИРОВАЛИ ЛОВУШКУ!")
+        trap_damage = random.randint(*TRAP_DAMAGE_RANGE)
+
+        # Шанс избежать ловушку
+        has_torch = any(item.name == "Факел" for item in game.player.inventory)
+        if has_torch and random.random() < 0.6:
+            print("🔥 Благодаря факелу вы заметили и избежали ловушку!")
+            game.emit('trap', position=game.player.position, damage=0)
+        else:
+            is_alive = game.player.take_damage(trap_damage)
+            game.emit('trap', position=game.player.position, damage=trap_damage)
+            print(f"💥 Вы получили {trap_damage} урона от ловушки!")
+
+            if not is_alive:
+                print("\n💀 ВЫ ПОГИБЛИ ОТ ЛОВУШКИ!")
+                game.state = GameState.LOSE
+                wait_input("Нажмите Enter чтобы продолжить...")
+                return False
+
+        game.schedule_room_event(TRAP_REARM_TURNS, 'trap_rearm', game.player.position)
+        wait_input("Нажмите Enter чтобы продолжить...")
+        return True
+
+
+class ShopHandler(RoomHandler):
+    """Магазин: покупки, пока игрок не выйдет"""
+
+    room_type = RoomType.SHOP
+    once = False
+
+    def handle(self, game: 'Game', room: dict) -> bool:
+        print("\n🏪 ДОБРО ПОЖАЛОВАТЬ В МАГАЗИН!")
+        print("Здесь вы можете купить полезные предметы.")
+        # Каждая покупка - отдельный шаг отмены, поэтому вход в магазин
+        # тоже сохраняется: иначе U отменил бы первую покупку вместе с шагом
+        if game.history is not None:
+            game.history.checkpoint()
+
+        while True:
+            game.clear_screen()
+            print(game.shop.show_items(game.player))
+
+            print(f"\nВыберите номер предмета для покупки (1-{len(game.shop.items)})")
+            print("или Q чтобы выйти из магазина")
+
+            choice = wait_input("\nВаш выбор: ").lower().strip()
+
+            if choice == 'q':
+                print("\nВозвращаемся к приключениям!")
+                wait_input("Нажмите Enter чтобы продолжить...")
+                break
+
+            try:
+                item_index = int(choice) - 1
+                if 0 <= item_index < len(game.shop.items):
+                    item = game.shop.items[item_index]
+                    price = game.shop.prices[item.name]
+
+                    if not game.shop.available(item.name):
+                        print(f"\n❌ {item.name} нет в наличии, загляните позже")
+                    elif game.player.gold >= price:
+                        game.player.gold -= price
+                        game.shop.sell(item.name)
+                        game.player.add_item(item)
+                        game.emit('purchase', item=item.name, price=price)
+                        if game.history is not None:
+                            game.history.checkpoint()
+                        print(f"\n✅ Вы купили {item.name} за {price} золота!")
+                        print(f"💰 Осталось золота: {game.player.gold}")
+                    else:
+                        print(f"\n❌ Недостаточно золота! Нужно {price}, а у вас {game.player.gold}")
+                else:
+                    print("\n❌ Неверный номер предмета!")
+            except ValueError:
+                print("\n❌ Неверный ввод!")
+
+            wait_input("\nНажмите Enter чтобы продолжить...")
+
+        return True
+
+
+class ExitHandler(RoomHandler):
+    """Выход: победа"""
+
+    room_type = RoomType.EXIT
+    once = False
+
+    def handle(self, game: 'Game', room: dict) -> bool:
+        print("\n🎉 ВЫ НАШЛИ ВЫХОД ИЗ ПОДЗЕМЕЛЬЯ!")
+        print("="*40)
+        print("🎊 ПОБЕДА! ИГРА ПРОЙДЕНА!")
+        print("="*40)
+        game.state = GameState.WIN
+        game.emit('exit', position=game.player.position)
+        wait_input("Нажмите Enter чтобы продолжить...")
+        return False
+
+
+class RoomHandlerRegistry:
+    """Таблица обработчиков по типу комнаты: поиск - одно обращение к словарю.
+
+    Для каждого типа считается число вызовов и затраченное время без
+    ожидания ввода игрока (wait_input), так что report() показывает, какие
+    комнаты обходятся дороже всего."""
+
+    def __init__(self, handlers: Optional[List[RoomHandler]] = None):
+        self.handlers: Dict[Any, RoomHandler] = {}
+        self.stats: Dict[Any, HandlerStats] = {}
+        # Реестр общий для всех сессий процесса, в том числе из разных потоков
+        self.stats_lock = threading.Lock()
+        for handler in handlers or []:
+            self.register(handler)
+
+    def register(self, handler: RoomHandler):
+        """Добавить или заменить обработчик для handler.room_type"""
+        self.handlers[handler.room_type] = handler
+        with self.stats_lock:
+            self.stats.setdefault(handler.room_type, HandlerStats())
+
+    def dispatch(self, game: 'Game', room: dict) -> bool:
+        """Вызвать обработчик комнаты и учесть время"""
+        room_type = room['type']
+        handler = self.handlers.get(room_type)
+        if handler is None or (handler.once and room['processed']):
+            return True
+        waited = getattr(_input_wait, 'total', 0.0)
+        started = time.perf_counter()
+        try:
+            return handler.handle(game, room)
+        finally:
+            elapsed = time.perf_counter() - started
+            elapsed -= getattr(_input_wait, 'total', 0.0) - waited
+            with self.stats_lock:
+                self.stats[room_type].record(max(0.0, elapsed))
+
+    def reset_stats(self):
+        """Обнулить счетчики (например, перед замером нагрузки)"""
+        with self.stats_lock:
+            for room_type in self.stats:
+                self.stats[room_type] = HandlerStats()
+
+    def is_event(self, room: dict) -> bool:
+        """Сработает ли в комнате одноразовое событие (сокровище, бой, ловушка)"""
+        handler = self.handlers.get(room['type'])
+        return handler is not None and handler.once and not room['processed']
+
+    def report(self) -> List[Tuple[str, int, float, float, float]]:
+        """Строки (тип, вызовы, всего мс, среднее мс, максимум мс), самые дорогие сверху"""
+        rows = []
+        with self.stats_lock:
+            for room_type, stats in self.stats.items():
+                name = getattr(room_type, 'name', str(room_type))
+                mean = stats.total_time / stats.calls if stats.calls else 0.0
+                rows.append((name, stats.calls, stats.total_time * 1000, mean * 1000,
+                             stats.max_time * 1000))
+        rows.sort(key=lambda row: -row[2])
+        return rows
+
+
+# Общий реестр: плагины регистрируют в нем свои типы комнат
+ROOM_HANDLERS = RoomHandlerRegistry([
+    TreasureHandler(),
+    MonsterHandler(),
+    TrapHandler(),
+    ShopHandler(),
+    ExitHandler()
+])
+
+
 class Game:
     """Основной класс игры"""
 
-    def __init__(self):
+    def __init__(self, map_size: int = 6, map_layout: str = 'open'):
+        self.map_size = map_size
+        self.map_layout = map_layout
+        self.map_pool = MapPool.for_size(map_size, map_layout)
+        self.save_file = "savegame.json"
+        # Подписчики на игровые события: listener(game, kind, data)
+        self.listeners: List[Callable[['Game', str, Dict[str, Any]], None]] = []
+        # Советник с таблицей транспозиций нужен только в бою
+        self._advisor: Optional[CombatAdvisor] = None
+        self.room_handlers = ROOM_HANDLERS
+        # Общий мир (world.SharedWorld), если сессия играет не одна
+        self.world: Optional[Any] = None
+        self.reset()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Состояние для pickle: без подписчиков, общих пула карт и реестра
+        обработчиков и кеша советника"""
+        state = self.__dict__.copy()
+        del state['listeners']
+        del state['map_pool']
+        state['_advisor'] = None
+        del state['room_handlers']
+        # Замки общего мира не сериализуются: поднятая сессия играет одна
+        state['world'] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        state.setdefault('map_layout', 'open')
+        state.setdefault('world', None)
+        self.__dict__.update(state)
+        self.listeners = []
+        self.map_pool = MapPool.for_size(self.map_size, self.map_layout)
+        self._advisor = None
+        self.room_handlers = ROOM_HANDLERS
+
+    def reset(self):
+        """Сброс состояния к главному меню.
+
+        Карта и магазин создаются лениво при первом обращении, поэтому меню
+        показывается сразу, а карта для новой игры берется из пула (его
+        заполнение запускает show_menu)."""
         self.state = GameState.MENU
-        self.map = GameMap()
+        self._map: Optional[GameMap] = self.world.map if self.world is not None else None
+        self._shop: Optional[Shop] = None
         self.player: Optional[Player] = None
-        self.shop = Shop()
         self.game_time = 0
+        self.turn = 0
+        # Отложенные события мира по счетчику ходов
+        self.timers = self.new_timers()
+        self.history: Optional[GameHistory] = None
+        self.practice = False
         self.start_time = time.time()
-        self.save_file = "savegame.json"
+
+    @staticmethod
+    def new_timers(now: int = 0) -> TimerWheel:
+        """Колесо новой игры: только периодическое пополнение магазина"""
+        timers = TimerWheel(now)
+        timers.schedule(SHOP_RESTOCK_TURNS, 'shop_restock', interval=SHOP_RESTOCK_TURNS)
+        return timers
+
+    def emit(self, kind: str, **data):
+        """Сообщить подписчикам об игровом событии"""
+        for listener in self.listeners:
+            listener(self, kind, data)
+
+    @property
+    def map(self) -> GameMap:
+        """Карта текущей игры (создается при первом обращении)"""
+        if self._map is None:
+            self._map = self.map_pool.take()
+        return self._map
+
+    @map.setter
+    def map(self, game_map: GameMap):
+        self._map = game_map
+
+    @property
+    def advisor(self) -> CombatAdvisor:
+        """Боевой советник (создается при первом совете)"""
+        if self._advisor is None:
+            self._advisor = CombatAdvisor()
+        return self._advisor
+
+    @property
+    def shop(self) -> Shop:
+        """Магазин текущей игры (создается при первом обращении)"""
+        if self._shop is None:
+            self._shop = Shop()
+        return self._shop
 
     @staticmethod
     def clear_screen():
         """Очистка экрана"""
-        os.system('cls' if os.name == 'nt' else 'clear')
+        if os.name == 'nt':
+            os.system('cls')
+        else:
+            # Управляющая последовательность вместо запуска процесса clear на каждый экран
+            print("\033[2J\033[H", end="", flush=True)
 
     @staticmethod
     def show_title():
@@ -445,6 +1612,8 @@ class Game:
   H - Эта справка
   S - Сохранить игру
   L - Загрузить игру
+  U - Отменить последний ход или покупку
+  P - Режим тренировки (повтор проигранного боя)
   Q - Выйти в меню
 
 В БОЮ:
@@ -452,17 +1621,23 @@ class Game:
   2 - Защититься (уменьшает урон на 50%)
   3 - Использовать зелье
   4 - Попытаться убежать (60% шанс)
+  5 - Подсказка советника
 
 В МАГАЗИНЕ:
-  1-8 - Купить предмет
+  1-9 - Купить предмет
   Q - Выйти из магазина
 
 ЦЕЛЬ ИГРЫ:
-  Найти выход (🚪) в правом нижнем углу карты
+  Найти выход (🚪): на открытой карте он в правом нижнем углу,
+  в лабиринте - в самом дальнем от входа конце
   Собрать как можно больше сокровищ
   Повышать уровень и улучшать снаряжение
   Остаться в живых!
 
+СОБЫТИЯ МИРА:
+  Ловушки взводятся снова через 40 ходов, монстры возвращаются
+  через 60, магазин пополняет запасы каждые 50 ходов
+
 ╔══════════════════════════════════════════════════╗
 ║            УДАЧИ В ПРИКЛЮЧЕНИИ!                  ║
 ╚══════════════════════════════════════════════════╝
@@ -472,6 +1647,10 @@ class Game:
 
     def show_menu(self):
         """Показать главное меню"""
+        # Пока игрок в меню, следующая карта готовится в фоне (в общем мире
+        # карта уже есть)
+        if self.world is None:
+            self.map_pool.prefetch()
         while self.state == GameState.MENU:
             self.clear_screen()
             self.show_title()
@@ -526,20 +1705,12 @@ class Game:
         self.player = Player(name)
 
         # Стартовые предметы
-        starter_items = [
-            Item("Деревянный меч", "Простое оружие новичка", "weapon", 2),
-            Item("Кожаный доспех", "Легкая защита", "armor", 1),
-            Item("Малое зелье здоровья", "Восстанавливает 30 HP", "potion", 30),
-            Item("Карта подземелья", "Показывает ваше местоположение", "other", 0),
-            Item("Факел", "Освещает путь", "other", 0)
-        ]
-
-        for item in starter_items:
+        for item in STARTER_ITEMS:
             self.player.add_item(item)
 
         # Экипировка стартового оружия и брони
-        self.player.weapon = starter_items[0]
-        self.player.armor = starter_items[1]
+        self.player.weapon = STARTER_ITEMS[0]
+        self.player.armor = STARTER_ITEMS[1]
 
         print(f"\n👤 Добро пожаловать, {self.player.name}!")
         print("🎒 Вы начинаете с базовым снаряжением:")
@@ -580,8 +1751,12 @@ class Game:
             },
             'map': {
                 'size': self.map.size,
-                'rooms': {}
+                'layout': self.map.layout_kind,
+                'exit': list(self.map.exit)
             },
+            'format': SAVE_FORMAT_VERSION,
+            'turn': self.turn,
+            'timers': self.timers.dump(),
             'timestamp': datetime.now().isoformat(),
             'playtime': time.time() - self.start_time
         }
@@ -604,17 +1779,16 @@ class Game:
                 'value': self.player.armor.value
             }
 
-        # Сохраняем информацию о комнатах
-        for pos, room in self.map.rooms.items():
-            save_data['map']['rooms'][f"{pos[0]},{pos[1]}"] = {
-                'type': room['type'].name,
-                'visited': room['visited'],
-                'processed': room['processed']
-            }
-
+        # Первая строка - игрок и заголовок, дальше карта по рядам.
+        # Пишем во временный файл, чтобы сбой не испортил прошлое сохранение.
+        temp_file = self.save_file + ".tmp"
         try:
-            with open(self.save_file, 'w', encoding='utf-8') as f:
-                json.dump(save_data, f, ensure_ascii=False, indent=2)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(save_data, ensure_ascii=False))
+                f.write("\n")
+                self.map.dump_rows(f)
+            os.replace(temp_file, self.save_file)
+            self.emit('save', file=self.save_file)
             print("✅ Игра успешно сохранена!")
             return True
         except (IOError, OSError, json.JSONDecodeError) as e:
@@ -628,64 +1802,32 @@ class Game:
                 return False
 
             with open(self.save_file, 'r', encoding='utf-8') as f:
-                save_data = json.load(f)
-
-            # Восстанавливаем игрока
-            player_data = save_data['player']
-            self.player = Player(player_data['name'])
-            self.player.health = player_data['health']
-            self.player.max_health = player_data['max_health']
-            self.player.position = tuple(player_data['position'])
-            self.player.gold = player_data['gold']
-            self.player.score = player_data['score']
-            self.player.level = player_data['level']
-            self.player.experience = player_data['experience']
-            self.player.kills = player_data['kills']
-
-            # Восстанавливаем инвентарь
-            self.player.inventory = []
-            for item_data in player_data['inventory']:
-                item = Item(
-                    item_data['name'],
-                    item_data['description'],
-                    item_data['type'],
-                    item_data['value']
-                )
-                self.player.add_item(item)
-
-            # Восстанавливаем оружие и броню
-            if 'weapon' in player_data and player_data['weapon']:
-                weapon_data = player_data['weapon']
-                weapon = Item(
-                    weapon_data['name'],
-                    weapon_data['description'],
-                    weapon_data['type'],
-                    weapon_data['value']
-                )
-                self.player.weapon = weapon
-
-            if 'armor' in player_data and player_data['armor']:
-                armor_data = player_data['armor']
-                armor = Item(
-                    armor_data['name'],
-                    armor_data['description'],
-                    armor_data['type'],
-                    armor_data['value']
-                )
-                self.player.armor = armor
-
-            # Восстанавливаем карту
-            map_data = save_data['map']
-            self.map = GameMap(map_data['size'])
-
-            for pos_str, room_data in map_data['rooms'].items():
-                x, y = map(int, pos_str.split(','))
-                pos = (x, y)
-
-                if pos in self.map.rooms:
-                    self.map.rooms[pos]['visited'] = room_data['visited']
-                    self.map.rooms[pos]['processed'] = room_data['processed']
-
+                try:
+                    save_data = json.loads(f.readline())
+                except json.JSONDecodeError:
+                    save_data = None
+
+                if isinstance(save_data, dict) and save_data.get('format') == SAVE_FORMAT_VERSION:
+                    # Карта читается по рядам, без разбора всего файла разом
+                    map_data = save_data['map']
+                    exit_pos = tuple(map_data['exit']) if 'exit' in map_data else None
+                    game_map = GameMap.load_rows(f, map_data['size'], exit_pos,
+                                                 map_data.get('layout', 'open'))
+                else:
+                    # Старый формат: один JSON-документ
+                    f.seek(0)
+                    save_data = json.load(f)
+                    game_map = self.load_legacy_map(save_data['map'])
+
+            self.player = self.load_player(save_data['player'])
+            self.map = game_map
+            self.turn = save_data.get('turn', 0)
+            if 'timers' in save_data:
+                self.timers = TimerWheel.load(save_data['timers'], self.turn)
+            else:
+                # Старое сохранение: таймеры прошлой игры к этой карте не относятся
+                self.timers = self.new_timers(self.turn)
+            self.update_visibility()
             self.start_time = time.time() - save_data.get('playtime', 0)
             return True
 
@@ -693,6 +1835,69 @@ class Game:
             print(f"❌ Ошибка при загрузке: {e}")
             return False
 
+    @staticmethod
+    def load_player(player_data: dict) -> Player:
+        """Восстановить игрока из сохранения"""
+        player = Player(player_data['name'])
+        player.health = player_data['health']
+        player.max_health = player_data['max_health']
+        player.position = tuple(player_data['position'])
+        player.gold = player_data['gold']
+        player.score = player_data['score']
+        player.level = player_data['level']
+        player.experience = player_data['experience']
+        player.kills = player_data['kills']
+
+        # Восстанавливаем инвентарь (общие предметы не копируются)
+        player.inventory = []
+        for item_data in player_data['inventory']:
+            item = shared_item(
+                item_data['name'],
+                item_data['description'],
+                item_data['type'],
+                item_data['value']
+            )
+            player.add_item(item)
+
+        # Восстанавливаем оружие и броню
+        if 'weapon' in player_data and player_data['weapon']:
+            weapon_data = player_data['weapon']
+            weapon = shared_item(
+                weapon_data['name'],
+                weapon_data['description'],
+                weapon_data['type'],
+                weapon_data['value']
+            )
+            player.weapon = weapon
+
+        if 'armor' in player_data and player_data['armor']:
+            armor_data = player_data['armor']
+            armor = shared_item(
+                armor_data['name'],
+                armor_data['description'],
+                armor_data['type'],
+                armor_data['value']
+            )
+            player.armor = armor
+
+        return player
+
+    @staticmethod
+    def load_legacy_map(map_data: dict) -> GameMap:
+        """Восстановить карту из сохранения старого формата"""
+        game_map = GameMap(map_data['size'], generate=False)
+        for pos_str, room_data in map_data['rooms'].items():
+            x, y = map(int, pos_str.split(','))
+            game_map.rooms[(x, y)] = game_map.make_room(
+                RoomType[room_data['type']],
+                visited=room_data['visited'],
+                processed=room_data['processed']
+            )
+        if len(game_map.rooms) != game_map.size * game_map.size:
+            raise ValueError("В сохранении не хватает комнат")
+        game_map.build_treasure_index()
+        return game_map
+
     def show_highscores(self):
         """Показать таблицу рекордов"""
         self.clear_screen()
@@ -734,6 +1939,14 @@ class Game:
 
                 print(f"{i:2}.{medal}{name} {score_val}   {level}     {playtime}")
 
+        stats = RunStats.load(STATS_FILE)
+        if stats.runs:
+            print("-" * 50)
+            print(f"📊 Всего прохождений: {stats.runs}, побед: {stats.wins}")
+            print(f"   Очки: медиана {stats.quantile('score', 0.5):.0f}, "
+                  f"90% - {stats.quantile('score', 0.9):.0f}, "
+                  f"99% - {stats.quantile('score', 0.99):.0f}")
+
         print("="*50)
         input("\nНажмите Enter чтобы вернуться...")
 
@@ -770,227 +1983,155 @@ class Game:
         except (IOError, OSError):
             pass
 
-    def handle_room_event(self, room_info: dict) -> bool:
-        """Обработка событий в комнате"""
-        room_type = room_info['type']
-
-        if room_type == RoomType.TREASURE and not room_info['processed']:
-            print("\n💰 ВЫ НАШЛИ СОКРОВИЩЕ!")
-
-            treasures = [
-                Item("Золотой слиток", "Ценный металл", "treasure", 50),
-                Item("Волшебный амулет", "Таинственный артефакт", "treasure", 75),
-                Item("Древний свиток", "Записи древних мудрецов", "treasure", 60),
-                Item("Самоцвет", "Сверкающий драгоценный камень", "treasure", 40),
-                Item("Королевская корона", "Дорогая регалия", "treasure", 100)
-            ]
+    def record_run_stats(self) -> Optional[float]:
+        """Добавить прохождение в сводную статистику.
 
-            treasure = random.choice(treasures)
-            gold_found = random.randint(20, 100)
-
-            self.player.add_item(treasure)
-            self.player.gold += gold_found
-            self.player.score += treasure.value
-
-            print(f"📦 Вы получили: {treasure.name} (+{treasure.value} очков)")
-            print(f"💰 Нашли {gold_found} золота")
-            print(f"💰 Теперь у вас: {self.player.gold} золота")
-
-            room_info['processed'] = True
-            room_info['has_treasure'] = False
-            input("\nНажмите Enter чтобы продолжить...")
-            return True
-
-        elif room_type == RoomType.MONSTER and not room_info['processed']:
-            print("\n🐉 НА ВАС НАПАЛ МОНСТР!")
-
-            monster = Monster(self.player.level)
-            print(f"Перед вами {monster.name} (Уровень {monster.level})!")
-            print(f"❤️  Здоровье монстра: {monster.show_health()}")
-
-            # Бой с монстром
-            while monster.health > 0 and self.player.health > 0:
-                print("\n" + "="*40)
-                print(f"Ваше здоровье: ❤️ {self.player.health}/{self.player.max_health}")
-                print(f"Здоровье {monster.name}: {monster.show_health()}")
-                print("="*40)
-
-                print("\nВыберите действие:")
-                print("1. ⚔️  Атаковать")
-                print("2. 🛡️  Защититься (уменьшает урон на 50%)")
-                print("3. 🧪 Использовать зелье")
-                print("4. 🏃 Попытаться убежать (60% шанс)")
-
-                choice = input("Ваш выбор (1-4): ").strip()
-
-                if choice == "1":
-                    # Атака игрока
-                    player_damage = self.player.get_attack_damage()
-                    monster.take_damage(player_damage)
-                    print(f"\n⚔️  Вы нанесли {player_damage} урона!")
-
-                elif choice == "2":
-                    # Защита
-                    print(f"\n🛡️  Вы подняли щит! Следующая атака будет слабее.")
-                    # Флаг защиты будет учтен при получении урона
-
-                elif choice == "3":
-                    # Использование зелья
-                    potions = [item for item in self.player.inventory if item.type == "potion"]
-                    if potions:
-                        potion = potions[0]
-                        self.player.heal(potion.value)
-                        self.player.remove_item(potion)
-                        print(f"\n🧪 Вы использовали {potion.name}!")
-                        print(f"❤️  Восстановлено {potion.value} здоровья")
-                    else:
-                        print("\n❌ У вас нет зелий!")
-                        continue
-
-                elif choice == "4":
-                    # Попытка убежать
-                    if random.random() < 0.6:
-                        print("\n🏃 Вам удалось сбежать!")
-                        input("Нажмите Enter чтобы продолжить...")
-                        return False
-                    else:
-                        print("\n❌ Не удалось сбежать! Монстр атакует!")
-                else:
-                    print("\n❌ Неверный выбор! Монстр атакует!")
-
-                # Атака монстра (если не убежали)
-                if choice != "4" and monster.health > 0:
-                    monster_damage = monster.damage
-
-                    # Учет защиты
-                    if choice == "2":
-                        monster_damage = max(1, monster_damage // 2)
-                        print(f"🛡️  Защита уменьшила урон до {monster_damage}")
-
-                    is_alive = self.player.take_damage(monster_damage)
-                    print(f"🐉 {monster.name} наносит вам {monster_damage} урона!")
-
-                    if not is_alive:
-                        print("\n💀 ВЫ ПОГИБЛИ В БОЮ!")
-                        self.state = GameState.LOSE
-                        input("Нажмите Enter чтобы продолжить...")
-                        return False
-
-            if monster.health <= 0:
-                print(f"\n🎉 Вы победили {monster.name}!")
-                self.player.add_experience(monster.experience)
-                self.player.gold += monster.gold
-                self.player.score += monster.experience * 2
-                self.player.kills += 1
-
-                print(f"⭐ Получено {monster.experience} опыта")
-                print(f"💰 Получено {monster.gold} золота")
-                print(f"🏆 +{monster.experience * 2} очков")
-                print(f"⚔️  Всего убито: {self.player.kills} монстров")
-
-                room_info['processed'] = True
-                room_info['has_monster'] = False
-                input("\nНажмите Enter чтобы продолжить...")
-                return True
-
-        elif room_type == RoomType.TRAP and not room_info['processed']:
-            print("\n⚠️  ВЫ АКТИВИРОВАЛИ ЛОВУШКУ!")
-            trap_damage = random.randint(10, 30)
-
-            # Шанс избежать ловушку
-            has_torch = any(item.name == "Факел" for item in self.player.inventory)
-            if has_torch and random.random() < 0.6:
-                print("🔥 Благодаря факелу вы заметили и избежали ловушку!")
-            else:
-                is_alive = self.player.take_damage(trap_damage)
-                print(f"💥 Вы получили {trap_damage} урона от ловушки!")
-
-                if not is_alive:
-                    print("\n💀 ВЫ ПОГИБЛИ ОТ ЛОВУШКИ!")
-                    self.state = GameState.LOSE
-                    input("Нажмите Enter чтобы продолжить...")
-                    return False
-
-            room_info['processed'] = True
-            room_info['is_trap_active'] = False
-            input("Нажмите Enter чтобы продолжить...")
-            return True
-
-        elif room_type == RoomType.SHOP:
-            print("\n🏪 ДОБРО ПОЖАЛОВАТЬ В МАГАЗИН!")
-            print("Здесь вы можете купить полезные предметы.")
-
-            while True:
-                self.clear_screen()
-                print(self.shop.show_items(self.player))
-
-                print("\nВыберите номер предмета для покупки (1-8)")
-                print("или Q чтобы выйти из магазина")
-
-                choice = input("\nВаш выбор: ").lower().strip()
-
-                if choice == 'q':
-                    print("\nВозвращаемся к приключениям!")
-                    input("Нажмите Enter чтобы продолжить...")
-                    break
-
-                try:
-                    item_index = int(choice) - 1
-                    if 0 <= item_index < len(self.shop.items):
-                        item = self.shop.items[item_index]
-                        price = self.shop.prices[item.name]
-
-                        if self.player.gold >= price:
-                            self.player.gold -= price
-                            self.player.add_item(item)
-                            print(f"\n✅ Вы купили {item.name} за {price} золота!")
-                            print(f"💰 Осталось золота: {self.player.gold}")
-                        else:
-                            print(f"\n❌ Недостаточно золота! Нужно {price}, а у вас {self.player.gold}")
-                    else:
-                        print("\n❌ Неверный номер предмета!")
-                except ValueError:
-                    print("\n❌ Неверный ввод!")
-
-                input("\nНажмите Enter чтобы продолжить...")
-
-            return True
-
-        elif room_type == RoomType.EXIT:
-            print("\n🎉 ВЫ НАШЛИ ВЫХОД ИЗ ПОДЗЕМЕЛЬЯ!")
-            print("="*40)
-            print("🎊 ПОБЕДА! ИГРА ПРОЙДЕНА!")
-            print("="*40)
-            self.state = GameState.WIN
-            input("Нажмите Enter чтобы продолжить...")
-            return False
+        Возвращает долю прошлых прохождений со счетом не выше текущего."""
+        if not self.player:
+            return None
+        stats = RunStats.load(STATS_FILE)
+        rank = stats.percentile_rank('score', self.player.score) if stats.runs else None
+        stats.add({
+            'score': self.player.score,
+            'playtime': time.time() - self.start_time,
+            'kills': self.player.kills,
+            'level': self.player.level,
+            'gold': self.player.gold,
+            'turns': self.turn,
+            'won': self.state == GameState.WIN,
+            'died': self.state == GameState.LOSE
+        })
+        try:
+            stats.save(STATS_FILE)
+        except (IOError, OSError):
+            pass
+        return rank
 
-        return True
+    def handle_room_event(self, room_info: dict) -> bool:
+        """Обработка событий в комнате"""
+        return self.room_handlers.dispatch(self, room_info)
 
     def move_player(self, direction):
         """Перемещение игрока"""
         x, y = self.player.position
 
-        if direction == Direction.NORTH and y > 0:
-            y -= 1
-        elif direction == Direction.SOUTH and y < self.map.size - 1:
-            y += 1
-        elif direction == Direction.EAST and x < self.map.size - 1:
-            x += 1
-        elif direction == Direction.WEST and x > 0:
-            x -= 1
-        else:
+        # Маска проходов клетки учитывает и края карты, и стены
+        if not self.map.can_move((x, y), direction):
             print("❌ Нельзя идти в этом направлении!")
             input("Нажмите Enter чтобы продолжить...")
             return False
 
+        dx, dy = DIRECTION_OFFSETS[direction]
+        x, y = x + dx, y + dy
         self.player.position = (x, y)
         self.map.mark_visited((x, y))
+        self.update_visibility()
+        self.emit('move', position=(x, y), direction=direction.command)
         return True
 
+    def advance_clock(self):
+        """Довести часы мира до текущего хода и выполнить наступившие события"""
+        for timer in self.timers.advance(self.turn):
+            self.WORLD_EVENTS[timer.kind](self, timer)
+        if self.world is not None:
+            # Монстры и ловушки общей карты возвращаются по часам мира
+            for event, position in self.world.advance():
+                self.emit('world', event=event, position=position)
+
+    def schedule_room_event(self, delay: int, kind: str, position: Tuple[int, int]):
+        """Вернуть событие комнаты через delay ходов (в общем мире - в колесе мира)"""
+        if self.world is not None:
+            self.world.schedule(delay, kind, position)
+        else:
+            self.timers.schedule(delay, kind, position)
+
+    def rearm_trap(self, timer):
+        """Ловушка снова взведена (если игрок не стоит в комнате)"""
+        position = tuple(timer.data)
+        if self.occupied(position):
+            self.timers.schedule(1, timer.kind, timer.data)
+            return
+        self.release_room(position, 'is_trap_active')
+        self.touch_room(position, 'trap_rearm')
+
+    def respawn_monster(self, timer):
+        """Монстр вернулся в логово (если игрок не стоит в комнате)"""
+        position = tuple(timer.data)
+        if self.occupied(position):
+            self.timers.schedule(1, timer.kind, timer.data)
+            return
+        self.release_room(position, 'has_monster')
+        self.touch_room(position, 'monster_respawn')
+
+    def restock_shop(self, timer):
+        """Магазин пополнил запасы"""
+        if self._shop is not None:
+            self._shop.restock()
+        self.emit('world', event='shop_restock')
+
+    def regenerate(self, timer):
+        """Ход действия зелья регенерации"""
+        heal, left = timer.data
+        self.player.heal(heal)
+        timer.data = [heal, left - 1]
+        if left <= 1:
+            timer.cancel()
+
+    def pending_regeneration(self) -> int:
+        """Сколько здоровья еще вернут идущие зелья регенерации"""
+        return sum(timer.data[0] * timer.data[1] for timer in self.timers.pending()
+                   if timer.kind == 'regeneration')
+
+    WORLD_EVENTS = {
+        'trap_rearm': rearm_trap,
+        'monster_respawn': respawn_monster,
+        'shop_restock': restock_shop,
+        'regeneration': regenerate
+    }
+
+    def claim_room(self, position: Tuple[int, int], flag: str) -> bool:
+        """Забрать событие комнаты; False - его уже забрал другой игрок"""
+        if self.world is not None:
+            return self.world.claim(position, flag)
+        return self.map.claim(position, flag)
+
+    def release_room(self, position: Tuple[int, int], flag: str):
+        """Вернуть событие комнаты"""
+        if self.world is not None:
+            self.world.release(position, flag)
+        else:
+            self.map.release(position, flag)
+
+    def occupied(self, position: Tuple[int, int]) -> bool:
+        """Стоит ли в клетке игрок (в общем мире - любой из игроков)"""
+        if self.world is not None:
+            return self.world.occupied(position)
+        return position == self.player.position
+
+    def touch_room(self, position: Tuple[int, int], event: str):
+        """Комната изменилась не под игроком: учесть в истории и сообщить"""
+        if self.history is not None:
+            self.history.touch(position)
+        self.emit('world', event=event, position=position)
+
+    def view_radius(self) -> int:
+        """Радиус обзора игрока (факел освещает дальше)"""
+        if any(item.name == "Факел" for item in self.player.inventory):
+            return TORCH_VIEW_RADIUS
+        return VIEW_RADIUS
+
+    def update_visibility(self):
+        """Обновить туман войны вокруг игрока"""
+        self.map.update_visibility(self.player.position, self.view_radius())
+
     def game_loop(self):
         """Основной игровой цикл"""
+        self.update_visibility()
+        # В общем мире отмена хода откатила бы комнаты других игроков
+        self.history = GameHistory(self) if self.world is None else None
         while self.state == GameState.PLAYING:
+            # Сделал ли игрок на этой итерации что-то, что тратит ход
+            acted = False
             self.clear_screen()
             self.show_title()
 
@@ -1008,10 +2149,21 @@ class Game:
 
                 # Если комната еще не посещалась, обработать событие
                 if not room_info.get('processed', False):
+                    # Одноразовое событие комнаты - действие игрока, как и шаг
+                    acted = self.room_handlers.is_event(room_info)
                     result = self.handle_room_event(room_info)
                     if not result:
                         break
 
+            # Карта сокровищ подсказывает ближайшее сокровище
+            if any(item.name == "Карта сокровищ" for item in self.player.inventory):
+                nearest = self.map.treasures.k_nearest(self.player.position, 1)
+                if nearest:
+                    steps, (tx, ty) = nearest[0]
+                    print(f"🗺️  Ближайшее сокровище: [{tx}, {ty}], шагов: {steps}")
+                else:
+                    print("🗺️  Сокровищ больше не осталось")
+
             # Проверка состояния игры
             if self.state != GameState.PLAYING:
                 break
@@ -1027,17 +2179,11 @@ class Game:
             print("КУДА ИДТИ ДАЛЬШЕ?")
             print("="*40)
 
-            x, y = self.player.position
-            directions = []
-
-            if y > 0:
-                directions.append("N - Север")
-            if y < self.map.size - 1:
-                directions.append("S - Юг")
-            if x < self.map.size - 1:
-                directions.append("E - Восток")
-            if x > 0:
-                directions.append("W - Запад")
+            directions = [
+                f"{direction.command.upper()} - {direction.ru_name.capitalize()}"
+                for direction in Direction
+                if self.map.can_move(self.player.position, direction)
+            ]
 
             if directions:
                 print("Доступные направления:")
@@ -1049,19 +2195,20 @@ class Game:
             print("\nДругие команды:")
             print("  M - Карта, I - Инвентарь, H - Помощь")
             print("  S - Сохранить, L - Загрузить, Q - Выход в меню")
+            print(f"  U - Отменить ход/покупку, P - Тренировка ({'вкл' if self.practice else 'выкл'})")
 
             # Получение команды от игрока
             command = input("\nВаша команда: ").lower().strip()
 
             # Обработка команд
             if command in ['n', 'north', 'с', 'север']:
-                self.move_player(Direction.NORTH)
+                acted = self.move_player(Direction.NORTH) or acted
             elif command in ['s', 'south', 'ю', 'юг']:
-                self.move_player(Direction.SOUTH)
+                acted = self.move_player(Direction.SOUTH) or acted
             elif command in ['e', 'east', 'в', 'восток']:
-                self.move_player(Direction.EAST)
+                acted = self.move_player(Direction.EAST) or acted
             elif command in ['w', 'west', 'з', 'запад']:
-                self.move_player(Direction.WEST)
+                acted = self.move_player(Direction.WEST) or acted
             elif command == 'm':
                 self.map.draw_minimap(self.player.position)
                 input("\nНажмите Enter чтобы продолжить...")
@@ -1073,12 +2220,30 @@ class Game:
             elif command == 's':
                 self.save_game()
                 input("\nНажмите Enter чтобы продолжить...")
+            elif command in ('l', 'u') and self.world is not None:
+                print("❌ В общем мире загрузка и отмена хода недоступны")
+                input("\nНажмите Enter чтобы продолжить...")
             elif command == 'l':
                 if self.load_game():
+                    self.history = GameHistory(self)
                     print("✅ Игра загружена!")
                 else:
                     print("❌ Не удалось загрузить игру!")
                 input("\nНажмите Enter чтобы продолжить...")
+            elif command == 'u':
+                if self.history.undo():
+                    self.update_visibility()
+                    print("⏪ Ход отменен")
+                else:
+                    print("❌ Отменять больше нечего!")
+                input("\nНажмите Enter чтобы продолжить...")
+            elif command == 'p':
+                self.practice = not self.practice
+                if self.practice:
+                    print("🔁 Режим тренировки включен: после гибели в бою его можно повторить")
+                else:
+                    print("Режим тренировки выключен")
+                input("\nНажмите Enter чтобы продолжить...")
             elif command == 'q':
                 print("\n🚪 Вы уверены что хотите выйти в меню? (y/n)")
                 if input().lower() == 'y':
@@ -1091,6 +2256,18 @@ class Game:
                 print("❌ Неизвестная команда. Введите 'h' для справки.")
                 input("Нажмите Enter чтобы продолжить...")
 
+            # Часы мира идут только от действий: просмотр карты, справка,
+            # сохранение, отмена и шаг в стену хода не тратят
+            if not acted:
+                continue
+            self.turn += 1
+            self.advance_clock()
+            if self.history is not None:
+                self.history.checkpoint()
+            self.emit('turn', turn=self.turn)
+
+        self.emit('game_over', state=self.state.name)
+
     def show_game_over(self):
         """Показать экран завершения игры"""
         self.clear_screen()
@@ -1135,6 +2312,11 @@ class Game:
             rating = "👶 НОВИЧОК"
 
         print(f"\n🏅 Ваш рейтинг: {rating}")
+
+        if self.state in (GameState.WIN, GameState.LOSE):
+            rank = self.record_run_stats()
+            if rank is not None:
+                print(f"📊 Ваш счет не ниже, чем в {rank:.0%} прошлых прохождений")
         print("\n" + "="*50)
 
         if self.state == GameState.WIN:
@@ -1159,19 +2341,37 @@ class Game:
                     break
 
                 # Перезапуск игры
-                self.__init__()
+                self.reset()
 
 
 def main():
     """Точка входа в программу"""
+    parser = argparse.ArgumentParser(description="Terminal Adventure Game")
+    parser.add_argument('--size', type=int, default=6, help="размер карты")
+    parser.add_argument('--layout', choices=sorted(LAYOUTS), default='open',
+                        help="планировка: открытое поле или лабиринт со стенами")
+    parser.add_argument('--telemetry', metavar='DIR',
+                        help="записывать действия игрока в журнал в каталоге DIR")
+    parser.add_argument('--no-prefetch', action='store_true',
+                        help="не готовить карты в фоне (генерировать по запросу)")
+    args = parser.parse_args()
+    if args.no_prefetch:
+        MapPool.disable()
+    telemetry = None
     try:
-        game = Game()
+        game = Game(args.size, args.layout)
+        if args.telemetry:
+            telemetry = TelemetryLog(args.telemetry)
+            telemetry.attach(game)
         game.run()
     except KeyboardInterrupt:
         print("\n\nИгра прервана пользователем.")
     except Exception as e:
         print(f"\n⚠️  Произошла ошибка: {e}")
         print("Попробуйте перезапустить игру.")
+    finally:
+        if telemetry is not None:
+            telemetry.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,234 @@
+"""
+⏪ ИСТОРИЯ ХОДОВ И ОТМЕНА
+
+Снимки состояния игры со структурным разделением: флаги комнат хранятся в
+персистентном векторе (дереве кортежей), где изменение одной комнаты
+копирует только путь от корня до листа, а все остальные узлы общие с
+предыдущим снимком. Инвентарь хранится кортежем и переиспользуется, пока
+не изменится. Поэтому снимок на каждом ходу стоит O(изменений), а тысяча
+снимков занимает немногим больше одного состояния.
+
+Запасы магазина и таймеры мира (возврат монстров, зелье регенерации)
+невелики и хранятся в снимке целиком: отмена покупки возвращает товар, а
+отмена хода с зельем останавливает его действие.
+"""
+
+from collections import deque
+from typing import Any, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from scheduler import TimerWheel
+
+
+BITS = 4
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+
+class PersistentVector:
+    """Неизменяемый вектор фиксированной длины с дешевым set()"""
+
+    __slots__ = ('size', 'shift', 'root')
+
+    def __init__(self, size: int, shift: int, root: tuple):
+        self.size = size
+        self.shift = shift
+        self.root = root
+
+    @classmethod
+    def from_iterable(cls, values: Iterable[int]) -> 'PersistentVector':
+        """Построить вектор из последовательности"""
+        values = list(values)
+        size = len(values)
+        nodes = [tuple(values[i:i + WIDTH]) for i in range(0, max(size, 1), WIDTH)]
+        shift = 0
+        while len(nodes) > 1:
+            nodes = [tuple(nodes[i:i + WIDTH]) for i in range(0, len(nodes), WIDTH)]
+            shift += BITS
+        return cls(size, shift, nodes[0])
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int) -> int:
+        node = self.root
+        shift = self.shift
+        while shift:
+            node = node[(index >> shift) & MASK]
+            shift -= BITS
+        return node[index & MASK]
+
+    def set(self, index: int, value: int) -> 'PersistentVector':
+        """Новый вектор с измененным элементом (копируется только путь)"""
+        if self[index] == value:
+            return self
+        return PersistentVector(self.size, self.shift, self._set(self.root, self.shift, index, value))
+
+    def _set(self, node: tuple, shift: int, index: int, value: int) -> tuple:
+        slot = (index >> shift) & MASK
+        child = value if shift == 0 else self._set(node[slot], shift - BITS, index, value)
+        return node[:slot] + (child,) + node[slot + 1:]
+
+    def diff(self, other: 'PersistentVector') -> Iterator[int]:
+        """Индексы, где векторы различаются; общие поддеревья пропускаются"""
+        yield from self._diff(self.root, other.root, self.shift, 0)
+
+    def _diff(self, a: tuple, b: tuple, shift: int, base: int) -> Iterator[int]:
+        if a is b:
+            return
+        for slot, (x, y) in enumerate(zip(a, b)):
+            if x is y:
+                continue
+            index = base | (slot << shift)
+            if shift == 0:
+                if x != y:
+                    yield index
+            else:
+                yield from self._diff(x, y, shift - BITS, index)
+
+
+def room_state(room: dict) -> int:
+    """Изменяемые флаги комнаты одним числом"""
+    return (int(room['visited'])
+            | int(room['processed']) << 1
+            | int(room['has_treasure']) << 2
+            | int(room['has_monster']) << 3
+            | int(room['is_trap_active']) << 4)
+
+
+def freeze(value: Any) -> Any:
+    """Списки данных таймера -> кортежи (снимок не должен меняться)"""
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class Snapshot(NamedTuple):
+    """Неизменяемый снимок состояния игры"""
+    turn: int
+    player: tuple
+    rooms: PersistentVector
+    # Запасы магазина (None - полные) и таймеры: (ход, вид, данные, период)
+    shop: Optional[tuple] = None
+    timers: tuple = ()
+
+
+class GameHistory:
+    """Снимки по ходам, отмена и возврат к точке сохранения боя"""
+
+    PLAYER_FIELDS = ('health', 'max_health', 'position', 'gold', 'score',
+                     'level', 'experience', 'kills', 'weapon', 'armor')
+
+    def __init__(self, game: Any, limit: int = 1000):
+        self.game = game
+        game_map = game.map
+        size = game_map.size
+        self.size = size
+        self.pending: Set[Tuple[int, int]] = set()
+        self.inventory: tuple = ()
+        rooms = PersistentVector.from_iterable(
+            room_state(game_map.peek_room((index % size, index // size)))
+            for index in range(size * size)
+        )
+        self.snapshots = deque([Snapshot(game.turn, self.player_state(), rooms,
+                                         self.shop_state(), self.timers_state())], maxlen=limit)
+
+    def player_state(self) -> tuple:
+        """Кортеж полей игрока; инвентарь переиспользуется, если не менялся"""
+        player = self.game.player
+        inventory = player.inventory
+        if len(inventory) != len(self.inventory) or any(
+                a is not b for a, b in zip(inventory, self.inventory)):
+            self.inventory = tuple(inventory)
+        return tuple(getattr(player, field) for field in self.PLAYER_FIELDS) + (self.inventory,)
+
+    def shop_state(self) -> Optional[tuple]:
+        """Запасы магазина кортежем (None - все товары в полном запасе)"""
+        stock = self.game.shop.stock
+        return tuple(sorted(stock.items())) if stock is not None else None
+
+    def timers_state(self) -> tuple:
+        """Ожидающие таймеры сессии"""
+        return tuple((timer.due, timer.kind, freeze(timer.data), timer.interval)
+                     for timer in self.game.timers.pending())
+
+    def touch(self, position: Tuple[int, int]):
+        """Отметить комнату, изменившуюся не там, где стоит игрок"""
+        self.pending.add(position)
+
+    def snapshot(self) -> Snapshot:
+        """Снимок текущего состояния на основе последнего сохраненного.
+
+        Комнаты меняются только там, где был и где стоит игрок (и в
+        явно отмеченных через touch), поэтому проверяются только они."""
+        last = self.snapshots[-1]
+        player = self.player_state()
+        touched = self.pending | {last.player[2], self.game.player.position}
+        rooms = last.rooms
+        game_map = self.game.map
+        for x, y in touched:
+            room = game_map.rooms.get((x, y))
+            if room is not None:
+                rooms = rooms.set(y * self.size + x, room_state(room))
+        return Snapshot(self.game.turn, player, rooms, self.shop_state(), self.timers_state())
+
+    def checkpoint(self):
+        """Сохранить снимок хода (если что-то изменилось)"""
+        snapshot = self.snapshot()
+        self.pending.clear()
+        last = self.snapshots[-1]
+        if (snapshot.rooms is last.rooms and snapshot.player == last.player
+                and snapshot.shop == last.shop and snapshot.timers == last.timers):
+            return
+        self.snapshots.append(snapshot)
+
+    def can_undo(self) -> bool:
+        return len(self.snapshots) > 1
+
+    def undo(self) -> bool:
+        """Вернуться к состоянию до последнего хода"""
+        if not self.can_undo():
+            return False
+        current = self.snapshot()
+        self.snapshots.pop()
+        self.restore(self.snapshots[-1], current)
+        return True
+
+    def restore(self, target: Snapshot, current: Optional[Snapshot] = None):
+        """Вернуть игру к снимку, переписав только различающиеся комнаты"""
+        if current is None:
+            current = self.snapshot()
+        game_map = self.game.map
+        size = self.size
+        for index in current.rooms.diff(target.rooms):
+            position = (index % size, index // size)
+            state = target.rooms[index]
+            room = game_map.rooms[position]
+            room['visited'] = bool(state & 1)
+            room['processed'] = bool(state & 2)
+            room['has_treasure'] = bool(state & 4)
+            room['has_monster'] = bool(state & 8)
+            room['is_trap_active'] = bool(state & 16)
+            game_map.sync_room(position)
+
+        player = self.game.player
+        for field, value in zip(self.PLAYER_FIELDS, target.player):
+            setattr(player, field, value)
+        player.inventory = list(target.player[-1])
+        self.inventory = target.player[-1]
+
+        game = self.game
+        game.turn = target.turn
+        game.shop.stock = dict(target.shop) if target.shop is not None else None
+        timers = TimerWheel(target.turn)
+        for due, kind, data, interval in target.timers:
+            timers.schedule(due - target.turn, kind, list(data) if isinstance(data, tuple) else data,
+                            interval)
+        game.timers = timers
+        self.pending.clear()
+        # Последний снимок должен совпадать с восстановленным состоянием
+        if self.snapshots[-1] is not target:
+            self.snapshots.append(target)
+
+    def states(self) -> List[Snapshot]:
+        """Все хранимые снимки (от старых к новым)"""
+        return list(self.snapshots)
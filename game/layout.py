@@ -0,0 +1,210 @@
+"""
+🧱 ПЛАНИРОВКА ПОДЗЕМЕЛЬЯ: СТЕНЫ, КОРИДОРЫ И ЗАЛЫ
+
+Планировка хранит для каждой клетки битовую маску открытых проходов
+(север, юг, восток, запад) в одном bytearray, так что проверка хода -
+одна операция с байтом. Лабиринт строится алгоритмом sidewinder (идеальный
+лабиринт за один проход по рядам), поверх него вырезаются прямоугольные
+залы и случайные проломы, чтобы появились петли. Достижимость проверяется
+поиском в ширину за линейное время, а выход ставится в самую дальнюю от
+старта достижимую клетку.
+"""
+
+import random
+import re
+from typing import Callable, Dict, Optional, Tuple
+
+
+# Биты открытых проходов
+NORTH = 1
+SOUTH = 2
+EAST = 4
+WEST = 8
+
+OFFSETS = {
+    NORTH: (0, -1),
+    SOUTH: (0, 1),
+    EAST: (1, 0),
+    WEST: (-1, 0)
+}
+OPPOSITE = {NORTH: SOUTH, SOUTH: NORTH, EAST: WEST, WEST: EAST}
+
+
+class Layout:
+    """Планировка: маски проходов по клеткам и позиция выхода"""
+
+    __slots__ = ('size', 'passages', 'exit')
+
+    def __init__(self, size: int, passages: bytearray, exit_pos: Optional[Tuple[int, int]] = None):
+        self.size = size
+        self.passages = passages
+        self.exit = exit_pos if exit_pos is not None else (size - 1, size - 1)
+
+    def mask(self, position: Tuple[int, int]) -> int:
+        """Маска открытых проходов клетки"""
+        return self.passages[position[1] * self.size + position[0]]
+
+    def is_open(self, position: Tuple[int, int], bit: int) -> bool:
+        """Есть ли проход из клетки в заданном направлении"""
+        return bool(self.passages[position[1] * self.size + position[0]] & bit)
+
+    def carve(self, position: Tuple[int, int], bit: int):
+        """Открыть проход между клеткой и соседом"""
+        x, y = position
+        dx, dy = OFFSETS[bit]
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < self.size and 0 <= ny < self.size:
+            self.passages[y * self.size + x] |= bit
+            self.passages[ny * self.size + nx] |= OPPOSITE[bit]
+
+
+def open_layout(size: int, rng: Optional[random.Random] = None) -> Layout:
+    """Открытое поле без стен (классическая карта игры)"""
+    if size == 1:
+        return Layout(size, bytearray(1))
+    inner = bytes([EAST | WEST]) * (size - 2)
+    row = bytes([EAST]) + inner + bytes([WEST])
+
+    def with_bits(bits: int) -> bytes:
+        return bytes(b | bits for b in row)
+
+    first = with_bits(SOUTH)
+    middle = with_bits(NORTH | SOUTH)
+    last = with_bits(NORTH)
+    return Layout(size, bytearray(first + middle * (size - 2) + last))
+
+
+EAST_BITS = bytes.maketrans(b'01', bytes([0, EAST]))
+WEST_BITS = bytes.maketrans(b'01', bytes([0, WEST]))
+RUNS = re.compile('1*0')
+
+
+def or_into(passages: bytearray, start: int, pattern: bytes):
+    """Побайтовое ИЛИ шаблона с участком масок (одной операцией над int)"""
+    end = start + len(pattern)
+    merged = int.from_bytes(passages[start:end], 'big') | int.from_bytes(pattern, 'big')
+    passages[start:end] = merged.to_bytes(len(pattern), 'big')
+
+
+def corridor_row(bits: str) -> bytes:
+    """Маски ряда по строке '1' - проход на восток из клетки"""
+    east = bits.encode().translate(EAST_BITS)
+    west = ('0' + bits[:-1]).encode().translate(WEST_BITS)
+    return (int.from_bytes(east, 'big') | int.from_bytes(west, 'big')).to_bytes(len(bits), 'big')
+
+
+def maze_layout(size: int, rng: Optional[random.Random] = None,
+                room_density: float = 0.15, loop_chance: float = 0.03) -> Layout:
+    """Лабиринт из коридоров с залами и петлями"""
+    rng = rng or random.Random()
+    if size == 1:
+        return Layout(size, bytearray(1))
+    passages = bytearray(size * size)
+    randrange = rng.randrange
+    uniform = rng.random
+
+    # Sidewinder: первый ряд - сплошной коридор, в остальных рядах отрезки
+    # идут на восток и каждый пробивается на север в одной случайной клетке.
+    # Ряд целиком строится операциями над строками и байтами
+    passages[0:size] = corridor_row('1' * (size - 1) + '0')
+    for y in range(1, size):
+        base = y * size
+        bits = format(rng.getrandbits(size - 1), f'0{size - 1}b')[::-1] + '0'
+        row = bytearray(corridor_row(bits))
+        for run in RUNS.finditer(bits):
+            start, end = run.span()
+            north = start + int(uniform() * (end - start))
+            row[north] |= NORTH
+            passages[base - size + north] |= SOUTH
+        passages[base:base + size] = row
+
+    layout = Layout(size, passages)
+
+    # Залы: прямоугольники без внутренних стен
+    area = 0
+    target = int(size * size * room_density)
+    while area < target and size >= 4:
+        width = rng.randint(2, max(2, min(8, size // 2)))
+        height = rng.randint(2, max(2, min(8, size // 2)))
+        left = randrange(size - width + 1)
+        top = randrange(size - height + 1)
+        inner = corridor_row('1' * (width - 1) + '0')
+        rows = (bytes(b | SOUTH for b in inner),
+                bytes(b | NORTH | SOUTH for b in inner),
+                bytes(b | NORTH for b in inner))
+        for y in range(top, top + height):
+            pattern = rows[0] if y == top else rows[2] if y == top + height - 1 else rows[1]
+            or_into(passages, y * size + left, pattern)
+        area += width * height
+
+    # Проломы: делают петли, чтобы у лабиринта было больше одного пути
+    directions = (NORTH, SOUTH, EAST, WEST)
+    for _ in range(int(size * size * loop_chance)):
+        layout.carve((randrange(size), randrange(size)), directions[randrange(4)])
+
+    return layout
+
+
+def explore(layout: Layout, start: Tuple[int, int]) -> Tuple[int, Tuple[int, int], int]:
+    """Поиск в ширину от старта за O(клеток).
+
+    Возвращает (число достижимых клеток, самая дальняя клетка, расстояние до нее)."""
+    size = layout.size
+    passages = layout.passages
+    seen = bytearray(size * size)
+    start_index = start[1] * size + start[0]
+    seen[start_index] = 1
+    frontier = [start_index]
+    last = frontier
+    reached = 1
+    depth = -1
+
+    while frontier:
+        depth += 1
+        last = frontier
+        following = []
+        append = following.append
+        for index in frontier:
+            mask = passages[index]
+            if mask & NORTH and not seen[index - size]:
+                seen[index - size] = 1
+                append(index - size)
+            if mask & SOUTH and not seen[index + size]:
+                seen[index + size] = 1
+                append(index + size)
+            if mask & EAST and not seen[index + 1]:
+                seen[index + 1] = 1
+                append(index + 1)
+            if mask & WEST and not seen[index - 1]:
+                seen[index - 1] = 1
+                append(index - 1)
+        reached += len(following)
+        frontier = following
+
+    far = last[-1]
+    return reached, (far % size, far // size), depth
+
+
+LAYOUTS: Dict[str, Callable[..., Layout]] = {
+    'open': open_layout,
+    'maze': maze_layout
+}
+
+
+def generate_layout(kind: str, size: int, rng: Optional[random.Random] = None,
+                    start: Tuple[int, int] = (0, 0), attempts: int = 5) -> Layout:
+    """Планировка с проверенной достижимостью выхода.
+
+    Для открытого поля выход остается в правом нижнем углу, в остальных
+    планировках ставится в самую дальнюю от старта достижимую клетку."""
+    rng = rng or random.Random()
+    if kind == 'open':
+        return open_layout(size)
+    for _ in range(attempts):
+        layout = LAYOUTS[kind](size, rng)
+        reached, farthest, _ = explore(layout, start)
+        layout.exit = farthest
+        if size == 1 or reached == size * size or (layout.exit != start and reached > 1):
+            return layout
+    raise ValueError(f"Не удалось построить связную планировку '{kind}' размера {size}")
+
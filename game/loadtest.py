@@ -0,0 +1,436 @@
+"""
+🏋️ НАГРУЗОЧНОЕ ТЕСТИРОВАНИЕ
+
+Запускает много игровых сессий одновременно и кормит их скриптовыми
+командами. Скриптовый игрок отвечает на приглашения игры (меню, имя, бой,
+магазин, "Нажмите Enter") и замеряет задержку хода - время от отправки
+команды до следующего приглашения "Ваша команда". Раз в interval секунд
+записываются активные сессии, ходы в секунду, квантили задержки, CPU и RSS.
+
+Режимы:
+    thread  - сессии Game в потоках этого процесса (ввод и вывод каждой
+              сессии перехватываются отдельно): так видна конкуренция
+              внутри одного серверного процесса, в том числе за общий мир;
+    process - отдельный процесс `python -u game.py` на сессию, команды идут
+              через stdin, приглашения читаются из stdout.
+
+Запуск:
+    python loadtest.py --sessions 200 --turns 300
+    python loadtest.py --sessions 50 --mode process --json load.json
+    python loadtest.py --sessions 100 --world --size 32
+"""
+
+import argparse
+import builtins
+import codecs
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from game import Game, GameMap, LAYOUTS, MapPool, ROOM_HANDLERS
+from sampling import AliasSampler
+from stats import RunningStats, TDigest
+from world import SharedWorld
+
+
+GAME_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "game.py")
+
+# Приглашения input() в игре (без перевода строки перед ними)
+COMMAND_PROMPT = "Ваша команда: "
+PROMPTS = (COMMAND_PROMPT, "Ваш выбор (1-5): ", "Ваш выбор: ",
+           "Введите имя вашего героя: ", "Выберите действие (1-5): ")
+SCREEN_TAIL = 512
+
+# Команды по умолчанию: в основном ходы, иногда карта и инвентарь
+COMMAND_SAMPLER = AliasSampler(('n', 's', 'e', 'w', 'm', 'i'), (22, 22, 22, 22, 6, 6))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def random_commands(rng: random.Random) -> Iterator[str]:
+    """Бесконечный поток случайных команд"""
+    while True:
+        yield COMMAND_SAMPLER.sample(rng)
+
+
+def script_commands(lines: List[str]) -> Iterator[str]:
+    """Команды из сценария по кругу"""
+    while True:
+        yield from lines
+
+
+class ScriptedPlayer:
+    """Скриптовый игрок: отвечает на приглашения и замеряет ходы"""
+
+    def __init__(self, index: int, turns: int, commands: Iterator[str], origin: float):
+        self.index = index
+        self.turns = turns
+        self.commands = commands
+        self.origin = origin
+        self.screen = ""
+        self.turn_started: Optional[float] = None
+        # (секунда теста, задержка хода в секундах)
+        self.latencies: List[Tuple[float, float]] = []
+        self.finishing = False
+        self.games = 0
+        self.done = False
+        self.error: Optional[str] = None
+
+    def see(self, text: str):
+        """Запомнить хвост вывода сессии"""
+        self.screen = (self.screen + text)[-SCREEN_TAIL:]
+
+    def last_line(self) -> str:
+        lines = self.screen.rstrip("\n").rsplit("\n", 1)
+        return lines[-1].strip()
+
+    def pending_prompt(self) -> Optional[str]:
+        """Приглашение, которого ждет процесс игры, или None, если вывод не дописан"""
+        tail = self.screen.rsplit("\n", 1)[-1]
+        if tail in PROMPTS or (tail.startswith("Нажмите Enter") and tail.endswith("...")):
+            return tail
+        if not tail and self.last_line().endswith("(y/n)"):
+            return ""
+        return None
+
+    def respond(self, prompt: str) -> str:
+        """Ответ на приглашение; пустое приглашение - вопрос из последней строки"""
+        now = time.perf_counter()
+        text = prompt or self.last_line()
+        self.screen = ""
+
+        if COMMAND_PROMPT in text:
+            if self.turn_started is not None:
+                self.latencies.append((now - self.origin, now - self.turn_started))
+            if len(self.latencies) >= self.turns:
+                self.finishing = True
+                self.turn_started = None
+                return "q"
+            self.turn_started = time.perf_counter()
+            return next(self.commands)
+        if "Выберите действие" in text:
+            self.turn_started = None
+            self.games += 1
+            return "1"
+        if "Введите имя" in text:
+            return f"Нагрузка-{self.index}"
+        if "Ваш выбор (1-5)" in text:
+            return "1"
+        if "Ваш выбор" in text:
+            return "q"
+        if "сыграть еще раз" in text:
+            self.turn_started = None
+            return "n" if self.finishing else "y"
+        if "выйти в меню" in text:
+            return "y"
+        return ""
+
+
+class OutputRouter(io.TextIOBase):
+    """sys.stdout, который отдает вывод сессии ее игроку (по потоку)"""
+
+    def __init__(self, fallback: Any):
+        self.fallback = fallback
+        self.local = threading.local()
+
+    def write(self, text: str) -> int:
+        player = getattr(self.local, 'player', None)
+        if player is None:
+            return self.fallback.write(text)
+        player.see(text)
+        return len(text)
+
+    def flush(self):
+        if getattr(self.local, 'player', None) is None:
+            self.fallback.flush()
+
+
+@contextmanager
+def routed_io() -> Iterator[OutputRouter]:
+    """Перехватить input() и print() для сессий в потоках"""
+    router = OutputRouter(sys.stdout)
+
+    def scripted_input(prompt: str = "") -> str:
+        player = router.local.player
+        player.see(prompt)
+        return player.respond(prompt)
+
+    original_input, original_stdout = builtins.input, sys.stdout
+    builtins.input, sys.stdout = scripted_input, router
+    try:
+        yield router
+    finally:
+        builtins.input, sys.stdout = original_input, original_stdout
+
+
+def proc_usage(pid: int) -> Optional[Tuple[float, int]]:
+    """(секунды CPU, RSS в байтах) процесса из /proc или None"""
+    try:
+        with open(f"/proc/{pid}/stat", 'rb') as f:
+            fields = f.read().rsplit(b')', 1)[1].split()
+        with open(f"/proc/{pid}/statm", 'rb') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    # Поля 14 и 15 stat (utime, stime) - 12 и 13 после имени процесса
+    return (int(fields[11]) + int(fields[12])) / ticks, pages * os.sysconf('SC_PAGE_SIZE')
+
+
+class ResourceSampler(threading.Thread):
+    """Фоновый замер CPU и RSS процессов нагрузки раз в interval секунд"""
+
+    def __init__(self, players: List[ScriptedPlayer], pids: List[int], interval: float, origin: float):
+        super().__init__(name="loadtest-sampler", daemon=True)
+        self.players = players
+        self.pids = pids
+        self.interval = interval
+        self.origin = origin
+        self.samples: List[Dict[str, Any]] = []
+        self.stopping = threading.Event()
+        # Последнее время CPU каждого процесса: завершившаяся сессия
+        # пропадает из /proc, но ее CPU остается в сумме
+        self.cpu_by_pid: Dict[int, float] = {}
+
+    def usage(self) -> Tuple[float, int]:
+        rss = 0
+        for pid in list(self.pids):
+            usage = proc_usage(pid)
+            if usage is not None:
+                self.cpu_by_pid[pid] = usage[0]
+                rss += usage[1]
+        cpu = sum(self.cpu_by_pid.values())
+        if not rss and self.pids == [os.getpid()]:
+            # Без /proc: время CPU процесса, RSS неизвестен
+            cpu = time.process_time()
+        return cpu, rss
+
+    def run(self):
+        last_time, (last_cpu, _) = time.perf_counter(), self.usage()
+        while not self.stopping.wait(self.interval):
+            now = time.perf_counter()
+            cpu, rss = self.usage()
+            self.samples.append({
+                'time': now - self.origin,
+                'active': sum(not player.done for player in self.players),
+                'cpu_percent': (cpu - last_cpu) / (now - last_time) * 100,
+                'rss_mb': rss / 2 ** 20
+            })
+            last_time, last_cpu = now, cpu
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+
+def play_in_thread(router: OutputRouter, player: ScriptedPlayer, size: int, layout: str,
+                   world: Optional[SharedWorld]):
+    """Одна сессия в потоке этого процесса"""
+    router.local.player = player
+    try:
+        game = Game(size, layout)
+        if world is not None:
+            world.join(game)
+        game.run()
+    except Exception as error:
+        player.error = f"{type(error).__name__}: {error}"
+    finally:
+        router.local.player = None
+        player.done = True
+
+
+def play_in_process(player: ScriptedPlayer, size: int, layout: str, workdir: str,
+                    pids: List[int]):
+    """Одна сессия в отдельном процессе игры через stdin/stdout"""
+    env = dict(os.environ, PYTHONIOENCODING='utf-8')
+    process = subprocess.Popen(
+        [sys.executable, "-u", GAME_SCRIPT, "--size", str(size), "--layout", layout],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        cwd=workdir, env=env)
+    pids.append(process.pid)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    try:
+        while True:
+            chunk = process.stdout.read1(65536)
+            if not chunk:
+                break
+            player.see(decoder.decode(chunk))
+            prompt = player.pending_prompt()
+            if prompt is not None:
+                process.stdin.write((player.respond(prompt) + "\n").encode('utf-8'))
+                process.stdin.flush()
+    except (BrokenPipeError, OSError) as error:
+        player.error = f"{type(error).__name__}: {error}"
+    finally:
+        process.stdin.close()
+        process.wait()
+        player.done = True
+        if process.returncode and player.error is None:
+            player.error = f"код выхода {process.returncode}"
+
+
+def run_load(sessions: int, turns: int, mode: str = 'thread', size: int = 6, layout: str = 'open',
+             shared_world: bool = False, interval: float = 1.0, ramp: float = 0.0,
+             script: Optional[List[str]] = None, seed: int = 1,
+             workdir: Optional[str] = None) -> Dict[str, Any]:
+    """Прогнать нагрузку и вернуть отчет (см. build_report)"""
+    # Временный каталог удаляется после прогона, заданный через --workdir - нет
+    temporary = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="loadtest-")
+    origin = time.perf_counter()
+    players = [ScriptedPlayer(index, turns,
+                              script_commands(script) if script else random_commands(random.Random(seed + index)),
+                              origin)
+               for index in range(sessions)]
+    pids: List[int] = [os.getpid()] if mode == 'thread' else []
+    sampler = ResourceSampler(players, pids, interval, origin)
+
+    # Рекорды, сводка прохождений и сохранения пишутся в рабочий каталог теста
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        with routed_io() as router:
+            world = SharedWorld(GameMap(size, layout=layout)) if shared_world else None
+            if mode == 'thread':
+                # Много сессий в одном процессе - как на сервере: без фоновых карт
+                MapPool.disable()
+                ROOM_HANDLERS.reset_stats()
+                threads = [threading.Thread(target=play_in_thread, args=(router, player, size, layout, world),
+                                            daemon=True) for player in players]
+            else:
+                threads = [threading.Thread(target=play_in_process, args=(player, size, layout, workdir, pids),
+                                            daemon=True) for player in players]
+            sampler.start()
+            for thread in threads:
+                thread.start()
+                if ramp:
+                    time.sleep(ramp / sessions)
+            for thread in threads:
+                thread.join()
+            sampler.stop()
+    finally:
+        os.chdir(previous_cwd)
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = build_report(players, sampler.samples, interval, time.perf_counter() - origin)
+    report.update(mode=mode, sessions=sessions, size=size, layout=layout, world=shared_world,
+                  workdir=None if temporary else workdir)
+    # Обработчики комнат работают в этом процессе только в режиме потоков
+    report['handlers'] = [dict(zip(('type', 'calls', 'total_ms', 'mean_ms', 'max_ms'), row))
+                          for row in ROOM_HANDLERS.report()] if mode == 'thread' else []
+    return report
+
+
+def latency_summary(values: List[float]) -> Dict[str, Any]:
+    """Квантили и среднее задержек (мс)"""
+    digest = TDigest()
+    moments = RunningStats()
+    for value in values:
+        digest.add(value * 1000)
+        moments.add(value * 1000)
+    summary = {f"p{round(q * 100)}": digest.quantile(q) if moments.count else None for q in QUANTILES}
+    summary.update(count=moments.count, mean=moments.mean if moments.count else None,
+                   max=moments.max if moments.count else None)
+    return summary
+
+
+def build_report(players: List[ScriptedPlayer], samples: List[Dict[str, Any]],
+                 interval: float, elapsed: float) -> Dict[str, Any]:
+    """Общие квантили задержки хода и ряды по интервалам замера"""
+    latencies = [entry for player in players for entry in player.latencies]
+    timeline = []
+    for sample in samples:
+        start = sample['time'] - interval
+        window = [latency for at, latency in latencies if start < at <= sample['time']]
+        row = dict(sample)
+        row['turns_per_second'] = len(window) / interval
+        row['latency'] = latency_summary(window)
+        timeline.append(row)
+    return {
+        'elapsed': elapsed,
+        'turns': len(latencies),
+        'games': sum(player.games for player in players),
+        'errors': [f"#{player.index}: {player.error}" for player in players if player.error],
+        'latency': latency_summary([latency for _, latency in latencies]),
+        'timeline': timeline
+    }
+
+
+def format_ms(value: Optional[float]) -> str:
+    return f"{value:8.2f}" if value is not None else "       -"
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Текстовый отчет нагрузки"""
+    latency = report['latency']
+    lines = [
+        f"Режим: {report['mode']}, сессий: {report['sessions']}, карта {report['size']}x{report['size']} ({report['layout']})"
+        + (", общий мир" if report['world'] else ""),
+        f"Ходов: {report['turns']} за {report['elapsed']:.1f} с "
+        f"({report['turns'] / report['elapsed']:.0f} ходов/с), игр начато: {report['games']}, "
+        f"ошибок: {len(report['errors'])}",
+        "Задержка хода, мс:  p50 " + format_ms(latency['p50']) + "  p95 " + format_ms(latency['p95'])
+        + "  p99 " + format_ms(latency['p99']) + "  макс " + format_ms(latency['max']),
+        "",
+        "   Время  Активно  Ходов/с   p50 мс   p95 мс   p99 мс    CPU %   RSS МБ"
+    ]
+    for row in report['timeline']:
+        window = row['latency']
+        lines.append(f"{row['time']:7.1f}s {row['active']:8} {row['turns_per_second']:8.0f} "
+                     f"{format_ms(window['p50'])} {format_ms(window['p95'])} {format_ms(window['p99'])} "
+                     f"{row['cpu_percent']:8.0f} {row['rss_mb']:8.1f}")
+    if report.get('handlers'):
+        lines += ["", "Обработчик   Вызовов   Всего мс  Среднее мс    Макс мс"]
+        for row in report['handlers']:
+            lines.append(f"{row['type']:<10} {row['calls']:9} {row['total_ms']:10.1f} "
+                         f"{row['mean_ms']:11.3f} {row['max_ms']:10.3f}")
+    for error in report['errors'][:10]:
+        lines.append(f"⚠️  {error}")
+    return "\n".join(lines)
+
+
+def main():
+    """Точка входа нагрузочного теста"""
+    parser = argparse.ArgumentParser(description="Нагрузочный тест игровых сессий")
+    parser.add_argument('--sessions', type=int, default=100, help="одновременных сессий")
+    parser.add_argument('--turns', type=int, default=200, help="ходов на сессию")
+    parser.add_argument('--mode', choices=('thread', 'process'), default='thread')
+    parser.add_argument('--size', type=int, default=6, help="размер карты")
+    parser.add_argument('--layout', choices=sorted(LAYOUTS), default='open')
+    parser.add_argument('--world', action='store_true',
+                        help="все сессии в одном общем мире (только режим thread)")
+    parser.add_argument('--interval', type=float, default=1.0, help="период замера, секунд")
+    parser.add_argument('--ramp', type=float, default=0.0, help="разгон: секунд на запуск всех сессий")
+    parser.add_argument('--script', metavar='FILE', help="команды по строке, по кругу")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', help="каталог для файлов игры (по умолчанию временный)")
+    parser.add_argument('--json', metavar='FILE', help="сохранить отчет в JSON")
+    args = parser.parse_args()
+
+    if args.world and args.mode != 'thread':
+        parser.error("--world работает только в режиме thread")
+    script = None
+    if args.script:
+        with open(args.script, 'r', encoding='utf-8') as f:
+            script = [line.strip() for line in f if line.strip()]
+
+    report = run_load(args.sessions, args.turns, args.mode, args.size, args.layout, args.world,
+                      args.interval, args.ramp, script, args.seed, args.workdir)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+🧩 ПАРАЛЛЕЛЬНАЯ ГЕНЕРАЦИЯ БОЛЬШИХ КАРТ
+
+Типы комнат хранятся байтом на клетку в общем сегменте памяти
+(multiprocessing.shared_memory). Карта режется на квадратные плитки, каждую
+плитку заполняет рабочий процесс прямо в общем буфере, выбирая коды всей
+плитки одним вызовом таблицы псевдонимов (sampling.AliasSampler). Зерно плитки
+выводится из общего зерна и координат плитки, поэтому результат не зависит
+от числа процессов и порядка их работы.
+
+GameMap подключает буфер без копирования через SharedRooms: словарь
+комнаты создается только при первом обращении к клетке.
+"""
+
+import random
+import weakref
+from collections.abc import MutableMapping
+from multiprocessing import Pool, shared_memory
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+from sampling import sampler_for
+
+
+TILE = 256
+MASK64 = (1 << 64) - 1
+
+
+def tile_seed(seed: int, tile_x: int, tile_y: int) -> int:
+    """Зерно плитки (перемешивание splitmix64)"""
+    value = (seed * 0x9E3779B97F4A7C15 + tile_x * 0xBF58476D1CE4E5B9 + tile_y * 0x94D049BB133111EB) & MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+
+def fill_tile_into(types, size: int, tile: int, tile_x: int, tile_y: int, seed: int,
+                   weights: Tuple[int, ...]):
+    """Заполнить одну плитку кодами типов комнат"""
+    rng = random.Random(tile_seed(seed, tile_x, tile_y))
+    sampler = sampler_for(tuple(range(len(weights))), weights)
+    left = tile_x * tile
+    width = min(tile, size - left)
+    top = tile_y * tile
+    height = min(tile, size - top)
+    codes = sampler.sample_codes(width * height, rng)
+    for row in range(height):
+        start = (top + row) * size + left
+        types[start:start + width] = codes[row * width:(row + 1) * width]
+
+
+def fill_tile(task: tuple):
+    """Рабочий процесс: подключиться к сегменту по имени и заполнить плитку"""
+    name, *arguments = task
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        fill_tile_into(segment.buf, *arguments)
+    finally:
+        segment.close()
+
+
+def release(segment: shared_memory.SharedMemory):
+    """Закрыть и удалить сегмент"""
+    segment.close()
+    segment.unlink()
+
+
+class SharedTypes:
+    """Буфер кодов типов комнат в общей памяти (байт на клетку)"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.segment = shared_memory.SharedMemory(create=True, size=max(1, size * size))
+        self.types = self.segment.buf
+        # Сегмент удаляется вместе с последней ссылкой на буфер
+        self._finalizer = weakref.finalize(self, release, self.segment)
+
+    @property
+    def name(self) -> str:
+        return self.segment.name
+
+    def close(self):
+        """Освободить сегмент досрочно"""
+        self.types = None
+        self._finalizer()
+
+
+def generate_types(size: int, weights: Sequence[int], seed: int,
+                   workers: Optional[int] = None, tile: int = TILE) -> SharedTypes:
+    """Заполнить карту кодами типов (индекс в weights) по плиткам.
+
+    workers=1 - без процессов; результат при том же seed и tile одинаков
+    при любом числе процессов."""
+    weights = tuple(weights)
+    shared = SharedTypes(size)
+    tiles = (size + tile - 1) // tile
+    tasks = [(size, tile, tile_x, tile_y, seed, weights)
+             for tile_y in range(tiles) for tile_x in range(tiles)]
+
+    try:
+        if workers == 1 or len(tasks) == 1:
+            for task in tasks:
+                fill_tile_into(shared.types, *task)
+        else:
+            with Pool(workers) as pool:
+                for _ in pool.imap_unordered(fill_tile, [(shared.name,) + task for task in tasks]):
+                    pass
+    except BaseException:
+        shared.close()
+        raise
+    return shared
+
+
+class SharedRooms(MutableMapping):
+    """Комнаты карты поверх буфера кодов типов.
+
+    Словарь комнаты создается при первом обращении и дальше хранится в
+    кеше (игра меняет его флаги на месте). Для остальных клеток в памяти
+    лежит только байт кода."""
+
+    def __init__(self, size: int, types: Any, room_types: Sequence[Any],
+                 make_room: Callable[[Any], dict], owner: Optional[SharedTypes] = None):
+        self.size = size
+        self.types = types
+        self.room_types = tuple(room_types)
+        self.codes = {room_type: code for code, room_type in enumerate(self.room_types)}
+        self.make_room = make_room
+        self.owner = owner
+        self.cache: Dict[Tuple[int, int], dict] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Для pickle буфер копируется в обычный bytearray"""
+        state = self.__dict__.copy()
+        state['types'] = bytearray(self.types)
+        state['owner'] = None
+        return state
+
+    def index(self, position: Tuple[int, int]) -> int:
+        x, y = position
+        if not (0 <= x < self.size and 0 <= y < self.size):
+            raise KeyError(position)
+        return y * self.size + x
+
+    def __getitem__(self, position: Tuple[int, int]) -> dict:
+        room = self.cache.get(position)
+        if room is None:
+            room = self.make_room(self.room_types[self.types[self.index(position)]])
+            # setdefault атомарен: если два потока общего мира создали комнату
+            # одновременно, оба получат один и тот же объект
+            room = self.cache.setdefault(position, room)
+        return room
+
+    def peek(self, position: Tuple[int, int]) -> dict:
+        """Комната без сохранения в кеш (для чтения больших карт)"""
+        room = self.cache.get(position)
+        if room is None:
+            room = self.make_room(self.room_types[self.types[self.index(position)]])
+        return room
+
+    def __setitem__(self, position: Tuple[int, int], room: dict):
+        self.types[self.index(position)] = self.codes[room['type']]
+        self.cache[position] = room
+
+    def __delitem__(self, position: Tuple[int, int]):
+        raise TypeError("Комнаты карты нельзя удалять")
+
+    def __contains__(self, position: object) -> bool:
+        if not isinstance(position, tuple) or len(position) != 2:
+            return False
+        x, y = position
+        return 0 <= x < self.size and 0 <= y < self.size
+
+    def __len__(self) -> int:
+        return self.size * self.size
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        size = self.size
+        return ((x, y) for y in range(size) for x in range(size))
+
+    def positions_of(self, room_type: Any) -> Iterator[Tuple[int, int]]:
+        """Клетки с исходным типом room_type (поиск по буферу без словарей)"""
+        code = self.codes[room_type]
+        types = self.types
+        size = self.size
+        # memoryview сегмента не умеет find - ищем по рядам через bytes
+        for y in range(size):
+            row = bytes(types[y * size:(y + 1) * size])
+            x = row.find(code)
+            while x != -1:
+                yield x, y
+                x = row.find(code, x + 1)
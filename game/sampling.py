@@ -0,0 +1,131 @@
+"""
+🎲 ВЫБОР ПО ВЕСАМ ЗА O(1): МЕТОД ПСЕВДОНИМОВ
+
+random.choices с весами на каждый вызов ищет значение двоичным поиском по
+накопленным весам. Таблица псевдонимов (метод Уолкера-Воуза) строится один
+раз: COLUMNS столбцов равной вероятности, в каждом не больше двух исходов -
+основной с порогом prob и псевдоним. Выбор - один столбец и одно сравнение.
+
+Столбцов ровно 256, поэтому столбец для массовой выборки - это просто
+случайный байт: ряд кодов получается одним translate над блоком случайных
+байтов, и только байты смешанных столбцов (их не больше числа исходов)
+требуют второго случайного числа. Таблица строится в точной арифметике
+(Fraction), распределение совпадает с весами без округления.
+
+Пример:
+    sampler = AliasSampler(['a', 'b', 'c'], [6, 3, 1])
+    sampler.sample(rng)          # один исход
+    sampler.sample_n(1000, rng)  # список исходов
+    sampler.sample_codes(4096)   # bytes с номерами исходов
+"""
+
+import random
+import re
+from fractions import Fraction
+from functools import lru_cache
+from typing import Any, Generic, List, Optional, Sequence, TypeVar
+
+
+COLUMNS = 256
+
+T = TypeVar('T')
+
+
+def random_bytes(k: int, rng: Any = random) -> bytes:
+    """k случайных байтов (randbytes есть только с Python 3.9)"""
+    if hasattr(rng, 'randbytes'):
+        return rng.randbytes(k)
+    return rng.getrandbits(8 * k).to_bytes(k, 'little') if k else b''
+
+
+class AliasSampler(Generic[T]):
+    """Выбор исхода с заданными весами (без весов - равновероятно)"""
+
+    __slots__ = ('items', 'prob', 'primary', 'alias', 'primary_items', 'alias_items',
+                 'primary_table', 'mixed')
+
+    def __init__(self, items: Sequence[T], weights: Optional[Sequence[float]] = None):
+        self.items = tuple(items)
+        if weights is None:
+            weights = [1] * len(self.items)
+        if len(weights) != len(self.items):
+            raise ValueError("Число весов не совпадает с числом исходов")
+        if not 0 < len(self.items) <= COLUMNS:
+            raise ValueError(f"Исходов должно быть от 1 до {COLUMNS}")
+        if any(weight < 0 for weight in weights) or not sum(weights) > 0:
+            raise ValueError("Веса должны быть неотрицательными и не все нулевыми")
+
+        # Масса исхода в долях столбца: capacity - полный столбец
+        capacity = Fraction(sum(Fraction(weight) for weight in weights))
+        mass = [Fraction(weight) * COLUMNS for weight in weights]
+        small = [i for i, m in enumerate(mass) if 0 < m < capacity]
+        large = [i for i, m in enumerate(mass) if m >= capacity]
+
+        prob: List[float] = []
+        primary: List[int] = []
+        alias: List[int] = []
+        while small or large:
+            if small:
+                # Смешанный столбец: остаток малого исхода, добор из большого
+                low = small.pop()
+                high = large.pop()
+                prob.append(float(mass[low] / capacity))
+                primary.append(low)
+                alias.append(high)
+                mass[high] -= capacity - mass[low]
+            else:
+                high = large.pop()
+                prob.append(1.0)
+                primary.append(high)
+                alias.append(high)
+                mass[high] -= capacity
+            if mass[high] >= capacity:
+                large.append(high)
+            elif mass[high] > 0:
+                small.append(high)
+
+        self.prob = prob
+        self.primary = primary
+        self.alias = alias
+        self.primary_items = [self.items[i] for i in primary]
+        self.alias_items = [self.items[i] for i in alias]
+        self.primary_table = bytes(primary)
+        mixed = [column for column in range(COLUMNS) if prob[column] < 1.0]
+        self.mixed = (re.compile(b'[' + b''.join(re.escape(bytes([column])) for column in mixed) + b']')
+                      if mixed else None)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def sample(self, rng: Any = random) -> T:
+        """Один исход: столбец и порог из одного случайного числа"""
+        u = rng.random() * COLUMNS
+        column = int(u)
+        if u - column < self.prob[column]:
+            return self.primary_items[column]
+        return self.alias_items[column]
+
+    def sample_codes(self, k: int, rng: Any = random) -> bytes:
+        """k номеров исходов одним блоком (например, ряд или участок карты)"""
+        raw = random_bytes(k, rng)
+        if self.mixed is None:
+            return raw.translate(self.primary_table)
+        codes = bytearray(raw.translate(self.primary_table))
+        prob = self.prob
+        alias = self.alias
+        uniform = rng.random
+        for match in self.mixed.finditer(raw):
+            column = raw[match.start()]
+            if uniform() >= prob[column]:
+                codes[match.start()] = alias[column]
+        return bytes(codes)
+
+    def sample_n(self, k: int, rng: Any = random) -> List[T]:
+        """k исходов списком"""
+        return list(map(self.items.__getitem__, self.sample_codes(k, rng)))
+
+
+@lru_cache(maxsize=64)
+def sampler_for(items: tuple, weights: tuple) -> AliasSampler:
+    """Общая таблица для одинаковых весов (строится один раз)"""
+    return AliasSampler(items, weights)
@@ -0,0 +1,144 @@
+"""
+⏰ ПЛАНИРОВЩИК СОБЫТИЙ МИРА ПО ХОДАМ
+
+Иерархическое колесо таймеров: LEVELS уровней по SLOTS ячеек. Таймер
+кладется в ячейку уровня, соответствующего старшим различающимся битам
+хода срабатывания и текущего хода, и спускается на уровень ниже, когда
+часы доходят до начала его диапазона. Поэтому постановка - O(1), ход без
+срабатываний - O(1), а каждый таймер переносится не больше LEVELS раз.
+
+Пример:
+    wheel = TimerWheel()
+    wheel.schedule(30, 'trap_rearm', (3, 4))
+    for timer in wheel.advance(game.turn):
+        ...
+"""
+
+from typing import Any, Dict, Iterator, List, Optional
+
+
+BITS = 6
+SLOTS = 1 << BITS
+MASK = SLOTS - 1
+LEVELS = 4
+
+
+class Timer:
+    """Отложенное событие: вид, данные и период повтора (0 - однократное)"""
+
+    __slots__ = ('due', 'kind', 'data', 'interval', 'cancelled')
+
+    def __init__(self, due: int, kind: str, data: Any = None, interval: int = 0):
+        self.due = due
+        self.kind = kind
+        self.data = data
+        self.interval = interval
+        self.cancelled = False
+
+    def cancel(self):
+        """Отменить (таймер молча выбрасывается при срабатывании)"""
+        self.cancelled = True
+
+
+class TimerWheel:
+    """Колесо таймеров, которое движется вместе со счетчиком ходов"""
+
+    def __init__(self, now: int = 0):
+        self.now = now
+        # Уровни хранят только занятые ячейки: у простаивающей сессии
+        # колесо почти пустое, и 256 пустых списков на сессию не нужны
+        self.wheels: List[Dict[int, List[Timer]]] = [{} for _ in range(LEVELS)]
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def schedule(self, delay: int, kind: str, data: Any = None, interval: int = 0) -> Timer:
+        """Событие через delay ходов (не раньше следующего хода)"""
+        timer = Timer(self.now + max(1, delay), kind, data, interval)
+        self._insert(timer)
+        self.count += 1
+        return timer
+
+    def _insert(self, timer: Timer):
+        diff = timer.due ^ self.now
+        level = 0
+        while diff >= SLOTS and level < LEVELS - 1:
+            diff >>= BITS
+            level += 1
+        wheel = self.wheels[level]
+        slot = (timer.due >> (BITS * level)) & MASK
+        bucket = wheel.get(slot)
+        if bucket is None:
+            wheel[slot] = [timer]
+        else:
+            bucket.append(timer)
+
+    def tick(self) -> List[Timer]:
+        """Сдвинуть часы на один ход и вернуть сработавшие таймеры"""
+        self.now += 1
+        now = self.now
+
+        # Спуск с верхних уровней, когда часы дошли до начала их ячейки
+        for level in range(LEVELS - 1, 0, -1):
+            if now & ((1 << (BITS * level)) - 1):
+                continue
+            bucket = self.wheels[level].pop((now >> (BITS * level)) & MASK, None)
+            if bucket:
+                for timer in bucket:
+                    self._insert(timer)
+
+        bucket = self.wheels[0].pop(now & MASK, None)
+        if not bucket:
+            return []
+
+        fired = []
+        for timer in bucket:
+            if timer.due != now:
+                # Дальше диапазона колеса: ждет следующего оборота
+                self._insert(timer)
+                continue
+            self.count -= 1
+            if timer.cancelled:
+                continue
+            fired.append(timer)
+            if timer.interval:
+                timer.due = now + timer.interval
+                self._insert(timer)
+                self.count += 1
+        return fired
+
+    def advance(self, turn: int) -> List[Timer]:
+        """Догнать часы до хода turn"""
+        fired: List[Timer] = []
+        while self.now < turn:
+            fired.extend(self.tick())
+        return fired
+
+    def pending(self) -> Iterator[Timer]:
+        """Все ожидающие таймеры (для сохранения)"""
+        for wheel in self.wheels:
+            for bucket in wheel.values():
+                for timer in bucket:
+                    if not timer.cancelled:
+                        yield timer
+
+    def dump(self) -> List[list]:
+        """Таймеры в виде списков для JSON: [через сколько ходов, вид, данные, период]"""
+        return [[timer.due - self.now, timer.kind, timer.data, timer.interval]
+                for timer in self.pending()]
+
+    @classmethod
+    def load(cls, records: List[list], now: int = 0) -> 'TimerWheel':
+        """Колесо из записей dump"""
+        wheel = cls(now)
+        for delay, kind, data, interval in records:
+            wheel.schedule(delay, kind, data, interval)
+        return wheel
+
+    def find(self, kind: str, data: Optional[Any] = None) -> Optional[Timer]:
+        """Ожидающий таймер заданного вида (медленно: обходит все ячейки)"""
+        for timer in self.pending():
+            if timer.kind == kind and (data is None or timer.data == data):
+                return timer
+        return None
@@ -0,0 +1,239 @@
+"""
+🗄️ МЕНЕДЖЕР ИГРОВЫХ СЕССИЙ
+
+Держит активные сессии (объекты Game) в памяти, а давно не использованные
+вытесняет на диск в сжатом виде (pickle + zlib) по принципу LRU, чтобы
+суммарная оценка занятой памяти не превышала бюджет. Вытесненная сессия
+прозрачно поднимается с диска при следующем обращении. memory_report
+показывает, из чего складывается память одной сессии.
+
+Пример:
+    manager = SessionManager("sessions", memory_budget=512 * 1024 * 1024)
+    with manager.session("player-42") as game:
+        game.move_player(Direction.EAST)
+"""
+
+import gc
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import types
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from enum import Enum
+from typing import Any, Dict, Iterator, List, Optional, Callable, Set, Tuple
+
+from game import (Game, ROOM_DESCRIPTIONS, SHARED_ITEMS, SHOP_CATALOG, SHOP_PRICES,
+                  STARTER_ITEMS, TREASURE_ITEMS)
+
+
+# Оценка занимаемой памяти (байт), замерено через tracemalloc на CPython 3.11:
+# простаивающая сессия 6x6 - около 12 КБ. Предметы общие для всех сессий
+# (каталог магазина, стартовые, сокровища), в инвентаре от них только ссылка
+SESSION_BASE_BYTES = 6 * 1024
+ROOM_BYTES = 175
+ITEM_BYTES = 8
+
+
+def estimate_session_bytes(game: Game) -> int:
+    """Оценка памяти, занятой сессией"""
+    size = SESSION_BASE_BYTES
+    if game._map is not None:
+        rooms = game._map.rooms
+        # На общей карте словари есть только у тронутых комнат, плюс байт на клетку
+        cached = getattr(rooms, 'cache', None)
+        if cached is not None:
+            size += len(cached) * ROOM_BYTES + len(rooms)
+        else:
+            size += len(rooms) * ROOM_BYTES
+    if game.player is not None:
+        size += len(game.player.inventory) * ITEM_BYTES
+    return size
+
+
+# Объекты, которые никогда не принадлежат одной сессии
+SHARED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+                types.MethodType, types.MappingProxyType, Enum)
+
+
+def shared_object_ids(game: Game) -> Set[int]:
+    """id общих объектов: каталог и предметы, описания комнат, пул и реестр"""
+    shared: List[Any] = [game.map_pool, game.room_handlers, SHOP_CATALOG, SHOP_PRICES,
+                         STARTER_ITEMS, TREASURE_ITEMS, SHARED_ITEMS]
+    shared.extend(SHOP_CATALOG)
+    shared.extend(STARTER_ITEMS)
+    shared.extend(TREASURE_ITEMS)
+    shared.extend(SHARED_ITEMS.values())
+    for descriptions in ROOM_DESCRIPTIONS.values():
+        shared.extend(descriptions)
+    return {id(obj) for obj in shared}
+
+
+def deep_sizeof(obj: Any, seen: Set[int]) -> int:
+    """Байты объекта и всего, что достижимо из него и еще не учтено в seen"""
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or current is None or isinstance(current, (bool, SHARED_TYPES)):
+            continue
+        if type(current) is int and -5 <= current <= 256:
+            continue  # малые числа кешируются интерпретатором
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        stack.extend(gc.get_referents(current))
+    return size
+
+
+def memory_report(game: Game) -> Dict[str, int]:
+    """Байты сессии по составляющим.
+
+    Общие объекты (каталог магазина, предметы, описания комнат, пул карт,
+    реестр обработчиков) не учитываются; объект, достижимый из нескольких
+    составляющих, учитывается в первой из них."""
+    seen = shared_object_ids(game)
+    seen.add(id(game))
+    components: List[Tuple[str, Any]] = [
+        ('player', game.player),
+        ('map', game._map),
+        ('shop', game._shop),
+        ('timers', game.timers),
+        ('history', game.history),
+        ('advisor', game._advisor),
+        ('listeners', game.listeners),
+    ]
+    report = {name: deep_sizeof(component, seen) for name, component in components}
+    seen.discard(id(game))
+    report['game'] = deep_sizeof(game, seen)
+    report['total'] = sum(report.values())
+    return report
+
+
+def format_memory_report(report: Dict[str, int]) -> str:
+    """Текстовая таблица memory_report"""
+    total = report['total'] or 1
+    lines = ["Составляющая       Байт      Доля"]
+    for name, size in sorted(report.items(), key=lambda item: -item[1]):
+        if name != 'total':
+            lines.append(f"{name:<12} {size:10} {size * 100 / total:8.1f}%")
+    lines.append(f"{'total':<12} {report['total']:10}")
+    return "\n".join(lines)
+
+
+class SessionManager:
+    """LRU-кеш игровых сессий с вытеснением на диск"""
+
+    def __init__(self, directory: str, memory_budget: int = 256 * 1024 * 1024,
+                 factory: Callable[[], Game] = Game,
+                 estimate: Callable[[Game], int] = estimate_session_bytes):
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.factory = factory
+        self.estimate = estimate
+        self.resident: 'OrderedDict[str, Game]' = OrderedDict()
+        self.sizes: Dict[str, int] = {}
+        self.pinned: Dict[str, int] = {}
+        self.resident_bytes = 0
+        self.lock = threading.RLock()
+        self.stats = {'hits': 0, 'loads': 0, 'created': 0, 'evictions': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, session_id: str) -> str:
+        """Файл вытесненной сессии"""
+        name = hashlib.sha1(session_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{name}.session")
+
+    def get(self, session_id: str, create: bool = True) -> Optional[Game]:
+        """Сессия из памяти, с диска или новая"""
+        with self.lock:
+            game = self.resident.get(session_id)
+            if game is not None:
+                self.resident.move_to_end(session_id)
+                self.stats['hits'] += 1
+                return game
+
+            path = self.path(session_id)
+            if os.path.exists(path):
+                game = self.rehydrate(path)
+                os.remove(path)
+                self.stats['loads'] += 1
+            elif create:
+                game = self.factory()
+                self.stats['created'] += 1
+            else:
+                return None
+
+            self.resident[session_id] = game
+            self.track(session_id)
+            self.enforce_budget(keep=session_id)
+            return game
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[Game]:
+        """Сессия, закрепленная в памяти на время обработки команды"""
+        with self.lock:
+            game = self.get(session_id)
+            self.pinned[session_id] = self.pinned.get(session_id, 0) + 1
+        try:
+            yield game
+        finally:
+            with self.lock:
+                self.pinned[session_id] -= 1
+                if not self.pinned[session_id]:
+                    del self.pinned[session_id]
+                # Сессия могла вырасти за время команды (например, загрузка карты)
+                self.track(session_id)
+                self.enforce_budget()
+
+    def track(self, session_id: str):
+        """Пересчитать оценку памяти сессии"""
+        size = self.estimate(self.resident[session_id])
+        self.resident_bytes += size - self.sizes.get(session_id, 0)
+        self.sizes[session_id] = size
+
+    def enforce_budget(self, keep: Optional[str] = None):
+        """Вытеснять самые давние сессии, пока не уложимся в бюджет"""
+        for session_id in list(self.resident):
+            if self.resident_bytes <= self.memory_budget:
+                break
+            if session_id in self.pinned or session_id == keep:
+                continue
+            self.evict(session_id)
+
+    def evict(self, session_id: str):
+        """Сохранить сессию на диск и выгрузить из памяти"""
+        with self.lock:
+            game = self.resident.pop(session_id)
+            self.resident_bytes -= self.sizes.pop(session_id)
+            path = self.path(session_id)
+            temp_path = path + ".tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(zlib.compress(pickle.dumps(game, protocol=pickle.HIGHEST_PROTOCOL)))
+            os.replace(temp_path, path)
+            self.stats['evictions'] += 1
+
+    @staticmethod
+    def rehydrate(path: str) -> Game:
+        """Поднять сессию из файла"""
+        with open(path, 'rb') as f:
+            return pickle.loads(zlib.decompress(f.read()))
+
+    def drop(self, session_id: str):
+        """Удалить сессию совсем (из памяти и с диска)"""
+        with self.lock:
+            if session_id in self.resident:
+                del self.resident[session_id]
+                self.resident_bytes -= self.sizes.pop(session_id)
+            path = self.path(session_id)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def flush(self):
+        """Вытеснить на диск все незакрепленные сессии (перед остановкой)"""
+        with self.lock:
+            for session_id in list(self.resident):
+                if session_id not in self.pinned:
+                    self.evict(session_id)
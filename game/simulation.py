@@ -0,0 +1,438 @@
+"""
+🤖 БЕЗГОЛОВАЯ СИМУЛЯЦИЯ ПРОХОЖДЕНИЙ
+
+Проигрывает партию без ввода-вывода по тем же правилам, что и game.py,
+с простым ботом вместо игрока: та же планировка со стенами и выходом в
+самой дальней клетке, возврат монстров, перезарядка ловушек и запасы
+магазина по часам ходов. Все случайные решения берутся из собственного
+random.Random(seed), поэтому прохождение полностью воспроизводимо по
+зерну и параметрам баланса.
+"""
+
+import copy
+import random
+from collections import deque
+from typing import Dict, List, Tuple, Any, Optional
+
+from advisor import CombatAdvisor, ATTACK, DEFEND, POTION
+from analytics import MapAnalytics
+from game import (
+    DANGER_RADIUS, RoomType, Shop, MonsterTemplates, MonsterPool, TreasureIndex,
+    MONSTER_BASE_HEALTH, MONSTER_HEALTH_PER_LEVEL,
+    MONSTER_BASE_DAMAGE, MONSTER_DAMAGE_PER_LEVEL,
+    MONSTER_EXPERIENCE_PER_LEVEL, MONSTER_GOLD_RANGE,
+    TRAP_DAMAGE_RANGE, TREASURE_GOLD_RANGE, TREASURE_SAMPLER, GENERATED_ROOM_TYPES,
+    MONSTER_RESPAWN_TURNS, TRAP_REARM_TURNS, SHOP_STOCK, SHOP_RESTOCK_TURNS
+)
+from layout import EAST, NORTH, OFFSETS, SOUTH, WEST, generate_layout
+from sampling import sampler_for
+from scheduler import TimerWheel
+
+
+# Стартовое снаряжение игрока (см. Game.setup_player)
+START_WEAPON = 2
+START_ARMOR = 1
+START_POTIONS = [30]
+
+# Порядок комнат на карте (без выхода) для выборки по весам
+ROOM_TYPES = GENERATED_ROOM_TYPES
+
+# Что бот считает опасным при выборе пути
+DANGER_TYPES = (RoomType.MONSTER, RoomType.TRAP)
+
+
+def default_params() -> Dict[str, Any]:
+    """Параметры баланса, совпадающие с текущими константами игры"""
+    return {
+        'map_size': 6,
+        'layout': 'open',
+        'room_weights': {rt.name: rt.weight for rt in ROOM_TYPES},
+        'monster_base_health': MONSTER_BASE_HEALTH,
+        'monster_health_per_level': MONSTER_HEALTH_PER_LEVEL,
+        'monster_base_damage': MONSTER_BASE_DAMAGE,
+        'monster_damage_per_level': MONSTER_DAMAGE_PER_LEVEL,
+        'monster_experience_per_level': MONSTER_EXPERIENCE_PER_LEVEL,
+        'monster_gold_min': MONSTER_GOLD_RANGE[0],
+        'monster_gold_max': MONSTER_GOLD_RANGE[1],
+        'trap_damage_min': TRAP_DAMAGE_RANGE[0],
+        'trap_damage_max': TRAP_DAMAGE_RANGE[1],
+        'prices': dict(Shop().prices),
+        'shop_stock': SHOP_STOCK,
+        'shop_restock_turns': SHOP_RESTOCK_TURNS,
+        'monster_respawn_turns': MONSTER_RESPAWN_TURNS,
+        'trap_rearm_turns': TRAP_REARM_TURNS,
+        'max_turns': 500
+    }
+
+
+def set_param(params: Dict[str, Any], path: str, value: Any):
+    """Установить параметр по пути вида 'room_weights.MONSTER'"""
+    keys = path.split('.')
+    target = params
+    for key in keys[:-1]:
+        target = target[key]
+    if keys[-1] not in target:
+        raise KeyError(f"Неизвестный параметр баланса: {path}")
+    target[keys[-1]] = value
+
+
+def make_params(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Параметры по умолчанию с заменой отдельных значений"""
+    params = copy.deepcopy(default_params())
+    for path, value in (overrides or {}).items():
+        set_param(params, path, value)
+    return params
+
+
+def monster_templates(params: Dict[str, Any]) -> MonsterTemplates:
+    """Таблица монстров по уровням для параметров баланса"""
+    return MonsterTemplates(
+        base_health=params['monster_base_health'],
+        health_per_level=params['monster_health_per_level'],
+        base_damage=params['monster_base_damage'],
+        damage_per_level=params['monster_damage_per_level'],
+        experience_per_level=params['monster_experience_per_level'],
+        gold_range=(params['monster_gold_min'], params['monster_gold_max'])
+    )
+
+
+class SimPlayer:
+    """Облегченное состояние игрока для симуляции"""
+
+    def __init__(self):
+        self.health = 100
+        self.max_health = 100
+        self.position = (0, 0)
+        self.gold = 100
+        self.score = 0
+        self.level = 1
+        self.experience = 0
+        self.kills = 0
+        self.weapon = START_WEAPON
+        self.armor = START_ARMOR
+        self.potions = list(START_POTIONS)
+        self.has_torch = True
+
+    def take_damage(self, damage: int) -> bool:
+        """Получение урона с учетом брони (как Player.take_damage)"""
+        if self.armor:
+            damage = max(1, damage - self.armor)
+        self.health = max(0, self.health - damage)
+        return self.health > 0
+
+    def add_experience(self, exp: int):
+        """Опыт и повышение уровня (как Player.add_experience)"""
+        self.experience += exp
+        while self.experience >= self.level * 100:
+            self.level += 1
+            self.experience = 0
+            self.max_health += 20
+            self.health = self.max_health
+
+
+class Simulation:
+    """Одно прохождение подземелья ботом"""
+
+    def __init__(self, seed: int, params: Dict[str, Any], pool: Optional[MonsterPool] = None,
+                 advisor: Optional[CombatAdvisor] = None):
+        self.rng = random.Random(seed)
+        self.params = params
+        self.advisor = advisor
+        self.pool = pool or MonsterPool(monster_templates(params))
+        self.size = params['map_size']
+        self.player = SimPlayer()
+        self.turns = 0
+        self.rooms: Dict[Tuple[int, int], list] = {}
+        # Расстояния по коридорам до целей бота (кешируются по цели)
+        self.distance_maps: Dict[Tuple[int, int], Dict[Tuple[int, int], int]] = {}
+        # Продано каждого товара с последнего пополнения магазина
+        self.sold: Dict[str, int] = {}
+        self.timers = TimerWheel()
+        self.timers.schedule(params['shop_restock_turns'], 'shop_restock',
+                             interval=params['shop_restock_turns'])
+        self.generate_map()
+
+    def generate_map(self):
+        """Генерация карты по весам из параметров (как GameMap)"""
+        self.layout = generate_layout(self.params['layout'], self.size, self.rng)
+        self.exit = self.layout.exit
+        weights = tuple(self.params['room_weights'][rt.name] for rt in ROOM_TYPES)
+        sampler = sampler_for(ROOM_TYPES, weights)
+
+        for x in range(self.size):
+            row = sampler.sample_n(self.size, self.rng)
+            for y in range(self.size):
+                # [тип, посещена, обработана]
+                self.rooms[(x, y)] = [row[y], False, False]
+
+        self.rooms[(0, 0)] = [RoomType.EMPTY, True, True]
+        self.rooms[self.exit][0] = RoomType.EXIT
+
+        # Сокровища за стенами, отрезанные от входа, бот не достанет
+        reachable = self.distances((0, 0))
+        self.treasures = TreasureIndex(self.size)
+        for pos, room in self.rooms.items():
+            if room[0] == RoomType.TREASURE and pos in reachable:
+                self.treasures.add(pos)
+
+        # Префиксные суммы по типам: опасность района за O(1) на запрос
+        index = {room_type: code for code, room_type in enumerate(RoomType)}
+        codes = bytearray(self.size * self.size)
+        for (x, y), room in self.rooms.items():
+            codes[y * self.size + x] = index[room[0]]
+        self.analytics = MapAnalytics(self.size, codes, list(RoomType))
+
+    def neighbours(self, position: Tuple[int, int]) -> List[Tuple[int, int]]:
+        """Соседние клетки, в которые есть проход"""
+        x, y = position
+        result = []
+        for bit in (NORTH, SOUTH, EAST, WEST):
+            if self.layout.is_open(position, bit):
+                dx, dy = OFFSETS[bit]
+                result.append((x + dx, y + dy))
+        return result
+
+    def distances(self, target: Tuple[int, int]) -> Dict[Tuple[int, int], int]:
+        """Длина пути по коридорам от каждой достижимой клетки до цели"""
+        result = self.distance_maps.get(target)
+        if result is None:
+            result = {target: 0}
+            frontier = deque([target])
+            while frontier:
+                position = frontier.popleft()
+                for pos in self.neighbours(position):
+                    if pos not in result:
+                        result[pos] = result[position] + 1
+                        frontier.append(pos)
+            self.distance_maps[target] = result
+        return result
+
+    def danger(self, position: Tuple[int, int]) -> int:
+        """Живых монстров и взведенных ловушек вокруг клетки"""
+        return self.analytics.remaining_around(DANGER_TYPES, position, DANGER_RADIUS)
+
+    def step_towards(self, options: List[Tuple[int, int]], target: Tuple[int, int],
+                     cautious: bool = False) -> Tuple[int, int]:
+        """Случайный из соседей, сокращающих путь до цели; cautious - из
+        них самый безопасный район"""
+        distances = self.distances(target)
+        unreachable = self.size * self.size
+
+        def distance(pos):
+            return distances.get(pos, unreachable)
+
+        best = min(distance(pos) for pos in options)
+        closest = [pos for pos in options if distance(pos) == best]
+        if cautious and len(closest) > 1:
+            least = min(self.danger(pos) for pos in closest)
+            closest = [pos for pos in closest if self.danger(pos) == least]
+        return self.rng.choice(closest)
+
+    def choose_move(self) -> Tuple[int, int]:
+        """Бот идет к ближайшему сокровищу, затем исследует непосещенные
+        комнаты, а ослабев — идет к выходу в обход опасных районов"""
+        player = self.player
+        options = self.neighbours(player.position)
+        exit_pos = self.exit
+
+        weak = player.health < player.max_health * 0.4 and not player.potions
+        if not weak:
+            treasure = self.treasures.nearest(player.position)
+            if treasure is not None:
+                return self.step_towards(options, treasure)
+            unvisited = [pos for pos in options if not self.rooms[pos][1]]
+            if unvisited:
+                return self.rng.choice(unvisited)
+
+        return self.step_towards(options, exit_pos, cautious=weak)
+
+    def fight(self) -> Optional[bool]:
+        """Бой с монстром: True - победа, False - смерть, None - побег"""
+        monster = self.pool.acquire(self.player.level, self.rng)
+        try:
+            if self.advisor is not None:
+                return self.fight_with_advisor(monster)
+            return self.fight_monster(monster)
+        finally:
+            self.pool.release(monster)
+
+    def fight_monster(self, monster) -> Optional[bool]:
+        """Раунды боя с конкретным монстром"""
+        player = self.player
+        rng = self.rng
+        hit = max(1, monster.damage - player.armor)
+
+        while monster.health > 0:
+            if player.health <= hit * 2 and player.potions:
+                potion = player.potions.pop(0)
+                player.health = min(player.max_health, player.health + potion)
+            elif player.health <= hit:
+                # Побег: при неудаче монстр в этот ход не бьет (как в игре)
+                if rng.random() < 0.6:
+                    return None
+                continue
+            else:
+                monster.health -= rng.randint(10, 20) + player.weapon
+                if monster.health <= 0:
+                    break
+
+            if not player.take_damage(monster.damage):
+                return False
+
+        player.add_experience(monster.experience)
+        player.gold += monster.gold
+        player.score += monster.experience * 2
+        player.kills += 1
+        return True
+
+    def fight_with_advisor(self, monster) -> Optional[bool]:
+        """Бой по советам CombatAdvisor с правилами боевого меню игры"""
+        player = self.player
+        rng = self.rng
+
+        while monster.health > 0:
+            advice = self.advisor.advise_state(
+                player.health, player.max_health, player.weapon, player.armor or None,
+                monster.health, monster.damage, tuple(player.potions)
+            )
+            damage = monster.damage
+            if advice.action == ATTACK:
+                monster.health -= rng.randint(10, 20) + player.weapon
+                if monster.health <= 0:
+                    break
+            elif advice.action == DEFEND:
+                damage = max(1, damage // 2)
+            elif advice.action == POTION:
+                potion = player.potions.pop(0)
+                player.health = min(player.max_health, player.health + potion)
+            else:
+                # Побег: при неудаче монстр в этот ход не бьет
+                if rng.random() < 0.6:
+                    return None
+                continue
+
+            if not player.take_damage(damage):
+                return False
+
+        player.add_experience(monster.experience)
+        player.gold += monster.gold
+        player.score += monster.experience * 2
+        player.kills += 1
+        return True
+
+    def visit_shop(self):
+        """Покупки бота: зелья, затем улучшения оружия и брони"""
+        player = self.player
+        prices = self.params['prices']
+        wishlist = [
+            ("Малое зелье здоровья", len(player.potions) < 2),
+            ("Мифриловый меч", player.weapon < 10),
+            ("Стальной меч", player.weapon < 5),
+            ("Стальная броня", player.armor < 7),
+            ("Кожаная броня", player.armor < 3)
+        ]
+        upgrades = {
+            "Мифриловый меч": ('weapon', 10),
+            "Стальной меч": ('weapon', 5),
+            "Стальная броня": ('armor', 7),
+            "Кожаная броня": ('armor', 3)
+        }
+        stock = self.params['shop_stock']
+        for name, wanted in wishlist:
+            price = prices[name]
+            if not wanted or player.gold < price or self.sold.get(name, 0) >= stock:
+                continue
+            player.gold -= price
+            self.sold[name] = self.sold.get(name, 0) + 1
+            if name in upgrades:
+                slot, value = upgrades[name]
+                setattr(player, slot, value)
+            else:
+                player.potions.append(30)
+
+    def enter_room(self, room: list) -> Optional[bool]:
+        """События комнаты: True - выход найден, False - смерть"""
+        room_type, _, processed = room
+        params = self.params
+        player = self.player
+        rng = self.rng
+
+        if room_type == RoomType.EXIT:
+            return True
+        if room_type == RoomType.SHOP:
+            self.visit_shop()
+        elif processed:
+            return None
+        elif room_type == RoomType.TREASURE:
+            player.score += TREASURE_SAMPLER.sample(rng).value
+            player.gold += rng.randint(*TREASURE_GOLD_RANGE)
+            room[2] = True
+            self.treasures.remove(player.position)
+        elif room_type == RoomType.MONSTER:
+            outcome = self.fight()
+            if outcome is False:
+                return False
+            if outcome:
+                room[2] = True
+                self.analytics.set_cleared(player.position, room_type, True)
+                self.timers.schedule(params['monster_respawn_turns'], 'monster_respawn',
+                                     player.position)
+        elif room_type == RoomType.TRAP:
+            if not (player.has_torch and rng.random() < 0.6):
+                damage = rng.randint(params['trap_damage_min'], params['trap_damage_max'])
+                if not player.take_damage(damage):
+                    return False
+            room[2] = True
+            self.analytics.set_cleared(player.position, room_type, True)
+            self.timers.schedule(params['trap_rearm_turns'], 'trap_rearm', player.position)
+        return None
+
+    def advance_clock(self):
+        """Наступившие события мира (как Game.advance_clock)"""
+        for timer in self.timers.advance(self.turns):
+            if timer.kind == 'shop_restock':
+                self.sold.clear()
+                continue
+            position = timer.data
+            if position == self.player.position:
+                # Пока игрок в комнате, монстр и ловушка не возвращаются
+                self.timers.schedule(1, timer.kind, position)
+                continue
+            room = self.rooms[position]
+            room[2] = False
+            self.analytics.set_cleared(position, room[0], False)
+
+    def run(self) -> Dict[str, Any]:
+        """Проиграть партию до победы, смерти или лимита ходов"""
+        player = self.player
+        outcome = None
+        while self.turns < self.params['max_turns']:
+            self.turns += 1
+            player.position = self.choose_move()
+            room = self.rooms[player.position]
+            room[1] = True
+            outcome = self.enter_room(room)
+            if outcome is not None:
+                break
+            self.advance_clock()
+
+        return {
+            'won': outcome is True,
+            'died': outcome is False,
+            'score': player.score,
+            'turns': self.turns,
+            'kills': player.kills,
+            'level': player.level,
+            'gold': player.gold
+        }
+
+
+def simulate_run(seed: int, params: Optional[Dict[str, Any]] = None,
+                 pool: Optional[MonsterPool] = None,
+                 advisor: Optional[CombatAdvisor] = None) -> Dict[str, Any]:
+    """Проиграть одно прохождение с заданным зерном.
+
+    Для серии прохождений с одними параметрами передавайте общий pool,
+    чтобы монстры переиспользовались, а не создавались заново. С advisor
+    бой ведет CombatAdvisor - эталонный бот для сравнения стратегий."""
+    return Simulation(seed, params or default_params(), pool, advisor).run()
@@ -0,0 +1,309 @@
+"""
+📺 ТРАНСЛЯЦИЯ ИГРЫ ЗРИТЕЛЯМ
+
+Публикатор подписывается на события игры и после каждого хода рассылает
+компактное сообщение: дельту (изменившиеся поля игрока, флаги затронутых
+комнат и боевые события хода) или, раз в keyframe_interval ходов, полный
+ключевой кадр. Сообщения - строки JSON, по одной на ход.
+
+Игровой цикл никогда не ждет зрителей: у каждого подписчика своя
+ограниченная очередь, и если она переполнена, подписчик сбрасывается и
+пропускает дельты до следующего ключевого кадра.
+
+Пример:
+    hub = SpectatorHub()
+    hub.attach(game)
+    SpectatorServer(hub, ("127.0.0.1", 7777)).start()
+"""
+
+import json
+import os
+import queue
+import socket
+import threading
+from typing import Dict, List, Tuple, Any, Optional, Union
+
+from game import Game, GameMap
+
+
+# События, которые попадают в дельту хода как есть
+STREAMED_EVENTS = (
+    'move', 'treasure', 'trap', 'purchase', 'exit',
+    'combat_start', 'combat_action', 'combat_hit', 'combat_end', 'world'
+)
+
+
+def encode(message: Dict[str, Any]) -> bytes:
+    """Компактная сериализация сообщения в строку JSON"""
+    return (json.dumps(message, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+
+
+def player_state(game: Game) -> Dict[str, Any]:
+    """Поля игрока, видимые зрителям"""
+    player = game.player
+    if player is None:
+        return {}
+    return {
+        'name': player.name,
+        'pos': list(player.position),
+        'hp': player.health,
+        'max_hp': player.max_health,
+        'gold': player.gold,
+        'score': player.score,
+        'level': player.level,
+        'exp': player.experience,
+        'kills': player.kills,
+        'weapon': player.weapon.name if player.weapon else None,
+        'armor': player.armor.name if player.armor else None,
+        'items': len(player.inventory)
+    }
+
+
+def room_flags(room: dict) -> int:
+    """Флаги комнаты: 1 - посещена, 2 - обработана"""
+    return int(room['visited']) | int(room['processed']) << 1
+
+
+class Subscription:
+    """Очередь сообщений одного зрителя"""
+
+    def __init__(self, hub: 'SpectatorHub', maxsize: int):
+        self.hub = hub
+        self.messages: 'queue.Queue[Optional[bytes]]' = queue.Queue(maxsize=maxsize)
+        # Ждем ключевой кадр: сразу после подписки и после переполнения
+        self.needs_keyframe = True
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, message: bytes, keyframe: bool):
+        """Положить сообщение, не блокируя публикатора"""
+        if self.closed or self.needs_keyframe and not keyframe:
+            return
+        try:
+            self.messages.put_nowait(message)
+            self.needs_keyframe = False
+        except queue.Full:
+            # Зритель не успевает: выбрасываем очередь и ждем ключевого кадра
+            self.dropped += 1
+            self.needs_keyframe = True
+            self.drain()
+
+    def drain(self):
+        """Выбросить все сообщения из очереди"""
+        try:
+            while True:
+                self.messages.get_nowait()
+        except queue.Empty:
+            pass
+
+    def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Следующее сообщение (None - трансляция закрыта)"""
+        if self.closed and self.messages.empty():
+            return None
+        return self.messages.get(timeout=timeout)
+
+    def close(self):
+        """Отписаться от трансляции"""
+        self.hub.unsubscribe(self)
+
+
+class SpectatorHub:
+    """Публикатор состояния игры для множества зрителей"""
+
+    def __init__(self, keyframe_interval: int = 20, queue_size: int = 64):
+        self.keyframe_interval = keyframe_interval
+        self.queue_size = queue_size
+        self.subscribers: List[Subscription] = []
+        self.lock = threading.Lock()
+        self.last_player: Dict[str, Any] = {}
+        self.touched: set = set()
+        self.events: List[List[Any]] = []
+        self.turns_since_keyframe = 0
+        self.want_keyframe = True
+
+    def attach(self, game: Game):
+        """Начать транслировать игру"""
+        game.listeners.append(self.on_event)
+
+    def detach(self, game: Game):
+        """Прекратить трансляцию игры"""
+        if self.on_event in game.listeners:
+            game.listeners.remove(self.on_event)
+
+    def subscribe(self) -> Subscription:
+        """Новый зритель; первым он получит ближайший ключевой кадр"""
+        subscription = Subscription(self, self.queue_size)
+        with self.lock:
+            self.subscribers.append(subscription)
+            self.want_keyframe = True
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Убрать зрителя"""
+        with self.lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+        # Непрочитанные сообщения зрителю уже не нужны: освобождаем место
+        # под None, иначе поток отправки ждал бы в get() вечно
+        subscription.closed = True
+        while True:
+            subscription.drain()
+            try:
+                subscription.messages.put_nowait(None)
+                return
+            except queue.Full:
+                continue
+
+    def on_event(self, game: Game, kind: str, data: Dict[str, Any]):
+        """Слушатель событий игры"""
+        if 'position' in data:
+            self.touched.add(tuple(data['position']))
+        if kind in STREAMED_EVENTS:
+            self.events.append([kind, data])
+        if kind in ('turn', 'game_over'):
+            self.publish(game, final=kind == 'game_over')
+
+    def keyframe(self, game: Game) -> Dict[str, Any]:
+        """Полное состояние: игрок и все комнаты карты"""
+        game_map: GameMap = game.map
+        codes = GameMap.ROOM_CODES
+        rows = []
+        for y in range(game_map.size):
+            types = []
+            flags = []
+            for x in range(game_map.size):
+                room = game_map.peek_room((x, y))
+                types.append(codes[room['type']])
+                flags.append(str(room_flags(room)))
+            rows.append(["".join(types), "".join(flags)])
+        return {
+            't': 'k',
+            'turn': game.turn,
+            'player': player_state(game),
+            'map': {'size': game_map.size, 'rows': rows}
+        }
+
+    def delta(self, game: Game, player: Dict[str, Any]) -> Dict[str, Any]:
+        """Изменения с прошлого хода"""
+        changed = {key: value for key, value in player.items() if self.last_player.get(key) != value}
+        rooms = {}
+        for x, y in self.touched:
+            # peek_room не заводит словари комнат на общей карте
+            rooms[f"{x},{y}"] = room_flags(game.map.peek_room((x, y)))
+        message: Dict[str, Any] = {'t': 'd', 'turn': game.turn}
+        if changed:
+            message['player'] = changed
+        if rooms:
+            message['rooms'] = rooms
+        if self.events:
+            message['events'] = self.events
+        return message
+
+    def publish(self, game: Game, final: bool = False):
+        """Разослать дельту или ключевой кадр за прошедший ход"""
+        player = player_state(game)
+        with self.lock:
+            subscribers = list(self.subscribers)
+            is_keyframe = self.want_keyframe or self.turns_since_keyframe + 1 >= self.keyframe_interval
+            self.want_keyframe = False
+
+        if subscribers:
+            message = self.keyframe(game) if is_keyframe else self.delta(game, player)
+            if is_keyframe and self.events:
+                message['events'] = self.events
+            if final:
+                message['final'] = game.state.name
+            data = encode(message)
+            for subscription in subscribers:
+                subscription.offer(data, is_keyframe)
+
+        self.last_player = player
+        self.touched = set()
+        self.events = []
+        self.turns_since_keyframe = 0 if is_keyframe else self.turns_since_keyframe + 1
+
+
+class SpectatorServer:
+    """Раздача трансляции по локальному сокету (TCP или Unix).
+
+    Каждому соединению - своя подписка и свой поток отправки, поэтому
+    медленный клиент тормозит только собственную очередь."""
+
+    def __init__(self, hub: SpectatorHub, address: Union[Tuple[str, int], str]):
+        self.hub = hub
+        self.address = address
+        self.server: Optional[socket.socket] = None
+        self.running = False
+        # Открытые соединения зрителей, чтобы stop мог их закрыть
+        self.connections: Dict[Subscription, socket.socket] = {}
+        self.connections_lock = threading.Lock()
+
+    def start(self):
+        """Открыть сокет и начать принимать зрителей в фоне"""
+        if isinstance(self.address, str):
+            if os.path.exists(self.address):
+                os.remove(self.address)
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(self.address)
+        self.server.listen()
+        self.running = True
+        threading.Thread(target=self._accept, name="spectator-accept", daemon=True).start()
+
+    @property
+    def bound_address(self):
+        """Фактический адрес (например, порт при address=('127.0.0.1', 0))"""
+        return self.server.getsockname() if self.server else None
+
+    def _accept(self):
+        """Поток приема соединений"""
+        while self.running:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                break
+            subscription = self.hub.subscribe()
+            with self.connections_lock:
+                self.connections[subscription] = connection
+            threading.Thread(target=self._send, args=(connection, subscription),
+                             name="spectator-send", daemon=True).start()
+
+    def _send(self, connection: socket.socket, subscription: Subscription):
+        """Поток отправки сообщений одному зрителю"""
+        try:
+            while True:
+                message = subscription.get()
+                if message is None:
+                    break
+                connection.sendall(message)
+        except OSError:
+            pass
+        finally:
+            subscription.close()
+            with self.connections_lock:
+                self.connections.pop(subscription, None)
+            connection.close()
+
+    def stop(self):
+        """Закрыть сокет и отключить всех зрителей"""
+        self.running = False
+        with self.connections_lock:
+            connections = list(self.connections.items())
+        for subscription, connection in connections:
+            subscription.close()
+            try:
+                # Прерывает sendall, если поток отправки ждет медленного клиента
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.server:
+            try:
+                # Будит поток приема, ждущий в accept()
+                self.server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.server.close()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.remove(self.address)
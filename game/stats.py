@@ -0,0 +1,330 @@
+"""
+📊 ПОТОКОВАЯ СТАТИСТИКА ПРОХОЖДЕНИЙ
+
+Агрегаты занимают фиксированную память независимо от числа прохождений:
+
+    RunningStats - количество, среднее, дисперсия, минимум и максимум
+                   (алгоритм Уэлфорда, слияние по формулам Чана);
+    TDigest      - эскиз распределения для квантилей (merging t-digest);
+    RunStats     - оба агрегата для каждого показателя прохождения.
+
+Все агрегаты сливаются (merge), поэтому их можно собирать в рабочих
+процессах и объединять в главном, а также хранить в небольшом JSON.
+"""
+
+import json
+import math
+import os
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+class RunningStats:
+    """Количество, среднее и дисперсия за один проход"""
+
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        """Учесть одно значение"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'RunningStats'):
+        """Добавить агрегат, собранный отдельно"""
+        if not other.count:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2,
+                'min': self.min if self.count else None, 'max': self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'RunningStats':
+        stats = cls()
+        stats.count = data['count']
+        stats.mean = data['mean']
+        stats.m2 = data['m2']
+        if stats.count:
+            stats.min = data['min']
+            stats.max = data['max']
+        return stats
+
+
+class TDigest:
+    """Эскиз распределения: центроиды (среднее, вес), мелкие на краях.
+
+    Размер ограничен параметром compression (примерно compression / 2
+    центроидов), точность квантилей выше всего у хвостов распределения."""
+
+    __slots__ = ('compression', 'means', 'weights', 'buffer', 'total', 'min', 'max')
+
+    def __init__(self, compression: float = 100):
+        self.compression = compression
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.buffer: List[Tuple[float, float]] = []
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self) -> int:
+        return len(self.means) + len(self.buffer)
+
+    def add(self, value: float, weight: float = 1.0):
+        """Учесть значение (сжатие - пакетами, раз в несколько сотен значений)"""
+        self.buffer.append((value, weight))
+        self.total += weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if len(self.buffer) >= 5 * self.compression:
+            self.compress()
+
+    def k_scale(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def q_limit(self, q: float) -> float:
+        """Наибольшая доля, до которой можно растить центроид, начатый в q"""
+        k = self.k_scale(q) + 1
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def compress(self):
+        """Слить буфер с центроидами"""
+        if not self.buffer:
+            return
+        points = sorted(list(zip(self.means, self.weights)) + self.buffer)
+        self.buffer = []
+        total = self.total
+        means: List[float] = []
+        weights: List[float] = []
+
+        mean, weight = points[0]
+        done = 0.0
+        limit = self.q_limit(0.0)
+        for value, value_weight in points[1:]:
+            if (done + weight + value_weight) / total <= limit:
+                weight += value_weight
+                mean += (value - mean) * value_weight / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                done += weight
+                limit = self.q_limit(done / total)
+                mean, weight = value, value_weight
+        means.append(mean)
+        weights.append(weight)
+        self.means = means
+        self.weights = weights
+
+    def merge(self, other: 'TDigest'):
+        """Добавить эскиз, собранный отдельно"""
+        other.compress()
+        self.buffer.extend(zip(other.means, other.weights))
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.compress()
+
+    def quantile(self, q: float) -> float:
+        """Значение, ниже которого доля q распределения"""
+        self.compress()
+        if not self.means:
+            return math.nan
+        if len(self.means) == 1:
+            return self.means[0]
+        target = min(max(q, 0.0), 1.0) * self.total
+        means, weights = self.means, self.weights
+
+        # До центра первого центроида - между минимумом и ним
+        if target < weights[0] / 2:
+            return self.min + (means[0] - self.min) * target / (weights[0] / 2)
+
+        cumulative = 0.0
+        for i in range(len(means) - 1):
+            center = cumulative + weights[i] / 2
+            next_center = cumulative + weights[i] + weights[i + 1] / 2
+            if target <= next_center:
+                fraction = (target - center) / (next_center - center)
+                return means[i] + (means[i + 1] - means[i]) * fraction
+            cumulative += weights[i]
+
+        # После центра последнего центроида - между ним и максимумом
+        last_center = self.total - weights[-1] / 2
+        fraction = (target - last_center) / (weights[-1] / 2)
+        return means[-1] + (self.max - means[-1]) * min(fraction, 1.0)
+
+    def cdf(self, value: float) -> float:
+        """Доля распределения не выше value"""
+        self.compress()
+        if not self.means:
+            return math.nan
+        if value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+        means, weights = self.means, self.weights
+        if len(means) == 1 or value < means[0]:
+            span = means[0] - self.min
+            return (weights[0] / 2) * ((value - self.min) / span if span else 1.0) / self.total
+
+        cumulative = 0.0
+        for i in range(len(means) - 1):
+            if value < means[i + 1]:
+                center = cumulative + weights[i] / 2
+                next_center = cumulative + weights[i] + weights[i + 1] / 2
+                fraction = (value - means[i]) / (means[i + 1] - means[i])
+                return (center + (next_center - center) * fraction) / self.total
+            cumulative += weights[i]
+
+        span = self.max - means[-1]
+        last_center = self.total - weights[-1] / 2
+        return (last_center + weights[-1] / 2 * (value - means[-1]) / span) / self.total
+
+    def to_dict(self) -> Dict[str, Any]:
+        self.compress()
+        return {'compression': self.compression, 'means': self.means, 'weights': self.weights,
+                'min': self.min if self.means else None, 'max': self.max if self.means else None}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TDigest':
+        digest = cls(data['compression'])
+        digest.means = list(data['means'])
+        digest.weights = list(data['weights'])
+        digest.total = float(sum(digest.weights))
+        if digest.means:
+            digest.min = data['min']
+            digest.max = data['max']
+        return digest
+
+
+class RunStats:
+    """Сводка по прохождениям: исходы и распределение каждого показателя"""
+
+    FIELDS = ('score', 'playtime', 'kills', 'level', 'gold', 'turns')
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, compression: float = 100):
+        self.runs = 0
+        self.wins = 0
+        self.deaths = 0
+        self.moments = {field: RunningStats() for field in self.FIELDS}
+        self.digests = {field: TDigest(compression) for field in self.FIELDS}
+
+    def add(self, record: Dict[str, Any]):
+        """Учесть одно прохождение (поля, которых нет в записи, пропускаются)"""
+        self.runs += 1
+        self.wins += bool(record.get('won'))
+        self.deaths += bool(record.get('died'))
+        for field in self.FIELDS:
+            value = record.get(field)
+            if value is not None:
+                self.moments[field].add(value)
+                self.digests[field].add(value)
+
+    def add_all(self, records: Iterable[Dict[str, Any]]):
+        for record in records:
+            self.add(record)
+
+    def merge(self, other: 'RunStats'):
+        """Объединить со сводкой из другого процесса или файла"""
+        self.runs += other.runs
+        self.wins += other.wins
+        self.deaths += other.deaths
+        for field in self.FIELDS:
+            self.moments[field].merge(other.moments[field])
+            self.digests[field].merge(other.digests[field])
+
+    def quantile(self, field: str, q: float) -> float:
+        return self.digests[field].quantile(q)
+
+    def percentile_rank(self, field: str, value: float) -> float:
+        """Доля прохождений с показателем не выше value"""
+        return self.digests[field].cdf(value)
+
+    def summary(self) -> List[Tuple[str, int, float, float, List[float]]]:
+        """Строки (показатель, число, среднее, ст. отклонение, квантили QUANTILES)"""
+        rows = []
+        for field in self.FIELDS:
+            moments = self.moments[field]
+            if moments.count:
+                rows.append((field, moments.count, moments.mean, moments.stddev,
+                             [self.quantile(field, q) for q in self.QUANTILES]))
+        return rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'runs': self.runs,
+            'wins': self.wins,
+            'deaths': self.deaths,
+            'moments': {field: stats.to_dict() for field, stats in self.moments.items()},
+            'digests': {field: digest.to_dict() for field, digest in self.digests.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'RunStats':
+        stats = cls()
+        stats.runs = data['runs']
+        stats.wins = data['wins']
+        stats.deaths = data['deaths']
+        for field in cls.FIELDS:
+            if field in data['moments']:
+                stats.moments[field] = RunningStats.from_dict(data['moments'][field])
+                stats.digests[field] = TDigest.from_dict(data['digests'][field])
+        return stats
+
+    @classmethod
+    def load(cls, path: str) -> 'RunStats':
+        """Сводка из файла (пустая, если файла нет или он поврежден)"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls.from_dict(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+            return cls()
+
+    def save(self, path: str):
+        """Записать сводку атомарно (через временный файл)"""
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(temp_path, path)
+
+
+def format_summary(stats: RunStats) -> str:
+    """Текстовая таблица сводки"""
+    lines = [f"Прохождений: {stats.runs}, побед: {stats.wins}, гибелей: {stats.deaths}",
+             "Показатель     Число    Среднее   Ст.откл.      p50       p90       p99"]
+    for field, count, mean, stddev, quantiles in stats.summary():
+        lines.append(f"{field:<12} {count:7} {mean:10.1f} {stddev:10.1f} "
+                     + " ".join(f"{value:9.1f}" for value in quantiles))
+    return "\n".join(lines)
+
@@ -0,0 +1,227 @@
+"""
+📼 ЖУРНАЛ ДЕЙСТВИЙ ИГРОКОВ
+
+Подписчик на Game.emit складывает события (ходы, события комнат, выбор в
+бою, покупки, сохранения) в кольцевой буфер в памяти - это одна операция
+append. Фоновый поток забирает события пакетами, кодирует и дописывает в
+компактные двоичные файлы с ротацией, так что игровой цикл никогда не
+ждет диска. Если поток не успевает, самые старые события вытесняются и
+учитываются в счетчике dropped.
+
+Формат файла: сигнатура MAGIC, затем записи
+    <запуск u64><сессия u32><ход u32><время f64><вид u8><длина u16><данные JSON>
+
+Номера сессий идут с 1 в каждом процессе, поэтому сессию в журнале
+определяет пара (запуск, сессия): запуск - время старта процесса в
+секундах (старшие 32 бита) и его pid. События, не влезающие в запись,
+заменяются сводкой и учитываются в счетчике oversized.
+
+Пример:
+    log = TelemetryLog("telemetry")
+    log.attach(game)
+    ...
+    log.close()
+    for record in read_directory("telemetry"):
+        print(record)
+"""
+
+import glob
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+
+MAGIC = b"TLM2"
+HEADER = struct.Struct("<QIIdBH")
+MAX_PAYLOAD = 0xFFFF
+
+# Коды видов событий; неизвестные виды пишутся с кодом 0 и именем в данных
+KINDS = ('move', 'treasure', 'combat_start', 'combat_action', 'combat_hit', 'combat_end',
+         'trap', 'purchase', 'exit', 'save', 'turn', 'game_over', 'world')
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS, 1)}
+
+
+def run_id() -> int:
+    """Номер запуска процесса: время старта в секундах и pid"""
+    return (int(time.time()) & 0xFFFFFFFF) << 32 | (os.getpid() & 0xFFFFFFFF)
+
+
+def encode_payload(data: Dict[str, Any]) -> bytes:
+    """Данные события компактным JSON в UTF-8"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def oversized_summary(data: Dict[str, Any], size: int) -> Dict[str, Any]:
+    """Замена слишком большого события: размер и имена полей"""
+    summary: Dict[str, Any] = {'oversized': size, 'fields': sorted(map(str, data))[:32]}
+    if 'kind' in data:
+        summary['kind'] = data['kind']
+    return summary
+
+
+class TelemetryLog:
+    """Кольцевой буфер событий с фоновой записью в ротируемые файлы"""
+
+    def __init__(self, directory: str, capacity: int = 65536, batch_size: int = 1024,
+                 flush_interval: float = 1.0, max_file_bytes: int = 8 * 1024 * 1024,
+                 max_files: int = 8):
+        self.directory = directory
+        self.buffer: Deque[Tuple[int, int, float, str, Dict[str, Any]]] = deque(maxlen=capacity)
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.sources: Dict[int, Callable] = {}
+        self.run = run_id()
+        self.next_session = 1
+        self.dropped = 0
+        # Игры пишут из своих потоков; счетчик трогается только при
+        # переполнении, так что блокировка не стоит горячему пути ничего
+        self.dropped_lock = threading.Lock()
+        self.oversized = 0
+        self.written = 0
+        self.file = None
+        self.file_index = 0
+        self.file_bytes = 0
+        self.wakeup = threading.Event()
+        self.stopping = False
+        os.makedirs(directory, exist_ok=True)
+        existing = self.files()
+        if existing:
+            self.file_index = int(os.path.basename(existing[-1])[10:15])
+        self.writer = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        self.writer.start()
+
+    def files(self) -> List[str]:
+        """Файлы журнала по порядку записи"""
+        return sorted(glob.glob(os.path.join(self.directory, "telemetry-?????.bin")))
+
+    def attach(self, game: Any, session: Optional[int] = None) -> int:
+        """Начать записывать события игры; возвращает номер сессии в журнале"""
+        if session is None:
+            session = self.next_session
+            self.next_session += 1
+        buffer = self.buffer
+        capacity = self.capacity
+        wakeup = self.wakeup
+        batch_size = self.batch_size
+
+        def listener(source: Any, kind: str, data: Dict[str, Any]):
+            # Горячий путь: только append в deque, кодирование - в фоне
+            if len(buffer) >= capacity:
+                with self.dropped_lock:
+                    self.dropped += 1
+            buffer.append((session, source.turn, time.time(), kind, data))
+            if len(buffer) >= batch_size:
+                wakeup.set()
+
+        self.sources[id(game)] = listener
+        game.listeners.append(listener)
+        return session
+
+    def detach(self, game: Any):
+        """Прекратить запись событий игры"""
+        listener = self.sources.pop(id(game), None)
+        if listener is not None and listener in game.listeners:
+            game.listeners.remove(listener)
+
+    def _run(self):
+        """Фоновый поток: пакетная запись по заполнению или по таймеру"""
+        while not self.stopping:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.drain()
+        self.drain()
+
+    def drain(self):
+        """Закодировать и записать все накопленные события"""
+        chunks = []
+        size = 0
+        count = 0
+        buffer = self.buffer
+        while buffer:
+            try:
+                session, turn, timestamp, kind, data = buffer.popleft()
+            except IndexError:
+                break
+            code = KIND_CODES.get(kind, 0)
+            if not code:
+                data = dict(data, kind=kind)
+            payload = encode_payload(data)
+            if len(payload) > MAX_PAYLOAD:
+                # Обрезанный JSON не прочитать: пишем сводку вместо данных
+                self.oversized += 1
+                payload = encode_payload(oversized_summary(data, len(payload)))
+            chunks.append(HEADER.pack(self.run, session, turn, timestamp, code, len(payload)))
+            chunks.append(payload)
+            size += HEADER.size + len(payload)
+            count += 1
+            if size >= 64 * 1024:
+                self.write(chunks, size, count)
+                chunks, size, count = [], 0, 0
+        if chunks:
+            self.write(chunks, size, count)
+
+    def write(self, chunks: List[bytes], size: int, count: int):
+        """Дописать пакет в текущий файл, при переполнении открыть следующий"""
+        if self.file is None or self.file_bytes + size > self.max_file_bytes:
+            self.rotate()
+        self.file.write(b"".join(chunks))
+        self.file.flush()
+        self.file_bytes += size
+        self.written += count
+
+    def rotate(self):
+        """Начать новый файл и удалить самые старые сверх max_files"""
+        if self.file is not None:
+            self.file.close()
+        self.file_index += 1
+        path = os.path.join(self.directory, f"telemetry-{self.file_index:05d}.bin")
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.file_bytes = len(MAGIC)
+        for old in self.files()[:-self.max_files]:
+            os.remove(old)
+
+    def flush(self):
+        """Попросить фоновый поток записать буфер сейчас"""
+        self.wakeup.set()
+
+    def close(self):
+        """Записать остаток и остановить поток"""
+        self.stopping = True
+        self.wakeup.set()
+        self.writer.join()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Записи одного файла журнала"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Не файл журнала: {path}")
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            run, session, turn, timestamp, code, length = HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            data = json.loads(payload)
+            kind = KINDS[code - 1] if code else data.pop('kind', '?')
+            yield {'run': run, 'session': session, 'turn': turn, 'time': timestamp,
+                   'kind': kind, 'data': data}
+
+
+def read_directory(directory: str) -> Iterator[Dict[str, Any]]:
+    """Все записи журнала по порядку файлов"""
+    for path in sorted(glob.glob(os.path.join(directory, "telemetry-?????.bin"))):
+        yield from read_records(path)
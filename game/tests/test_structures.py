@@ -0,0 +1,186 @@
+"""Проверки поведения структур данных на случайных данных с фиксированным зерном"""
+
+import bisect
+import random
+import unittest
+
+from analytics import SparseFenwick2D
+from history import BITS as VECTOR_BITS, MASK as VECTOR_MASK, PersistentVector
+from sampling import AliasSampler
+from scheduler import BITS, TimerWheel
+from stats import TDigest
+
+
+class TimerWheelTest(unittest.TestCase):
+
+    def test_timers_fire_on_due_turn_across_levels(self):
+        wheel = TimerWheel()
+        # Задержки на границах ячеек всех уровней колеса
+        delays = [1, 2, 63, 64, 65, 127, 4095, 4096, 4097, 1 << 3 * BITS, (1 << 3 * BITS) + 1]
+        for delay in delays:
+            wheel.schedule(delay, 'once', delay)
+        fired = {}
+        for _ in range(max(delays) + 10):
+            for timer in wheel.tick():
+                self.assertNotIn(timer.data, fired)
+                fired[timer.data] = wheel.now
+        self.assertEqual(fired, {delay: delay for delay in delays})
+        self.assertEqual(len(wheel), 0)
+
+    def test_periodic_and_cancelled(self):
+        wheel = TimerWheel(now=1000)
+        wheel.schedule(100, 'every', interval=100)
+        cancelled = wheel.schedule(50, 'never')
+        cancelled.cancel()
+        turns = [wheel.now for _ in range(1000) for timer in wheel.tick()
+                 if timer.kind != 'never']
+        self.assertEqual(turns, list(range(1100, 2001, 100)))
+        self.assertEqual([timer.kind for timer in wheel.pending()], ['every'])
+
+    def test_advance_matches_ticks(self):
+        rng = random.Random(5)
+        delays = [rng.randrange(1, 20000) for _ in range(500)]
+        stepped, jumped = TimerWheel(), TimerWheel()
+        for delay in delays:
+            stepped.schedule(delay, 'x', delay)
+            jumped.schedule(delay, 'x', delay)
+        by_tick = [timer.data for _ in range(20000) for timer in stepped.tick()]
+        by_advance = [timer.data for turn in range(0, 20001, 777)
+                      for timer in jumped.advance(turn)]
+        by_advance += [timer.data for timer in jumped.advance(20000)]
+        self.assertEqual(by_tick, sorted(delays))
+        self.assertEqual(sorted(by_advance), sorted(delays))
+
+
+class PersistentVectorTest(unittest.TestCase):
+
+    def test_set_copies_only_the_path(self):
+        vector = PersistentVector.from_iterable(range(1000))
+        changed = vector.set(500, -1)
+        self.assertEqual(vector[500], 500)
+        self.assertEqual(changed[500], -1)
+        self.assertEqual([changed[i] for i in range(1000) if i != 500],
+                         [i for i in range(1000) if i != 500])
+
+        # Вне пути к листу узлы общие с исходным вектором
+        old, new = vector.root, changed.root
+        shift = vector.shift
+        while shift:
+            slot = (500 >> shift) & VECTOR_MASK
+            for other in range(len(old)):
+                if other != slot:
+                    self.assertIs(new[other], old[other])
+            self.assertIsNot(new[slot], old[slot])
+            old, new = old[slot], new[slot]
+            shift -= VECTOR_BITS
+        self.assertEqual(list(vector.diff(changed)), [500])
+
+    def test_set_same_value_returns_self(self):
+        vector = PersistentVector.from_iterable([0] * 300)
+        self.assertIs(vector.set(7, 0), vector)
+
+    def test_random_updates_against_list(self):
+        rng = random.Random(3)
+        values = [rng.randrange(32) for _ in range(777)]
+        versions = [(PersistentVector.from_iterable(values), list(values))]
+        for _ in range(300):
+            vector, plain = versions[-1]
+            index, value = rng.randrange(777), rng.randrange(32)
+            plain = list(plain)
+            plain[index] = value
+            versions.append((vector.set(index, value), plain))
+        for vector, plain in versions:
+            self.assertEqual([vector[i] for i in range(len(vector))], plain)
+
+
+class TDigestTest(unittest.TestCase):
+
+    def test_quantiles_close_to_sorted_baseline(self):
+        rng = random.Random(11)
+        values = [rng.lognormvariate(3, 1) for _ in range(20000)]
+        digest = TDigest(100)
+        for value in values:
+            digest.add(value)
+        values.sort()
+        for q in (0.001, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999):
+            estimate = digest.quantile(q)
+            # Ошибка по рангу: доля значений меньше оценки против q
+            rank = bisect.bisect_left(values, estimate) / len(values)
+            tolerance = 0.01 if 0.05 < q < 0.95 else 0.002
+            self.assertAlmostEqual(rank, q, delta=tolerance, msg=f"q={q}")
+        self.assertEqual(digest.quantile(0), values[0])
+        self.assertEqual(digest.quantile(1), values[-1])
+        self.assertLessEqual(len(digest), 100)
+
+    def test_merge_equals_single_digest(self):
+        rng = random.Random(12)
+        values = [rng.gauss(0, 1) for _ in range(10000)]
+        whole, left, right = TDigest(), TDigest(), TDigest()
+        for i, value in enumerate(values):
+            whole.add(value)
+            (left if i % 2 else right).add(value)
+        left.merge(right)
+        for q in (0.05, 0.5, 0.95):
+            self.assertAlmostEqual(left.quantile(q), whole.quantile(q), delta=0.05)
+
+
+class AliasSamplerTest(unittest.TestCase):
+
+    def test_frequencies_follow_weights(self):
+        weights = (1, 2, 3, 4, 0, 10)
+        sampler = AliasSampler('abcdef', weights)
+        rng = random.Random(7)
+        draws = 200000
+        counts = dict.fromkeys('abcdef', 0)
+        for item in sampler.sample_n(draws, rng):
+            counts[item] += 1
+        total = sum(weights)
+        for item, weight in zip('abcdef', weights):
+            self.assertAlmostEqual(counts[item] / draws, weight / total, delta=0.005, msg=item)
+        self.assertEqual(counts['e'], 0)
+
+    def test_single_samples_match_batches(self):
+        sampler = AliasSampler(range(5), (5, 1, 1, 1, 2))
+        rng = random.Random(8)
+        counts = [0] * 5
+        for _ in range(50000):
+            counts[sampler.sample(rng)] += 1
+        for count, weight in zip(counts, (5, 1, 1, 1, 2)):
+            self.assertAlmostEqual(count / 50000, weight / 10, delta=0.01)
+
+    def test_bad_weights(self):
+        with self.assertRaises(ValueError):
+            AliasSampler('ab', (1,))
+        with self.assertRaises(ValueError):
+            AliasSampler('ab', (0, 0))
+
+
+class SparseFenwick2DTest(unittest.TestCase):
+
+    def test_counts_against_brute_force(self):
+        rng = random.Random(9)
+        size = 13
+        tree = SparseFenwick2D(size)
+        grid = [[0] * size for _ in range(size)]
+        for _ in range(400):
+            x, y, delta = rng.randrange(size), rng.randrange(size), rng.choice((-1, 1, 2))
+            tree.add(x, y, delta)
+            grid[y][x] += delta
+            x0, x1 = sorted((rng.randrange(size + 1), rng.randrange(size + 1)))
+            y0, y1 = sorted((rng.randrange(size + 1), rng.randrange(size + 1)))
+            expected = sum(grid[j][i] for j in range(y0, y1) for i in range(x0, x1))
+            self.assertEqual(tree.count(x0, y0, x1, y1), expected)
+        for x in range(size + 1):
+            for y in range(size + 1):
+                self.assertEqual(tree.prefix(x, y),
+                                 sum(grid[j][i] for j in range(y) for i in range(x)))
+
+    def test_cancelled_updates_leave_no_nodes(self):
+        tree = SparseFenwick2D(16)
+        tree.add(3, 5, 1)
+        tree.add(3, 5, -1)
+        self.assertEqual(tree.tree, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
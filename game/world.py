@@ -0,0 +1,125 @@
+"""
+🌍 ОБЩИЙ МИР ДЛЯ НЕСКОЛЬКИХ ИГРОКОВ
+
+Несколько сессий Game ходят по одной карте GameMap. Карта делится на
+квадратные участки chunk x chunk, у каждого участка свой замок: событие
+комнаты (сокровище, монстр, ловушка) забирается атомарно под замком ее
+участка, поэтому два игрока не могут забрать одно сокровище, а игроки в
+разных частях карты друг друга не ждут.
+
+Общего замка на изменение комнат нет. Участок выровнен по корзинам
+индекса сокровищ, поэтому корзина меняется только под замком своего
+участка, а поиск ближайшего сокровища читает корзины без замка.
+Аналитика карты получает изменения через очередь без замков (см.
+analytics.MapAnalytics.record).
+
+Возврат монстров и ловушек тоже общий: их таймеры живут в колесе мира, а
+не в колесе игрока, который очистил комнату, поэтому переживают его уход и
+новую игру. Часы мира идут со средней скоростью игроков: каждый ход
+игрока сдвигает их на 1 / (число игроков).
+
+Пример (каждая сессия - в своем потоке сервера):
+    world = SharedWorld(GameMap(64))
+    world.join(game)
+    ...
+    world.leave(game)
+"""
+
+import threading
+from typing import Dict, List, Tuple
+
+from game import Game, GameMap
+from scheduler import TimerWheel
+
+
+# Таймеры комнат мира: вид события -> флаг, который оно возвращает
+ROOM_TIMERS = {
+    'trap_rearm': 'is_trap_active',
+    'monster_respawn': 'has_monster',
+}
+
+
+class SharedWorld:
+    """Общая карта с замками по участкам и списком игроков"""
+
+    def __init__(self, game_map: GameMap, chunk: int = 8):
+        if chunk % game_map.treasures.bucket:
+            raise ValueError(f"Размер участка должен быть кратен корзине индекса сокровищ "
+                             f"({game_map.treasures.bucket})")
+        self.map = game_map
+        self.chunk = chunk
+        self.chunks_per_side = (game_map.size + chunk - 1) // chunk
+        self.locks: List[threading.Lock] = [threading.Lock()
+                                            for _ in range(self.chunks_per_side ** 2)]
+        # Аналитика собирается сразу, пока игроков нет: ленивая сборка
+        # параллельно с claim могла бы потерять обработанную комнату
+        game_map.analytics
+        self.players: Dict[int, Game] = {}
+        self.players_lock = threading.Lock()
+        # Колесо таймеров комнат и часы мира (дробные: ход игрока - 1/N)
+        self.timers = TimerWheel()
+        self.clock = 0.0
+        self.timers_lock = threading.Lock()
+
+    def lock_for(self, position: Tuple[int, int]) -> threading.Lock:
+        """Замок участка, в котором лежит клетка"""
+        return self.locks[(position[1] // self.chunk) * self.chunks_per_side
+                          + position[0] // self.chunk]
+
+    def claim(self, position: Tuple[int, int], flag: str) -> bool:
+        """Забрать событие комнаты; False - его уже забрал другой игрок"""
+        with self.lock_for(position):
+            return self.map.claim(position, flag)
+
+    def release(self, position: Tuple[int, int], flag: str):
+        """Вернуть событие комнаты (монстр вернулся, ловушка взведена)"""
+        with self.lock_for(position):
+            self.map.release(position, flag)
+
+    def schedule(self, delay: int, kind: str, position: Tuple[int, int]):
+        """Вернуть событие комнаты через delay ходов мира"""
+        with self.timers_lock:
+            self.timers.schedule(delay, kind, list(position))
+
+    def advance(self) -> List[Tuple[str, Tuple[int, int]]]:
+        """Ход одного игрока: сдвинуть часы мира и вернуть события комнат.
+
+        Возвращает (вид, клетка) вернувшихся событий; если в комнате
+        стоит игрок, событие переносится на следующий ход мира"""
+        with self.players_lock:
+            players = max(1, len(self.players))
+        with self.timers_lock:
+            self.clock += 1 / players
+            fired = self.timers.advance(int(self.clock))
+        returned: List[Tuple[str, Tuple[int, int]]] = []
+        for timer in fired:
+            position = tuple(timer.data)
+            if self.occupied(position):
+                self.schedule(1, timer.kind, position)
+                continue
+            self.release(position, ROOM_TIMERS[timer.kind])
+            returned.append((timer.kind, position))
+        return returned
+
+    def join(self, game: Game):
+        """Подключить сессию к миру: она играет на общей карте"""
+        with self.players_lock:
+            self.players[id(game)] = game
+        game.world = self
+        game.map = self.map
+
+    def leave(self, game: Game):
+        """Отключить сессию (карта остается у нее до сброса)"""
+        with self.players_lock:
+            self.players.pop(id(game), None)
+        game.world = None
+
+    def sessions(self) -> List[Game]:
+        """Подключенные сессии (копия списка)"""
+        with self.players_lock:
+            return list(self.players.values())
+
+    def occupied(self, position: Tuple[int, int]) -> bool:
+        """Стоит ли в клетке хотя бы один игрок"""
+        return any(game.player is not None and game.player.position == position
+                   for game in self.sessions())